@@ -36,12 +36,13 @@ from scipy.spatial import cKDTree
 from sklearn.cluster import KMeans
 from vtk.numpy_interface import dataset_adapter as dsa
 
+from Atrial_LDRBM.mesh_topology import BoundaryLoops
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import get_normalized_cross_product
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, numpy_to_vtk
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_polydata_writer, write_to_vtx
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, clean_polydata, generate_ids, \
-    get_center_of_mass, get_feature_edges, get_elements_above_plane
+    get_feature_edges, get_elements_above_plane
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane_with_points, initialize_plane, \
     init_connectivity_filter, ExtractionModes
@@ -232,49 +233,24 @@ def run(args=None):
 
 
 def detect_and_mark_rings(surf, ap_point, outdir, debug):
-    boundary_edges = get_feature_edges(surf, boundary_edges_on=True, feature_edges_on=False, manifold_edges_on=False,
-                                       non_manifold_edges_on=False)
     "Splitting rings"
-    connect = init_connectivity_filter(boundary_edges, ExtractionModes.ALL_REGIONS)
-    num = connect.GetNumberOfExtractedRegions()
-
-    connect.SetExtractionModeToSpecifiedRegions()
+    # Chains the boundary edges into loops, ordered along each ring, with their centers in one pass
+    loops = BoundaryLoops(surf)
+    distances = np.linalg.norm(loops.centers - np.array(ap_point), axis=1)
 
     rings = []
 
-    for i in range(num):
-        # Tell the connect filter to focus only on the i-th region
-        connect.AddSpecifiedRegion(i)
-        # Executes the filter for the specified region
-        connect.Update()
-        # Gets the actual geometric data (points and lines) for this single ring
-        surface = connect.GetOutput()
-
-        # Converts vtkUnstructuredGrid output from the connectivity filter into a vtkPolyData
-        surface = apply_vtk_geom_filter(surface)
-        # Removes any unused points
-        surface = clean_polydata(surface)
+    for i in range(len(loops)):
+        ring_surf = loops.polydata(i)
 
         # saves this individual processed ring to a VTK file
         if debug:
-            vtk_write(surface, outdir + '/ring_' + str(i) + '.vtk')
+            vtk_write(ring_surf, outdir + '/ring_' + str(i) + '.vtk')
 
-
-        ring_surf = vtk.vtkPolyData()
-        ring_surf.DeepCopy(surface)
-
-        # Calculates the geometric center of the current ring
-        c_mass = get_center_of_mass(surface, False)
-
-        ring = Ring(i, "", surface.GetNumberOfPoints(), c_mass, np.sqrt(np.sum((np.array(ap_point) - \
-                                                                                np.array(c_mass)) ** 2, axis=0)),
-                    ring_surf)
+        ring = Ring(i, "", int(loops.n_points[i]), tuple(loops.centers[i]), distances[i], ring_surf)
 
         rings.append(ring)
 
-        connect.DeleteSpecifiedRegion(i)
-        connect.Update()
-
     return rings
 
 
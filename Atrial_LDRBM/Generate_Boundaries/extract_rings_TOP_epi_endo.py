@@ -37,10 +37,11 @@ from sklearn.cluster import KMeans
 from vtk.numpy_interface import dataset_adapter as dsa
 
 from Atrial_LDRBM.Generate_Boundaries.extract_rings import get_region_not_including_ids, is_top_endo_epi_cut, split_tv
+from Atrial_LDRBM.mesh_topology import BoundaryLoops
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, numpy_to_vtk
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_polydata_writer, write_to_vtx
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, get_vtk_geom_filter_port, \
-    clean_polydata, generate_ids, get_center_of_mass, get_feature_edges, get_elements_above_plane
+    clean_polydata, generate_ids, get_feature_edges, get_elements_above_plane
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane_with_points, init_connectivity_filter, \
     ExtractionModes
@@ -220,41 +221,15 @@ def run():
 
 
 def detect_and_mark_rings(surf, ap_point):
-    boundary_edges = get_feature_edges(surf, boundary_edges_on=True, feature_edges_on=False, manifold_edges_on=False,
-                                       non_manifold_edges_on=False)
-
     "Splitting rings"
-
-    connect = init_connectivity_filter(boundary_edges, ExtractionModes.ALL_REGIONS)
-    num = connect.GetNumberOfExtractedRegions()
-
-    connect.SetExtractionModeToSpecifiedRegions()
+    loops = BoundaryLoops(surf)
+    distances = np.linalg.norm(loops.centers - np.array(ap_point), axis=1)
 
     rings = []
-
-    for i in range(num):
-        connect.AddSpecifiedRegion(i)
-        connect.Update()
-        surface = connect.GetOutput()
-
-        # Clean unused points
-        surface = apply_vtk_geom_filter(surface)
-        surface = clean_polydata(surface)
-
-        ring_surf = vtk.vtkPolyData()
-        ring_surf.DeepCopy(surface)
-
-        c_mass = get_center_of_mass(surface, False)
-
-        ring = Ring(i, "", surface.GetNumberOfPoints(), c_mass, np.sqrt(np.sum((np.array(ap_point) - \
-                                                                                np.array(c_mass)) ** 2, axis=0)),
-                    ring_surf)
-
+    for i in range(len(loops)):
+        ring = Ring(i, "", int(loops.n_points[i]), tuple(loops.centers[i]), distances[i], loops.polydata(i))
         rings.append(ring)
 
-        connect.DeleteSpecifiedRegion(i)
-        connect.Update()
-
     return rings
 
 
@@ -9,7 +9,7 @@ from sklearn.cluster import KMeans
 
 from vtk_opencarp_helper_methods.vtk_methods.exporting import write_to_vtx
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, clean_polydata, generate_ids, \
-    get_center_of_mass, get_feature_edges, get_elements_above_plane
+    get_feature_edges, get_elements_above_plane
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.init_objects import init_connectivity_filter, ExtractionModes, \
     initialize_plane_with_points, initialize_plane
@@ -18,15 +18,16 @@ from vtk_opencarp_helper_methods.mathematical_operations.vector_operations impor
 from vtk_opencarp_helper_methods.vtk_methods.thresholding import get_lower_threshold, get_threshold_between
 
 from Atrial_LDRBM.Generate_Boundaries.mesh import Mesh
+from Atrial_LDRBM.mesh_topology import BoundaryLoops
 
 
 class Ring:
     """
     Represents a detected anatomical ring from the atrial surface.
-    Each ring is defined by its connectivity region, center of mass, and its point count.
+    Each ring is defined by its boundary loop, center of mass, and its point count.
     """
 
-    def __init__(self, index, name, points_num, center_point, distance, polydata):
+    def __init__(self, index, name, points_num, center_point, distance, polydata, radius=None):
         # The unique identifier for the connectivity region (i.e., the ring)
         self.id: int = index
 
@@ -40,9 +41,12 @@ class Ring:
         # Euclidean distance from the given apex to the ring's center
         self.ap_dist: float = distance
 
-        # The VTK PolyData object that represents the ring's geometry
+        # The VTK PolyData object that represents the ring's geometry, its points ordered along the ring
         self.vtk_polydata: vtk.vtkPolyData = polydata
 
+        # Mean distance of the ring's points to its center
+        self.radius: float = radius
+
 
 class RingDetector:
     """
@@ -77,7 +81,7 @@ class RingDetector:
         self.outdir = outdir
         os.makedirs(self.outdir, exist_ok=True)
 
-        self.boundary_edges: vtk.vtkPolyData = None
+        self.boundary_loops: BoundaryLoops = None
         self.uac_cut_surface: vtk.vtkPolyData = None
         self.uac_boundary_edges: vtk.vtkPolyData = None
 
@@ -120,83 +124,51 @@ class RingDetector:
 
     def detect_rings(self, debug: bool = False) -> list[Ring]:
         """
-        Detect rings from the input surface by extracting boundary edges
-        and finding connected components.
+        Detect rings from the input surface as the loops of its boundary edges.
 
         :param debug: If True, save each raw ring as a debug VTK file
         :return:      List of Ring objects for each detected ring
         """
-        # Extract the boundary edges of the surface
-        self.boundary_edges = get_feature_edges(
-            self.surface,
-            boundary_edges_on=True,
-            feature_edges_on=False,
-            manifold_edges_on=False,
-            non_manifold_edges_on=False
-        )
-
-        # Use connectivity filtering to separate the boundary edges into connected components
-        connect_filter = init_connectivity_filter(self.boundary_edges, ExtractionModes.ALL_REGIONS)
-        num_regions = connect_filter.GetNumberOfExtractedRegions()
-        connect_filter.SetExtractionModeToSpecifiedRegions()
+        # Chain the boundary edges of the surface into loops, with their centers and radii in one pass
+        self.boundary_loops = BoundaryLoops(self.surface)
+        distances = np.linalg.norm(self.boundary_loops.centers - np.array(self.apex), axis=1)
 
-        # Process each connected component (potential ring)
         detected_rings: List[Ring] = []
-        for region_index in range(num_regions):
+        for loop_index in range(len(self.boundary_loops)):
             try:
-                ring_obj = self._process_detected_ring_region(connect_filter, region_index, debug)
+                ring_obj = self._process_detected_ring_loop(loop_index, distances[loop_index], debug)
                 if ring_obj:
                     detected_rings.append(ring_obj)
             except Exception as e:
-                print(f"Error processing ring region {region_index}: {e}")
-
-            connect_filter.DeleteSpecifiedRegion(region_index)
-            connect_filter.Update()
+                print(f"Error processing ring region {loop_index}: {e}")
 
         return detected_rings
 
-    def _process_detected_ring_region(self, connect_filter, region_index, debug=False) -> Ring | None:
+    def _process_detected_ring_loop(self, loop_index, distance, debug=False) -> Ring | None:
         """
-        Processes a single connected component from the connectivity filter, cleaning and converting it to a Ring object.
+        Converts a single boundary loop to a Ring object.
         """
         try:
-            # Tell the connect filter to focus only on the i-th region
-            connect_filter.AddSpecifiedRegion(region_index)
-
-            # Executes the filter for the specified region
-            connect_filter.Update()
-
-            # Gets the actual geometric data (points and lines) for this single ring
-            region_ug = connect_filter.GetOutput()
+            loops = self.boundary_loops
+            ring_pd = loops.polydata(loop_index)
 
-            # Converts vtkUnstructuredGrid output from the connectivity filter into a vtkPolyData
-            region_pd = apply_vtk_geom_filter(region_ug)
-            region_pd = clean_polydata(region_pd)
-
-            if region_pd is None or region_pd.GetNumberOfPoints() == 0:
+            if ring_pd.GetNumberOfPoints() == 0:
                 if debug:
-                    print(f"Region {region_index} is empty after cleaning.")
+                    print(f"Region {loop_index} is empty.")
                 return None
 
             if debug:
                 # Save a debug version of the ring for inspection
-                debug_path = os.path.join(self.outdir, f'ring_{region_index}.vtk')
-                Mesh(region_pd).save(debug_path)
-
-            ring_poly_copy = vtk.vtkPolyData()
-            ring_poly_copy.DeepCopy(region_pd)
-
-            # Compute the center of mass and distance from the apex for classification
-            center = get_center_of_mass(region_pd, set_use_scalars_as_weights=False)
-            distance = np.linalg.norm(np.array(self.apex) - np.array(center))
-            num_pts = region_pd.GetNumberOfPoints()
+                debug_path = os.path.join(self.outdir, f'ring_{loop_index}.vtk')
+                Mesh(ring_pd).save(debug_path)
 
-            ring_obj = Ring(region_index, "", num_pts, center, distance, ring_poly_copy)
+            ring_obj = Ring(loop_index, "", int(loops.n_points[loop_index]), tuple(loops.centers[loop_index]),
+                            float(distance), ring_pd, radius=float(loops.radii[loop_index]))
             return ring_obj
 
         except Exception as e:
             if debug:
-                print(f"Error processing region {region_index}: {e}")
+                print(f"Error processing region {loop_index}: {e}")
             return None
 
     @staticmethod
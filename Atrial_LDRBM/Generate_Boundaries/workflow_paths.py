@@ -1,4 +1,8 @@
+import hashlib
+import json
+import os
 from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
 
 # Configuration dictionary for all path components and naming conventions.
 # Modifying these values will change the output paths and names across the pipeline.
@@ -12,10 +16,30 @@ PATH_COMPONENTS = {
     "fibers_dir_suffix": "_fibers",
     "mesh_data_suffix": "_mesh_data.csv",
     "bilayer_fiber_suffix": "_bilayer_with_fiber",
-    "vol_fiber_suffix": "_vol_with_fiber"
+    "vol_fiber_suffix": "_vol_with_fiber",
+    "manifest_suffix": "_workflow.json"
 }
 
 
+def path_digest(path) -> Optional[str]:
+    """
+    SHA-1 of a file, or of the relative names and contents of all files below a directory.
+    Returns None if the path does not exist.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    sha = hashlib.sha1()
+    files = [path] if path.is_file() else sorted(p for p in path.rglob('*') if p.is_file())
+    for file_path in files:
+        if file_path != path:
+            sha.update(str(file_path.relative_to(path)).encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
 class WorkflowPaths:
     """
     A stateful class that centrally replicates the exact file and directory paths
@@ -27,11 +51,88 @@ class WorkflowPaths:
         self.atrium = atrium
         self._active_stage = 'initial'
         self._base_paths = {'initial': self.initial_mesh.with_suffix('')}
+        # Completed stages of this and previous runs, as stored in the manifest
+        self._stage_records: Dict[str, Dict[str, Any]] = self._load_stage_records()
+        self._stage_ran = False
 
     def _update_stage(self, stage_name: str, base_path: str):
         """Private method to update the internal state of the pipeline."""
         self._active_stage = stage_name
         self._base_paths[stage_name] = Path(base_path).with_suffix('')
+        self.save_manifest()
+
+    @property
+    def manifest_path(self) -> Path:
+        """Path of the JSON manifest holding the stage table, next to the input mesh."""
+        return self.initial_mesh_base.with_name(
+            f"{self.initial_mesh_base.name}_{self.atrium}{PATH_COMPONENTS['manifest_suffix']}")
+
+    def _load_stage_records(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f).get('stages', {})
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        """Writes the stage table to the manifest, replacing it atomically."""
+        manifest = {
+            'initial_mesh': str(self.initial_mesh),
+            'atrium': self.atrium,
+            'active_stage': self._active_stage,
+            'base_paths': {name: str(path) for name, path in self._base_paths.items()},
+            'stages': self._stage_records,
+        }
+        tmp_path = self.manifest_path.with_name(f"{self.manifest_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    @staticmethod
+    def input_digests(inputs: Iterable) -> Dict[str, Optional[str]]:
+        """Digests of the input files and directories of a stage, taken before it runs."""
+        return {str(path): path_digest(path) for path in inputs}
+
+    def record_stage(self, stage_name: str, input_digests: Optional[Dict[str, Optional[str]]] = None,
+                     outputs: Iterable = (), params: Optional[Dict[str, Any]] = None,
+                     results: Optional[Dict[str, Any]] = None):
+        """
+        Stores a completed stage in the manifest with the digests of its inputs, its output paths, its parameters, its
+        JSON results and the active mesh it left behind.
+        """
+        self._stage_records[stage_name] = {
+            'active_stage': self._active_stage,
+            'base_path': str(self.active_mesh_base),
+            'inputs': input_digests or {},
+            'outputs': [str(path) for path in outputs],
+            'params': json.loads(json.dumps(params or {})),
+            'results': json.loads(json.dumps(results or {})),
+        }
+        self._stage_ran = True
+        self.save_manifest()
+
+    def stage_is_current(self, stage_name: str, inputs: Iterable = (), params: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        True if the stage was completed with the same parameters and inputs and all its outputs still exist. Once a
+        stage has run again, the stages after it are not current either, since later stages may update the outputs of
+        earlier ones in place.
+        """
+        record = self._stage_records.get(stage_name)
+        if self._stage_ran or record is None or record['params'] != json.loads(json.dumps(params or {})):
+            return False
+        if record['inputs'] != self.input_digests(inputs):
+            return False
+        return all(Path(path).exists() for path in record['outputs'])
+
+    def resume_stage(self, stage_name: str) -> Dict[str, Any]:
+        """
+        Restores the active mesh a recorded stage left behind, instead of running the stage again.
+
+        :return: The results recorded for the stage
+        """
+        record = self._stage_records[stage_name]
+        self._update_stage(record['active_stage'], record['base_path'])
+        return record['results']
 
     def log_current_stage(self):
         """Logs the currently active stage and mesh base path to the console."""
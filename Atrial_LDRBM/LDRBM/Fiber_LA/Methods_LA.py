@@ -28,12 +28,17 @@ import collections
 
 import numpy as np
 import vtk
-from numpy.ma.extras import unique
+from scipy import sparse
+from scipy.sparse.csgraph import minimum_spanning_tree
 from scipy.spatial import cKDTree
 from scipy.spatial.distance import cosine
 from vtk.numpy_interface import dataset_adapter as dsa
 
 import standalones.function
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import mesh_to_numpy
+from Atrial_LDRBM.mesh_topology import ConnectedRegions, MeshTopology, cell_connectivity, cell_types, \
+    cells_around_path, closest_point_id, get_geodesic_paths, nearest_path_segment, path_segment_tangents, \
+    plane_band_edge_mask
 from vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations import vtk_thr
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import get_normalized_cross_product
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
@@ -41,7 +46,7 @@ from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, num
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_polydata_writer, vtk_unstructured_grid_writer, \
     vtk_xml_unstructured_grid_writer
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, get_vtk_geom_filter_port, \
-    clean_polydata, vtk_append, apply_extract_cell_filter, get_center_of_mass, get_feature_edges, \
+    clean_polydata, apply_extract_cell_filter, get_center_of_mass, get_feature_edges, \
     get_elements_above_plane
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane, init_connectivity_filter, \
@@ -123,35 +128,63 @@ def generate_bilayer(endo, epi):
     tree = cKDTree(endo_pts)
     dd, ii = tree.query(epi_pts)
 
-    lines = vtk.vtkCellArray()
+    # line i ends on the epi point placed at epi_pts[ii[i]], which is epi point ii[ii[i]]
+    return assemble_bilayer(endo, epi, np.arange(len(endo_pts)), ii[ii[:len(endo_pts)]])
 
-    for i in range(len(endo_pts)):
-        line = vtk.vtkLine()
-        line.GetPointIds().SetId(0, i);
-        line.GetPointIds().SetId(1, len(endo_pts) + ii[i]);
-        lines.InsertNextCell(line)
 
-    points = np.concatenate((endo_pts, epi_pts[ii, :]), axis=0)
-    polydata = vtk.vtkUnstructuredGrid()
-    vtkPts = vtk.vtkPoints()
-    vtkPts.SetData(numpy_to_vtk(points))
-    polydata.SetPoints(vtkPts)
-    polydata.SetCells(3, lines)
+BILAYER_LINE_TAG = 100
 
-    fibers = np.zeros((len(endo_pts), 3), dtype="float32")
-    fibers[:, 0] = 1
 
-    tag = np.ones((len(endo_pts), 1), dtype=int)
-    tag[:, ] = 100
+def assemble_bilayer(endo, epi, endo_ids, epi_ids):
+    """
+    Builds the bilayer grid made of endo, epi and the lines connecting endo point endo_ids[i] to epi point epi_ids[i].
 
-    meshNew = dsa.WrapDataObject(polydata)
-    meshNew.CellData.append(tag, "elemTag")
-    meshNew.CellData.append(fibers, "fiber")
-    fibers = np.zeros((len(endo_pts), 3), dtype="float32")
-    fibers[:, 1] = 1
-    meshNew.CellData.append(fibers, "sheet")
+    The grid equals appending endo, epi and the lines with merged points, as the layers do not share points, but is
+    assembled from the arrays of both layers without a point locator. Like the append, only the cell arrays
+    elemTag, fiber and sheet are kept if both layers have them. The lines get elemTag 100, fiber (1, 0, 0) and
+    sheet (0, 1, 0).
 
-    bilayer = vtk_append([endo, epi, meshNew.VTKObject], merge_points=True)
+    :return: vtkUnstructuredGrid with the endo points, then the epi points
+    """
+    n_endo = endo.GetNumberOfPoints()
+    n_lines = len(endo_ids)
+    points = np.concatenate((vtk_to_numpy(endo.GetPoints().GetData()), vtk_to_numpy(epi.GetPoints().GetData())))
+
+    endo_offsets, endo_connectivity = cell_connectivity(endo)
+    epi_offsets, epi_connectivity = cell_connectivity(epi)
+    lines = np.column_stack((endo_ids, np.asarray(epi_ids) + n_endo)).ravel()
+    offsets = np.concatenate((endo_offsets, epi_offsets[1:] + endo_offsets[-1],
+                              2 * np.arange(1, n_lines + 1) + endo_offsets[-1] + epi_offsets[-1]))
+    connectivity = np.concatenate((endo_connectivity, epi_connectivity + n_endo, lines))
+    types = np.concatenate((cell_types(endo), cell_types(epi), np.full(n_lines, vtk.VTK_LINE, dtype=np.uint8)))
+
+    cells = vtk.vtkCellArray()
+    cells.SetData(numpy_to_vtk(offsets.astype(np.int64), deep=True, array_type=vtk.VTK_ID_TYPE),
+                  numpy_to_vtk(connectivity.astype(np.int64), deep=True, array_type=vtk.VTK_ID_TYPE))
+    bilayer = vtk.vtkUnstructuredGrid()
+    vtkPts = vtk.vtkPoints()
+    vtkPts.SetData(numpy_to_vtk(points, deep=True))
+    bilayer.SetPoints(vtkPts)
+    bilayer.SetCells(numpy_to_vtk(types, deep=True, array_type=vtk.VTK_UNSIGNED_CHAR), cells)
+
+    line_fiber = np.zeros((n_lines, 3), dtype="float32")
+    line_fiber[:, 0] = 1
+    line_sheet = np.zeros((n_lines, 3), dtype="float32")
+    line_sheet[:, 1] = 1
+    line_data = {"elemTag": np.full(n_lines, BILAYER_LINE_TAG), "fiber": line_fiber, "sheet": line_sheet}
+
+    for name, line_values in line_data.items():
+        endo_array = endo.GetCellData().GetArray(name)
+        epi_array = epi.GetCellData().GetArray(name)
+        if endo_array is None or epi_array is None:
+            continue
+        endo_values = vtk_to_numpy(endo_array)
+        values = np.concatenate((endo_values, vtk_to_numpy(epi_array).reshape(-1, *endo_values.shape[1:]),
+                                 line_values.reshape(-1, *endo_values.shape[1:])))
+        array = numpy_to_vtk(np.ascontiguousarray(values.astype(endo_values.dtype)), deep=True,
+                             array_type=endo_array.GetDataType())
+        array.SetName(name)
+        bilayer.GetCellData().AddArray(array)
 
     return bilayer
 
@@ -244,18 +277,18 @@ def dijkstra_path_on_a_plane(polydata, StartVertex, EndVertex, plane_point):
 
     plane = initialize_plane(norm_1[0], point_start)
 
-    extracted_mesh_1 = get_elements_above_plane(polydata, plane)
-
     point_moved = point_start - 1.5 * norm_1
 
     plane2 = initialize_plane(-norm_1[0], point_moved[0])
 
-    band = apply_vtk_geom_filter(get_elements_above_plane(extracted_mesh_1, plane2))
+    # restrict the cached surface graph to the band between both planes instead of extracting the band
+    geodesic_paths = get_geodesic_paths(polydata)
+    edge_mask, band_points = plane_band_edge_mask(polydata, [plane, plane2], geodesic_paths.topology)
 
-    StartVertex = find_closest_point(band, point_start)
-    EndVertex = find_closest_point(band, point_end)
+    StartVertex = closest_point_id(geodesic_paths.topology.points, point_start, band_points)
+    EndVertex = closest_point_id(geodesic_paths.topology.points, point_end, band_points)
 
-    points_data = dijkstra_path(band, StartVertex, EndVertex)
+    points_data = geodesic_paths.path(StartVertex, EndVertex, edge_mask)
     return points_data
 
 
@@ -283,59 +316,13 @@ def creat_tube(center1, center2, radius):
     return tube
 
 
-def get_element_ids_around_path_within_radius(mesh, points_data, radius):
+def get_element_ids_around_path_within_radius(mesh, points_data, radius, topology=None):
     gl_ids = vtk_to_numpy(mesh.GetCellData().GetArray('Global_ids'))
+    return np.unique(gl_ids[cells_around_path(mesh, points_data, radius, topology)])
 
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-
-    mesh_id_list = vtk.vtkIdList()
-    for i in range(len(points_data)):
-        temp_result = vtk.vtkIdList()
-        locator.FindPointsWithinRadius(radius, points_data[i], temp_result)
-        for j in range(temp_result.GetNumberOfIds()):
-            mesh_id_list.InsertNextId(temp_result.GetId(j))
-
-    mesh_cell_id_list = vtk.vtkIdList()
-    mesh_cell_temp_id_list = vtk.vtkIdList()
-    for i in range(mesh_id_list.GetNumberOfIds()):
-        mesh.GetPointCells(mesh_id_list.GetId(i), mesh_cell_temp_id_list)
-        for j in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-            mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(j))
-
-    ids = []
-
-    for i in range(mesh_cell_id_list.GetNumberOfIds()):
-        index = mesh_cell_id_list.GetId(i)
-        ids.append(gl_ids[index])
-
-    return unique(ids)
-
-
-def assign_element_tag_around_path_within_radius(mesh, points_data, radius, tag, element_tag):
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-
-    mesh_id_list = vtk.vtkIdList()
-    for i in range(len(points_data)):
-        temp_result = vtk.vtkIdList()
-        locator.FindPointsWithinRadius(radius, points_data[i], temp_result)
-        for j in range(temp_result.GetNumberOfIds()):
-            mesh_id_list.InsertNextId(temp_result.GetId(j))
-
-    mesh_cell_id_list = vtk.vtkIdList()
-    mesh_cell_temp_id_list = vtk.vtkIdList()
-    for i in range(mesh_id_list.GetNumberOfIds()):
-        mesh.GetPointCells(mesh_id_list.GetId(i), mesh_cell_temp_id_list)
-        for j in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-            mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(j))
-
-    for i in range(mesh_cell_id_list.GetNumberOfIds()):
-        index = mesh_cell_id_list.GetId(i)
-        tag[index] = element_tag
 
+def assign_element_tag_around_path_within_radius(mesh, points_data, radius, tag, element_tag, topology=None):
+    tag[cells_around_path(mesh, points_data, radius, topology)] = element_tag
     return tag
 
 
@@ -349,48 +336,33 @@ def normalize_vector(vector):
     return vector_norm
 
 
-def assign_element_fiber_around_path_within_radius(mesh, points_data, radius, fiber, smooth=True):
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-    if smooth:
-        for i in range(len(points_data)):
-            if i % 5 == 0 and i < 5:
-                vector = points_data[5] - points_data[0]
-            else:
-                vector = points_data[i] - points_data[i - 5]
-            vector = normalize_vector(vector)
-            mesh_point_temp_id_list = vtk.vtkIdList()
-            locator.FindPointsWithinRadius(radius, points_data[i], mesh_point_temp_id_list)
-            mesh_cell_temp_id_list = vtk.vtkIdList()
-            mesh_cell_id_list = vtk.vtkIdList()
-            for j in range(mesh_point_temp_id_list.GetNumberOfIds()):
-                mesh.GetPointCells(mesh_point_temp_id_list.GetId(j), mesh_cell_temp_id_list)
-                for h in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-                    mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(h))
-
-            for k in range(mesh_cell_id_list.GetNumberOfIds()):
-                index = mesh_cell_id_list.GetId(k)
-                fiber[index] = vector
-    else:
-        for i in range(len(points_data)):
-            if i < 1:
-                vector = points_data[1] - points_data[0]
-            else:
-                vector = points_data[i] - points_data[i - 1]
-            vector = normalize_vector(vector)
-            mesh_point_temp_id_list = vtk.vtkIdList()
-            locator.FindPointsWithinRadius(radius, points_data[i], mesh_point_temp_id_list)
-            mesh_cell_temp_id_list = vtk.vtkIdList()
-            mesh_cell_id_list = vtk.vtkIdList()
-            for j in range(mesh_point_temp_id_list.GetNumberOfIds()):
-                mesh.GetPointCells(mesh_point_temp_id_list.GetId(j), mesh_cell_temp_id_list)
-                for h in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-                    mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(h))
-
-            for k in range(mesh_cell_id_list.GetNumberOfIds()):
-                index = mesh_cell_id_list.GetId(k)
-                fiber[index] = vector
+def element_fiber_around_path_within_radius(mesh, points_data, radius, smooth=True, topology=None):
+    """
+    Computes the tangent of the nearest path segment for the cells around a path.
+    With smooth the tangents span five path points.
+
+    :param topology: Optional MeshTopology of the mesh, reused across calls
+    :return: Cell ids, fiber of each of these cells
+    """
+    points_data = np.asarray(points_data, dtype=float)
+    if len(points_data) < 2:
+        return np.empty(0, dtype=np.int64), np.empty((0, 3))
+    if topology is None:
+        topology = MeshTopology(mesh)
+    cell_ids = topology.cells_around_path(points_data, radius)
+    segments = nearest_path_segment(points_data, topology.centroids[cell_ids])
+    return cell_ids, path_segment_tangents(points_data, smooth)[segments]
+
+
+def assign_element_fiber_around_path_within_radius(mesh, points_data, radius, fiber, smooth=True, topology=None):
+    """
+    Orients the cells around a path along the tangent of their nearest path segment.
+    With smooth the tangents span five path points.
+
+    :param topology: Optional MeshTopology of the mesh, reused across calls
+    """
+    cell_ids, path_fiber = element_fiber_around_path_within_radius(mesh, points_data, radius, smooth, topology)
+    fiber[cell_ids] = path_fiber
     return fiber
 
 
@@ -803,52 +775,89 @@ def smart_bridge_writer(tube, sphere_1, sphere_2, name, job):
     vtk_polydata_writer(job.ID + "/bridges/" + str(name) + "_sphere_2.vtk", meshNew.VTKObject)
 
 
-def find_tau(model, ub, lb, low_up, scalar):
-    k = 1
-    while ub - lb > 0.01:
-        if low_up == "low":
-            thresh = get_lower_threshold(model, (ub + lb) / 2, "vtkDataObject::FIELD_ASSOCIATION_CELLS", scalar)
-        else:
-            thresh = get_upper_threshold(model, (ub + lb) / 2, "vtkDataObject::FIELD_ASSOCIATION_CELLS", scalar)
+def threshold_region_counts(model, values):
+    """
+    Counts the connected regions of the cells kept by a lower threshold (cell scalar <= t) for every distinct
+    cell value t in one sorted sweep.
 
-        connect = init_connectivity_filter(thresh.GetOutput(), ExtractionModes.ALL_REGIONS)
-        num = connect.GetNumberOfExtractedRegions()
+    Cells are connected through shared points like in vtkConnectivityFilter. Every mesh edge is weighted by the
+    rank of the first cell value at which it is kept; a minimum spanning forest (Kruskal's union-find sweep)
+    then gives the number of merges up to each threshold, and the region count is the number of kept points
+    minus the number of merges.
 
-        print("Iteration: ", k)
-        print("Value of tao: ", (ub + lb) / 2)
-        print("Number of regions: ", num, "\n")
+    :param model: Mesh made only of triangles or only of tetrahedra
+    :param values: Cell values (n_cells,)
+    :return: Ascending distinct cell values and the region count of the lower threshold at each of them
+    """
+    _, cells = mesh_to_numpy(model)
+    n_points = model.GetNumberOfPoints()
 
-        if low_up == "low":
-            if num == 1:
-                ub = (ub + lb) / 2
-            elif num > 1:
-                lb = (ub + lb) / 2
-        else:
-            if num == 1:
-                lb = (ub + lb) / 2
-            elif num > 1:
-                ub = (ub + lb) / 2
+    thresholds, ranks = np.unique(values, return_inverse=True)
+    ranks = ranks.reshape(-1) + 1  # zero weights would be dropped from the sparse graph
+
+    # a point is kept from the first threshold that keeps one of its cells
+    point_rank = np.full(n_points, len(thresholds) + 1)
+    np.minimum.at(point_rank, cells.ravel(), np.repeat(ranks, cells.shape[1]))
+
+    i, j = np.triu_indices(cells.shape[1], 1)
+    first, second = cells[:, i].ravel(), cells[:, j].ravel()
+    edge_rank = np.repeat(ranks, len(i))
+    lo, hi = np.minimum(first, second), np.maximum(first, second)
+    order = np.lexsort((edge_rank, hi, lo))
+    lo, hi, edge_rank = lo[order], hi[order], edge_rank[order]
+    unique_edge = np.ones(len(lo), dtype=bool)
+    unique_edge[1:] = (lo[1:] != lo[:-1]) | (hi[1:] != hi[:-1])
+
+    graph = sparse.coo_matrix((edge_rank[unique_edge].astype(float), (lo[unique_edge], hi[unique_edge])),
+                              shape=(n_points, n_points)).tocsr()
+    merge_ranks = np.sort(minimum_spanning_tree(graph).data)
+
+    threshold_ranks = np.arange(1, len(thresholds) + 1)
+    kept_points = np.searchsorted(np.sort(point_rank), threshold_ranks, side='right')
+    merges = np.searchsorted(merge_ranks, threshold_ranks, side='right')
+    return thresholds, kept_points - merges
 
-        k += 1
 
+def find_tau(model, ub, lb, low_up, scalar):
+    """
+    Finds the threshold in [lb, ub] right before the cells kept by a lower ("low", scalar <= tau) or
+    upper ("up", scalar >= tau) threshold merge into a single region.
+
+    :return: The exact cell value at the transition, lb ("low") or ub ("up") if the regions are never separated
+    """
+    values = vtk_to_numpy(model.GetCellData().GetArray(scalar)).astype(float)
     if low_up == "low":
-        return lb
+        thresholds, counts = threshold_region_counts(model, values)
+        lower, upper = lb, ub
     else:
-        return ub
+        # an upper threshold on the scalar is a lower threshold on its negation
+        thresholds, counts = threshold_region_counts(model, -values)
+        lower, upper = -ub, -lb
+
+    in_range = (thresholds >= lower) & (thresholds <= upper)
+    thresholds, counts = thresholds[in_range], counts[in_range]
+
+    # the lowest thresholds keep a single region before the regions appear, skip them and stop at the first merge
+    separated = np.flatnonzero(counts > 1)
+    if len(separated):
+        merged = np.flatnonzero(counts[separated[0]:] == 1)
+        last = separated[0] + merged[0] - 1 if len(merged) else len(counts) - 1
+        tau, n_regions = thresholds[last], counts[last]
+    else:
+        tau, n_regions = lower, 1
 
+    if low_up != "low":
+        tau = -tau
+    print("Value of tao: ", tau)
+    print("Number of regions: ", n_regions, "\n")
+    return tau
 
-def distinguish_PVs(connect, PVs, df, name1, name2):
-    num = connect.GetNumberOfExtractedRegions()
-    connect.SetExtractionModeToSpecifiedRegions()
 
+def distinguish_PVs(PV_mesh, PVs, df, name1, name2):
     centroid1 = df[name1].to_numpy()
     centroid2 = df[name2].to_numpy()
 
-    for i in range(num):
-        connect.AddSpecifiedRegion(i)
-        connect.Update()
-        single_PV = connect.GetOutput()
-
+    for single_PV in ConnectedRegions(PV_mesh):
         # Clean unused points
         surface = apply_vtk_geom_filter(single_PV)
         surface = clean_polydata(surface)
@@ -880,9 +889,6 @@ def distinguish_PVs(connect, PVs, df, name1, name2):
         else:
             PVs[name2] = vtk_to_numpy(single_PV.GetCellData().GetArray('Global_ids'))
 
-        connect.DeleteSpecifiedRegion(i)
-        connect.Update()
-
     return PVs
 
 
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped reader for openCARP IGB files.
+
+The header is parsed and the payload is exposed as a read-only numpy.memmap, so Laplace and activation
+outputs can be handed to VTK (e.g. dsa PointData.append) without reading and copying the whole file.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import numpy as np
+
+IGB_HEADER_BLOCK = 1024
+
+# IGB data type -> (numpy scalar type, number of components)
+IGB_TYPES = {
+    'byte': ('u1', 1),
+    'char': ('i1', 1),
+    'short': ('i2', 1),
+    'long': ('i4', 1),
+    'int': ('i4', 1),
+    'uint': ('u4', 1),
+    'float': ('f4', 1),
+    'double': ('f8', 1),
+    'vec3f': ('f4', 3),
+    'vec3d': ('f8', 3),
+    'vec4f': ('f4', 4),
+    'vec4d': ('f8', 4),
+}
+
+
+def read_igb_header(igb_file):
+    """
+    Parses the ASCII header of an IGB file.
+
+    The header is made of 1024 byte blocks terminated by a form feed character.
+
+    :param igb_file: Path to the IGB file
+    :return: Dictionary of the header entries and the header size in bytes
+    """
+    raw = b''
+    with open(igb_file, 'rb') as f:
+        while b'\f' not in raw:
+            block = f.read(IGB_HEADER_BLOCK)
+            if len(block) < IGB_HEADER_BLOCK:
+                raise ValueError(f"{igb_file} has no complete IGB header")
+            raw += block
+
+    header = {}
+    for token in raw[:raw.index(b'\f')].decode('ascii', errors='replace').split():
+        if ':' in token:
+            key, value = token.split(':', 1)
+            header[key] = value
+    return header, len(raw)
+
+
+def read_igb(igb_file, time_slice=None):
+    """
+    Maps the payload of an IGB file into memory without reading it.
+
+    :param igb_file: Path to the IGB file
+    :param time_slice: Optional index of a single time slice (negative values count from the end)
+    :return: Read-only memmap of shape (t, nodes[, components]), or (nodes[, components]) for a single time slice
+    """
+    header, offset = read_igb_header(igb_file)
+    data_type = header.get('type', 'float')
+    if data_type not in IGB_TYPES:
+        raise ValueError(f"Unsupported IGB data type {data_type} in {igb_file}")
+    scalar, components = IGB_TYPES[data_type]
+    byte_order = '>' if header.get('systeme', 'little_endian') == 'big_endian' else '<'
+    dtype = np.dtype(byte_order + scalar)
+
+    n_nodes = int(header.get('x', 1)) * int(header.get('y', 1)) * int(header.get('z', 1))
+    n_times = int(header.get('t', 1))
+    shape = (n_times, n_nodes) if components == 1 else (n_times, n_nodes, components)
+    data = np.memmap(igb_file, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    if time_slice is not None:
+        data = data[time_slice]
+    if dtype.byteorder == '>':
+        # VTK needs native byte order, this is the only case where the payload is copied
+        data = data.astype(dtype.newbyteorder('='))
+    return data
@@ -26,12 +26,38 @@ under the License.
 """
 import os
 
+import numpy as np
 import vtk
+from vtk.numpy_interface import dataset_adapter as dsa
 
-from vtk_opencarp_helper_methods.vtk_methods.converters import convert_point_to_cell_data
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import mesh_to_numpy, cell_gradients, cell_normals
+from vtk_opencarp_helper_methods.vtk_methods.converters import convert_point_to_cell_data, vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_unstructured_grid_writer
 
 
+def add_cell_gradients(mesh, model, name_list, mesh_type):
+    """
+    Adds to mesh, in place, a grad_<name> cell array with the P1 gradient of every phie_<name> point array of model.
+    On bilayer surfaces grad_phi holds the unit cell normals instead.
+
+    :param mesh: Mesh receiving the cell arrays
+    :param model: Mesh with the same points and cells holding the phie_<name> point arrays
+    :param name_list: Names of the Laplace solutions
+    :param mesh_type: 'vol' or 'bilayer'
+    """
+    points, cells = mesh_to_numpy(model)
+    mesh_cell_data = dsa.WrapDataObject(mesh).CellData
+
+    if 'phi' in name_list and mesh_type != "vol":
+        mesh_cell_data.append(cell_normals(points, cells), 'grad_phi')
+        name_list = [var for var in name_list if var != 'phi']
+
+    fields = np.column_stack([vtk_to_numpy(model.GetPointData().GetArray("phie_" + str(var))) for var in name_list])
+    gradients = cell_gradients(points, cells, fields)
+    for var, gradient in zip(name_list, gradients):
+        mesh_cell_data.append(gradient, 'grad_' + str(var))
+
+
 def la_calculate_gradient(args, model, job):
     name_list = ['phi', 'r', 'v', 'ab']
 
@@ -39,41 +65,15 @@ def la_calculate_gradient(args, model, job):
 
     model_cell_data = convert_point_to_cell_data(model, None)
 
-    for var in name_list:
-        print('Calculating the gradient of ' + str(var) + '...')
-        if var == 'phi':
-            # using the vtkGradientFilter to calculate the gradient
-            if args.mesh_type == "vol":
-                gradientFilter = vtk.vtkGradientFilter()
-                gradientFilter.SetInputData(model_cell_data)
-                gradientFilter.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS,
-                                                      "phie_" + str(var))
-                gradientFilter.SetResultArrayName('grad_' + str(var))
-                gradientFilter.Update()
-                LA_gradient = gradientFilter.GetOutput()
-            else:
-                normalFilter = vtk.vtkPolyDataNormals()
-                normalFilter.SetInputData(model_cell_data)
-                normalFilter.ComputeCellNormalsOn()
-                normalFilter.ComputePointNormalsOff()
-                normalFilter.SplittingOff()
-                normalFilter.Update()
-                LA_gradient = normalFilter.GetOutput()
-                LA_gradient.GetCellData().GetArray("Normals").SetName('grad_' + str(var))
+    print('Calculating the gradients of ' + ', '.join(name_list) + '...')
+    add_cell_gradients(model_cell_data, model, name_list, args.mesh_type)
+    print('Calculating the gradients of ' + ', '.join(name_list) + '... Done!')
 
-        else:
-            gradientFilter = vtk.vtkGradientFilter()
-            gradientFilter.SetInputData(LA_gradient)
-            gradientFilter.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS,
-                                                  "phie_" + str(var))
-            gradientFilter.SetResultArrayName('grad_' + str(var))
-            gradientFilter.Update()
-            LA_gradient = gradientFilter.GetOutput()
-
-        print('Calculating the gradient of ' + str(var) + '... Done!')
-
-    output = vtk.vtkUnstructuredGrid()
-    output.DeepCopy(LA_gradient)
+    if isinstance(model_cell_data, vtk.vtkUnstructuredGrid):
+        output = model_cell_data
+    else:
+        output = vtk.vtkUnstructuredGrid()
+        output.DeepCopy(model_cell_data)
     if args.debug == 1:
         # write
         simid = job.ID + "/gradient"
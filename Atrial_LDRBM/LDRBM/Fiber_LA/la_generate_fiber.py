@@ -36,16 +36,16 @@ from vtk.numpy_interface import dataset_adapter as dsa
 import Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA as Method
 from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import clean_all_data
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_laplace import laplace_0_1
-from vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations import vtk_thr
+from Atrial_LDRBM.LDRBM.Fiber_LA.threshold_masks import ThresholdMasks, THRESHOLD_BETWEEN, THRESHOLD_LOWER, \
+    THRESHOLD_UPPER
+from Atrial_LDRBM.mesh_topology import MeshTopology
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import normalize_vectors
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_unstructured_grid_writer, \
     vtk_xml_unstructured_grid_writer, write_to_vtx
-from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, generate_ids, \
-    get_elements_above_plane
-from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane_with_points, init_connectivity_filter, \
-    ExtractionModes
+from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, generate_ids
+from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane_with_points
 
 EXAMPLE_DIR = os.path.dirname(os.path.realpath(__file__))
 
@@ -92,6 +92,9 @@ def la_generate_fiber(model, args, job):
 
     model = generate_ids(model, "Global_ids", "Global_ids")
 
+    # laplace_0_1 adds its solutions to model, so the masks also see phie_ab2 and phie_ab3
+    masks = ThresholdMasks(model)
+
     df = pd.read_csv(args.mesh + "_surf/rings_centroids.csv")
 
     # LPV
@@ -100,22 +103,18 @@ def la_generate_fiber(model, args, job):
     tao_lpv = Method.find_tau(model, ub, lb, "low", "phie_v")
     print('Calculating tao_lpv done! tap_lpv = ', tao_lpv)
 
-    thr_phi_v = vtk_thr(model, 1, "CELLS", "phie_v", tao_lpv)
-
-    connect = init_connectivity_filter(thr_phi_v, ExtractionModes.ALL_REGIONS)
+    lpv_mask = masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_v", tao_lpv)
 
     PVs = dict()
     # Distinguish between LIPV and LSPV
-    PVs = Method.distinguish_PVs(connect, PVs, df, "LIPV", "LSPV")
+    PVs = Method.distinguish_PVs(masks.extract(lpv_mask), PVs, df, "LIPV", "LSPV")
 
     model = laplace_0_1(args, job, model, "RPV", "LAA", "phie_ab2")
 
-    thr_lpv = vtk_thr(model, 1, "CELLS", "phie_v", tao_lpv)
-
-    phie_r2_tau_lpv = vtk_to_numpy(thr_lpv.GetCellData().GetArray('phie_r2'))
+    phie_r2_tau_lpv = masks.cell_values(lpv_mask, 'phie_r2')
     max_phie_r2_tau_lpv = np.max(phie_r2_tau_lpv)
 
-    phie_ab_tau_lpv = vtk_to_numpy(thr_lpv.GetPointData().GetArray('phie_ab2'))
+    phie_ab_tau_lpv = masks.point_values(lpv_mask, 'phie_ab2')
     max_phie_ab_tau_lpv = np.max(phie_ab_tau_lpv)
 
     print("max_phie_r2_tau_lpv ", max_phie_r2_tau_lpv)
@@ -127,12 +126,10 @@ def la_generate_fiber(model, args, job):
     tao_rpv = Method.find_tau(model, ub, lb, "up", "phie_v")
     print('Calculating tao_rpv done! tap_rpv = ', tao_rpv)
 
-    thr = vtk_thr(model, 0, "CELLS", "phie_v", tao_rpv)
-
-    connect = init_connectivity_filter(thr, ExtractionModes.ALL_REGIONS)
+    rpv_mask = masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_v", tao_rpv)
 
     # Distinguish between RIPV and RSPV
-    PVs = Method.distinguish_PVs(connect, PVs, df, "RIPV", "RSPV")
+    PVs = Method.distinguish_PVs(masks.extract(rpv_mask), PVs, df, "RIPV", "RSPV")
 
     start_time = datetime.datetime.now()
     print('Calculating fibers... ' + str(start_time))
@@ -147,12 +144,14 @@ def la_generate_fiber(model, args, job):
         tag_endo = np.zeros(len(r), dtype=int)
         tag_endo[:] = tag_dict['left_atrial_wall_endo']
 
+        epi_mask = masks.all()
+
     else:  # Volume mesh
         tag = np.ones(len(r), dtype=int) * tag_dict['left_atrial_wall_epi']
 
-        epi = vtk_thr(model, 0, "CELLS", "phie_phi", 0.5)
+        epi_mask = masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_phi", 0.5)
 
-        epi_ids = vtk_to_numpy(epi.GetCellData().GetArray('Global_ids'))
+        epi_ids = masks.ids(epi_mask)
 
         endo_ids = np.arange(len(r)).astype(int)
 
@@ -162,9 +161,10 @@ def la_generate_fiber(model, args, job):
 
     ## Optimize shape of LAA solving a laplacian with 0 in LAA and 1 in the boundary of LAA_s
 
-    LAA_bb = vtk_thr(model, 2, "POINTS", "phie_ab2", max_phie_ab_tau_lpv - 0.03, max_phie_ab_tau_lpv + 0.01)
+    LAA_bb = masks.threshold(THRESHOLD_BETWEEN, "POINTS", "phie_ab2", max_phie_ab_tau_lpv - 0.03,
+                             max_phie_ab_tau_lpv + 0.01)
 
-    LAA_bb_ids = vtk_to_numpy(LAA_bb.GetPointData().GetArray('Global_ids'))
+    LAA_bb_ids = masks.point_ids(LAA_bb)
 
     MV_ring_ids = np.loadtxt(f'{args.mesh}_surf/ids_MV.vtx', skiprows=2, dtype=int)
 
@@ -172,9 +172,9 @@ def la_generate_fiber(model, args, job):
 
     write_to_vtx(f'{args.mesh}_surf/ids_LAA_bb.vtx', LAA_bb_ids)
 
-    LAA_s = laplace_0_1(args, job, model, "LAA", "LAA_bb", "phie_ab3")
+    model = laplace_0_1(args, job, model, "LAA", "LAA_bb", "phie_ab3")
 
-    LAA_s = vtk_thr(LAA_s, 1, "POINTS", "phie_ab3", 0.95)
+    LAA_s = masks.threshold(THRESHOLD_LOWER, "POINTS", "phie_ab3", 0.95)
 
     ring_ids = np.loadtxt(f'{args.mesh}_surf/' + 'ids_MV.vtx', skiprows=2, dtype=int)
 
@@ -182,7 +182,7 @@ def la_generate_fiber(model, args, job):
 
     MV_ids = Method.get_element_ids_around_path_within_radius(model, rings_pts, 4 * args.scale)
 
-    LAA_ids = vtk_to_numpy(LAA_s.GetCellData().GetArray('Global_ids'))
+    LAA_ids = masks.ids(LAA_s)
 
     # tagging endo-layer
     if args.mesh_type == 'bilayer':
@@ -247,11 +247,9 @@ def la_generate_fiber(model, args, job):
 
     plane = initialize_plane_with_points(mv_mean, rpv_mean, lpv_mean, mv_mean, invert_norm=True)
 
-    band_s = vtk_thr(epi, 0, "CELLS", "phie_r2", max_phie_r2_tau_lpv)
-
-    extracted_mesh = get_elements_above_plane(band_s, plane)
+    band_s = epi_mask & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_r2", max_phie_r2_tau_lpv)
 
-    band_cell_ids = vtk_to_numpy(extracted_mesh.GetCellData().GetArray('Global_ids'))
+    band_cell_ids = masks.ids(band_s & masks.below_planes([plane]))
 
     if args.mesh_type == "bilayer":
         ab_grad_epi[band_cell_ids] = -r_grad[band_cell_ids]
@@ -358,31 +356,38 @@ def la_generate_fiber(model, args, job):
     if args.mesh_type == "vol":  # Extract epicardial surface
         surf = apply_vtk_geom_filter(model)
 
-        epi_surf = vtk_thr(surf, 0, "CELLS", "phie_phi", 0.5)
-        epi_surf_ids = vtk_to_numpy(epi_surf.GetCellData().GetArray('Global_ids'))
+        surf_masks = ThresholdMasks(surf)
+        epi_surf_mask = surf_masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_phi", 0.5)
+        epi_surf_ids = surf_masks.ids(epi_surf_mask)
 
-        epi_surf = apply_vtk_geom_filter(epi_surf)
+        epi_surf = apply_vtk_geom_filter(surf_masks.extract(epi_surf_mask))
 
     if args.mesh_type == "bilayer":
         bb_left, LAA_basis_inf, LAA_basis_sup, LAA_far_from_LIPV = Method.compute_wide_BB_path_left(epi, df,
                                                                                                     left_atrial_appendage_epi,
                                                                                                     mitral_valve_epi)
+        epi_topology = MeshTopology(epi)
         tag_epi = Method.assign_element_tag_around_path_within_radius(epi, bb_left, w_bb, tag_epi,
-                                                                      tag_dict['bachmann_bundel_left'])
-        el_epi = Method.assign_element_fiber_around_path_within_radius(epi, bb_left, w_bb, el_epi, smooth=True)
+                                                                      tag_dict['bachmann_bundel_left'],
+                                                                      topology=epi_topology)
+        el_epi = Method.assign_element_fiber_around_path_within_radius(epi, bb_left, w_bb, el_epi, smooth=True,
+                                                                       topology=epi_topology)
     else:
         bb_left, LAA_basis_inf, LAA_basis_sup, LAA_far_from_LIPV = Method.compute_wide_BB_path_left(epi_surf, df,
                                                                                                     left_atrial_appendage_epi,
                                                                                                     mitral_valve_epi)
+        epi_surf_topology = MeshTopology(epi_surf)
         tag[epi_surf_ids] = Method.assign_element_tag_around_path_within_radius(epi_surf, bb_left, w_bb,
                                                                                 vtk_to_numpy(
                                                                                     epi_surf.GetCellData().GetArray(
                                                                                         'elemTag')),
-                                                                                tag_dict['bachmann_bundel_left'])
+                                                                                tag_dict['bachmann_bundel_left'],
+                                                                                topology=epi_surf_topology)
         el[epi_surf_ids] = Method.assign_element_fiber_around_path_within_radius(epi_surf, bb_left, w_bb,
                                                                                  vtk_to_numpy(
                                                                                      epi_surf.GetCellData().GetArray(
-                                                                                         'fiber')), smooth=True)
+                                                                                         'fiber')), smooth=True,
+                                                                                 topology=epi_surf_topology)
 
     df["LAA_basis_inf"] = LAA_basis_inf
     df["LAA_basis_sup"] = LAA_basis_sup
@@ -30,9 +30,8 @@ from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_xml_unstructur
 
 EXAMPLE_DIR = os.path.dirname(os.path.realpath(__file__))
 
-from carputils.carpio import igb
-from carputils import tools
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_calculate_gradient import la_calculate_gradient
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import solve_laplace_fields
 from vtk.numpy_interface import dataset_adapter as dsa
 
 
@@ -41,76 +40,26 @@ def la_laplace(args, job, model):
     surfdir = f'{args.mesh}_surf/'
     parfdir = os.path.join(EXAMPLE_DIR, 'Parfiles')
 
+    lp_specs = []
     if args.mesh_type == 'vol':
-        ####################################
-        # Solver for the phi laplace solution
-        ####################################
-        cmd = tools.carp_cmd(parfdir + '/la_lps_phi.par')
-        simid = job.ID + '/Lp_phi'
-        cmd += ['-simID', simid,
-                '-meshname', meshdir,
-                '-stimulus[0].vtx_file', surfdir + 'ids_ENDO',
-                '-stimulus[1].vtx_file', surfdir + 'ids_EPI']
-
-        # Run simulation
-        job.carp(cmd)
-
-    #####################################
-    # Solver for the ab laplace solution
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/la_lps_ab.par')
-    simid = job.ID + '/Lp_ab'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_LPV',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RPV',
-            '-stimulus[2].vtx_file', surfdir + 'ids_MV',
-            '-stimulus[3].vtx_file', surfdir + 'ids_LAA']
-
-    # Run simulation
-    job.carp(cmd)
-
-    #####################################
-    # Solver for the v laplace solution
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/la_lps_v.par')
-    simid = job.ID + '/Lp_v'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_LPV',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RPV']
-
-    # Run simulation
-    job.carp(cmd)
-
-    #####################################
-    # Solver for the r laplace solution
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/la_lps_r.par')
-    simid = job.ID + '/Lp_r'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_LPV',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RPV',
-            '-stimulus[2].vtx_file', surfdir + 'ids_LAA',
-            '-stimulus[3].vtx_file', surfdir + 'ids_MV']
-
-    # Run simulation
-    job.carp(cmd)
-
-    #####################################
-    # Solver for the r2 laplace solution
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/la_lps_r2.par')
-    simid = job.ID + '/Lp_r2'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_LPV',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RPV',
-            '-stimulus[2].vtx_file', surfdir + 'ids_MV']
-
-    # Run simulation
-    job.carp(cmd)
+        # phi laplace solution
+        lp_specs.append(('phi', parfdir + '/la_lps_phi.par',
+                         [surfdir + 'ids_ENDO', surfdir + 'ids_EPI']))
+
+    # ab laplace solution
+    lp_specs.append(('ab', parfdir + '/la_lps_ab.par',
+                     [surfdir + 'ids_LPV', surfdir + 'ids_RPV', surfdir + 'ids_MV', surfdir + 'ids_LAA']))
+    # v laplace solution
+    lp_specs.append(('v', parfdir + '/la_lps_v.par',
+                     [surfdir + 'ids_LPV', surfdir + 'ids_RPV']))
+    # r laplace solution
+    lp_specs.append(('r', parfdir + '/la_lps_r.par',
+                     [surfdir + 'ids_LPV', surfdir + 'ids_RPV', surfdir + 'ids_LAA', surfdir + 'ids_MV']))
+    # r2 laplace solution
+    lp_specs.append(('r2', parfdir + '/la_lps_r2.par',
+                     [surfdir + 'ids_LPV', surfdir + 'ids_RPV', surfdir + 'ids_MV']))
+
+    solutions = solve_laplace_fields(args, job, model, meshdir, lp_specs)
 
     """
     generate .vtu files that contain the result of laplace solution as point/cell data
@@ -122,9 +71,8 @@ def la_laplace(args, job, model):
     if args.mesh_type == 'vol':
         name_list = ['phi', 'r', 'r2', 'v', 'ab']
     for var in name_list:
-        data = igb.IGBFile(job.ID + "/Lp_" + str(var) + "/phie.igb").data()
         # add the vtk array to model
-        meshNew.PointData.append(data, "phie_" + str(var))
+        meshNew.PointData.append(solutions[var], "phie_" + str(var))
 
     if args.debug == 1:
         # write
@@ -152,30 +100,17 @@ def laplace_0_1(args, job, model, name1, name2, outname):
     meshdir = args.mesh + '_surf/LA'
     surfdir = f'{args.mesh}_surf/'
     parfdir = os.path.join(EXAMPLE_DIR, 'Parfiles')
-    #####################################
-    # Solver for the ab laplace solution
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/la_lps_phi.par')
-    simid = job.ID + '/Lp_ab'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + f'ids_{name1}',
-            '-stimulus[1].vtx_file', surfdir + f'ids_{name2}']
-
+    # own simID per output, the openCARP result of la_laplace and the mapped phie.igb stay untouched
+    name = outname.replace('phie_', '')
     if name1 == "4":
-        cmd = tools.carp_cmd(parfdir + '/la_lps_phi_0_1_4.par')
-        simid = job.ID + '/Lp_ab'
-        cmd += ['-simID', simid,
-                '-meshname', meshdir,
-                '-stimulus[0].vtx_file', surfdir + 'ids_LSPV',
-                '-stimulus[1].vtx_file', surfdir + 'ids_LIPV',
-                '-stimulus[2].vtx_file', surfdir + 'ids_RSPV',
-                '-stimulus[3].vtx_file', surfdir + 'ids_RIPV']
-    # Run simulation
-    job.carp(cmd)
+        lp_spec = (name, parfdir + '/la_lps_phi_0_1_4.par',
+                   [surfdir + 'ids_LSPV', surfdir + 'ids_LIPV', surfdir + 'ids_RSPV', surfdir + 'ids_RIPV'])
+    else:
+        lp_spec = (name, parfdir + '/la_lps_phi.par',
+                   [surfdir + f'ids_{name1}', surfdir + f'ids_{name2}'])
+    data = solve_laplace_fields(args, job, model, meshdir, [lp_spec])[name]
 
     meshNew = dsa.WrapDataObject(model)
-    data = igb.IGBFile(job.ID + "/Lp_ab/phie.igb").data()
     meshNew.PointData.append(data, outname)
 
     if args.debug == 1:
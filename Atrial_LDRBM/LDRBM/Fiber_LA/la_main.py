@@ -33,6 +33,8 @@ from carputils import tools
 
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_generate_fiber import la_generate_fiber
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_laplace import la_laplace
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import LAPLACE_SOLVERS
+from Atrial_LDRBM.tracing import trace, traced_run
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.reader import smart_reader
@@ -71,6 +73,10 @@ def parser():
                         type=int,
                         default=1,
                         help='set to 1 if surface normals are pointing outside')
+    parser.add_argument('--laplace_solver',
+                        default='carp',
+                        choices=LAPLACE_SOLVERS,
+                        help='backend for the laplace-dirichlet solves: openCARP or in-process scipy')
 
     return parser
 
@@ -84,25 +90,31 @@ def jobID(args):
 def run(args, job):
     LA = init_mesh_and_fibers(args, "LA")
 
-    start_time = datetime.datetime.now()
-    init_start_time = datetime.datetime.now()
-
-    print('[Step 1] Solving laplace-dirichlet... ' + str(start_time))
-    output_laplace = la_laplace(args, job, LA)
-    end_time = datetime.datetime.now()
-    running_time = end_time - start_time
-    print('[Step 1] Solving laplace-dirichlet...done! ' + str(end_time) + '\nRunning time: ' + str(running_time) + '\n')
-
-    start_time = datetime.datetime.now()
-
-    print('[Step 2] Generating fibers... ' + str(start_time))
-    la_generate_fiber(output_laplace, args, job)
-    end_time = datetime.datetime.now()
-    running_time = end_time - start_time
-    print('[Step 2] Generating fibers...done! ' + str(end_time) + '\nRunning time: ' + str(running_time) + '\n')
-    fin_end_time = datetime.datetime.now()
-    tot_running_time = fin_end_time - init_start_time
-    print('Total running time: ' + str(tot_running_time))
+    # standalone runs write their own profile, runs started by pipeline.py are part of its profile
+    with traced_run('la_main', job.ID + '/result_LA/LA'):
+        start_time = datetime.datetime.now()
+        init_start_time = datetime.datetime.now()
+
+        print('[Step 1] Solving laplace-dirichlet... ' + str(start_time))
+        with trace('la_laplace'):
+            output_laplace = la_laplace(args, job, LA)
+        end_time = datetime.datetime.now()
+        running_time = end_time - start_time
+        print('[Step 1] Solving laplace-dirichlet...done! ' + str(end_time) + '\nRunning time: ' + str(running_time)
+              + '\n')
+
+        start_time = datetime.datetime.now()
+
+        print('[Step 2] Generating fibers... ' + str(start_time))
+        with trace('la_generate_fiber'):
+            la_generate_fiber(output_laplace, args, job)
+        end_time = datetime.datetime.now()
+        running_time = end_time - start_time
+        print('[Step 2] Generating fibers...done! ' + str(end_time) + '\nRunning time: ' + str(running_time)
+              + '\n')
+        fin_end_time = datetime.datetime.now()
+        tot_running_time = fin_end_time - init_start_time
+        print('Total running time: ' + str(tot_running_time))
 
 
 def init_mesh_and_fibers(args, atrium):
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+In-process Laplace-Dirichlet solver used as an alternative to the openCARP
+Laplace solves of the LDRBM.
+
+The boundary node sets are read from the same ids_*.vtx files and the
+Dirichlet values from the same .par stimulus definitions that are handed to
+openCARP, so both backends solve the same problem on the same mesh.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import vtk
+from carputils import tools
+from scipy import sparse
+from scipy.sparse.linalg import factorized
+
+from Atrial_LDRBM.LDRBM.Fiber_LA.igb_reader import read_igb
+from Atrial_LDRBM.scheduler import processes_for_mesh, split_cores
+from Atrial_LDRBM.tracing import current_path, trace
+from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
+
+LAPLACE_SOLVERS = ['carp', 'scipy']
+
+# openCARP stimulus types used by the Laplace parameter files
+STIM_GROUND = 3
+STIM_EXTRACELLULAR_VOLTAGE = 2
+
+DEGENERATE_TOLERANCE = 1e-8
+
+_STIMULUS_LINE = re.compile(r'^\s*stimulus\[(\d+)\]\.(\w+)\s*=\s*([^#\s]+)')
+_NUM_STIM_LINE = re.compile(r'^\s*num_stim\s*=\s*(\d+)')
+
+
+def read_vtx(vtx_file):
+    """
+    Reads the node ids of an openCARP .vtx file (count and domain header lines are skipped).
+
+    :param vtx_file: Path to the vtx file, with or without the .vtx extension
+    :return: Node ids as integer array
+    """
+    if not vtx_file.endswith('.vtx'):
+        vtx_file += '.vtx'
+    return np.atleast_1d(np.loadtxt(vtx_file, skiprows=2, dtype=int))
+
+
+def read_stimulus_values(par_file):
+    """
+    Extracts the Dirichlet value of every stimulus of a Laplace .par file.
+    Grounded stimuli (stimtype 3) are fixed to 0, extracellular voltage stimuli (stimtype 2) to their strength.
+
+    :param par_file: Path to the openCARP parameter file
+    :return: List of Dirichlet values ordered by stimulus index
+    """
+    num_stim = None
+    stimuli = {}
+    with open(par_file) as f:
+        for line in f:
+            num_match = _NUM_STIM_LINE.match(line)
+            if num_match:
+                num_stim = int(num_match.group(1))
+                continue
+            stim_match = _STIMULUS_LINE.match(line)
+            if stim_match:
+                index, key, value = stim_match.groups()
+                stimuli.setdefault(int(index), {})[key] = value
+
+    if num_stim is None:
+        num_stim = len(stimuli)
+
+    values = []
+    for i in range(num_stim):
+        stim = stimuli.get(i, {})
+        stimtype = int(stim.get('stimtype', STIM_GROUND))
+        if stimtype == STIM_GROUND:
+            values.append(0.0)
+        elif stimtype == STIM_EXTRACELLULAR_VOLTAGE:
+            values.append(float(stim.get('strength', 0.0)))
+        else:
+            raise ValueError(f"Unsupported stimtype {stimtype} for stimulus[{i}] in {par_file}")
+    return values
+
+
+def mesh_to_numpy(mesh):
+    """
+    Returns the points and the cell connectivity of a triangle or tetrahedral mesh.
+
+    :param mesh: vtkPolyData or vtkUnstructuredGrid with a single cell type
+    :return: points (n_points, 3), cells (n_cells, 3 or 4)
+    """
+    points = vtk_to_numpy(mesh.GetPoints().GetData()).astype(float)
+    cell_array = mesh.GetPolys() if isinstance(mesh, vtk.vtkPolyData) else mesh.GetCells()
+    offsets = vtk_to_numpy(cell_array.GetOffsetsArray())
+    connectivity = vtk_to_numpy(cell_array.GetConnectivityArray())
+    sizes = np.unique(np.diff(offsets))
+    if len(sizes) != 1 or sizes[0] not in (3, 4):
+        raise ValueError("Laplace solver supports meshes made only of triangles or only of tetrahedra")
+    return points, connectivity.reshape(-1, sizes[0]).astype(np.int64)
+
+
+def p1_gradients(points, cells):
+    """
+    Computes the constant gradients of the linear shape functions of every triangle or tetrahedron.
+
+    :param points: Node coordinates (n_points, 3)
+    :param cells: Cell connectivity (n_cells, 3) for triangles or (n_cells, 4) for tetrahedra
+    :return: gradients (n_cells, nodes_per_cell, 3) and cell areas/volumes (n_cells,)
+    """
+    x = points[cells]
+    # cells whose size vanishes relative to their longest edge get zero gradients
+    longest_edge = np.max([np.linalg.norm(x[:, i] - x[:, j], axis=1)
+                           for i in range(cells.shape[1]) for j in range(i)], axis=0)
+    if cells.shape[1] == 3:
+        normal = np.cross(x[:, 1] - x[:, 0], x[:, 2] - x[:, 0])
+        double_area = np.linalg.norm(normal, axis=1)
+        valid = double_area > DEGENERATE_TOLERANCE * longest_edge ** 2
+        unit_normal = np.zeros_like(normal)
+        unit_normal[valid] = normal[valid] / double_area[valid, None]
+        grads = np.zeros_like(x)
+        for i in range(3):
+            opposite_edge = x[:, (i + 2) % 3] - x[:, (i + 1) % 3]
+            grads[valid, i] = np.cross(unit_normal[valid], opposite_edge[valid]) / double_area[valid, None]
+        return grads, np.where(valid, 0.5 * double_area, 0.0)
+
+    jacobian = np.stack([x[:, 1] - x[:, 0], x[:, 2] - x[:, 0], x[:, 3] - x[:, 0]], axis=2)
+    det = np.linalg.det(jacobian)
+    valid = np.abs(det) > DEGENERATE_TOLERANCE * longest_edge ** 3
+    grads = np.zeros_like(x)
+    # rows of the inverse Jacobian are the gradients of the barycentric coordinates 1..3
+    inv_jacobian = np.linalg.inv(jacobian[valid])
+    grads[valid, 1:] = inv_jacobian
+    grads[valid, 0] = -inv_jacobian.sum(axis=1)
+    return grads, np.where(valid, np.abs(det) / 6.0, 0.0)
+
+
+def cell_gradients(points, cells, fields):
+    """
+    Computes the constant P1 gradient of several nodal fields on every cell in one batched operation.
+
+    :param points: Node coordinates (n_points, 3)
+    :param cells: Cell connectivity (n_cells, 3 or 4)
+    :param fields: Nodal values (n_points, n_fields)
+    :return: Gradients (n_fields, n_cells, 3)
+    """
+    grads, _ = p1_gradients(points, cells)
+    return np.ascontiguousarray(np.einsum('eik,eif->fek', grads, fields[cells]))
+
+
+def cell_normals(points, cells):
+    """
+    Computes the unit normal of every triangle, oriented by its node order.
+    """
+    x = points[cells]
+    normals = np.cross(x[:, 1] - x[:, 0], x[:, 2] - x[:, 0])
+    norm = np.linalg.norm(normals, axis=1)
+    normals[norm > 0] /= norm[norm > 0, None]
+    return normals
+
+
+def assemble_stiffness(points, cells):
+    """
+    Assembles the P1 stiffness matrix (cotangent Laplacian on triangle surfaces).
+
+    :param points: Node coordinates (n_points, 3)
+    :param cells: Cell connectivity (n_cells, 3 or 4)
+    :return: Symmetric stiffness matrix as scipy.sparse.csr_matrix
+    """
+    grads, measure = p1_gradients(points, cells)
+    local = np.einsum('eik,ejk->eij', grads, grads) * measure[:, None, None]
+    n_nodes = cells.shape[1]
+    rows = np.repeat(cells, n_nodes, axis=1).ravel()
+    cols = np.tile(cells, (1, n_nodes)).ravel()
+    return sparse.csr_matrix((local.ravel(), (rows, cols)), shape=(len(points), len(points)))
+
+
+def dirichlet_conditions(boundary_ids, boundary_values):
+    """
+    Merges the boundary node sets into one set of Dirichlet nodes, later sets override earlier ones.
+
+    :return: node ids and values, both sorted by node id
+    """
+    ids = np.concatenate([np.asarray(b, dtype=np.int64) for b in boundary_ids])
+    values = np.concatenate([np.full(len(b), v, dtype=float) for b, v in zip(boundary_ids, boundary_values)])
+    # keep the last occurrence of every node
+    last = len(ids) - 1 - np.unique(ids[::-1], return_index=True)[1]
+    return ids[last], values[last]
+
+
+class LaplaceSolver:
+    """
+    Laplace-Dirichlet solver that assembles the stiffness matrix of a mesh once and reuses it for every field.
+
+    The interior block depends only on which nodes are fixed, so its sparse LU factorization is cached per
+    Dirichlet node set. Fields sharing their boundary nodes (e.g. ab and r) then cost one back-substitution each.
+    """
+
+    def __init__(self, points, cells):
+        self.n_points = len(points)
+        self.stiffness = assemble_stiffness(points, cells).tocsc()
+        self._used = self.stiffness.diagonal() > 0
+        self._factorizations = {}
+
+    @classmethod
+    def from_mesh(cls, mesh):
+        return cls(*mesh_to_numpy(mesh))
+
+    def _interior(self, fixed):
+        key = hashlib.sha1(fixed.tobytes()).hexdigest()
+        if key not in self._factorizations:
+            is_free = self._used.copy()
+            is_free[fixed] = False
+            free = np.flatnonzero(is_free)
+            coupling = self.stiffness[:, fixed][free]
+            self._factorizations[key] = (free, coupling, factorized(self.stiffness[:, free][free].tocsc()))
+        return self._factorizations[key]
+
+    def solve(self, boundary_ids, boundary_values):
+        """
+        Solves the Laplace equation with Dirichlet conditions on the given node sets
+        and homogeneous Neumann conditions elsewhere.
+
+        :param boundary_ids: List of node id arrays, one per boundary set
+        :param boundary_values: Dirichlet value of every boundary set
+        :return: Nodal solution (n_points,)
+        """
+        fixed, fixed_values = dirichlet_conditions(boundary_ids, boundary_values)
+        free, coupling, solve_interior = self._interior(fixed)
+
+        solution = np.zeros(self.n_points)
+        solution[fixed] = fixed_values
+        # nodes not used by any cell do not take part in the solve and stay 0
+        solution[free] = solve_interior(-(coupling @ fixed_values))
+        return solution
+
+
+# Only the solver of the last mesh is kept, its factorizations grow with the mesh
+_solver = (None, None)
+
+
+def get_laplace_solver(meshdir, model):
+    """
+    Returns the LaplaceSolver of a mesh, so that laplace_0_1 reuses the factorizations of la_laplace. The solver is
+    keyed on the points and cells of the mesh and replaces the one of the previous mesh.
+
+    :param meshdir: openCARP mesh name the model was written to
+    :param model: Mesh the openCARP mesh files were written from
+    """
+    global _solver
+    key = (meshdir, mesh_digest(model))
+    if _solver[0] != key:
+        # release the factorizations of the previous mesh before computing the new ones
+        _solver = (None, None)
+        _solver = (key, LaplaceSolver.from_mesh(model))
+    return _solver[1]
+
+
+def solve_par(solver, par_file, vtx_files):
+    """
+    Solves the Laplace problem described by an openCARP .par file and its stimulus vtx files in-process.
+
+    :param solver: LaplaceSolver of the mesh the .pts/.elem files handed to openCARP were written from
+    :param par_file: Laplace parameter file
+    :param vtx_files: vtx file of every stimulus, in stimulus order
+    :return: Nodal solution (n_points,)
+    """
+    values = read_stimulus_values(par_file)
+    if len(values) != len(vtx_files):
+        raise ValueError(f"{par_file} defines {len(values)} stimuli but {len(vtx_files)} vtx files were given")
+    return solver.solve([read_vtx(f) for f in vtx_files], values)
+
+
+def mesh_digest(model):
+    """
+    Hashes the points and the cell connectivity of a mesh.
+    """
+    cell_array = model.GetPolys() if isinstance(model, vtk.vtkPolyData) else model.GetCells()
+    digest = hashlib.sha1()
+    for array in (model.GetPoints().GetData(), cell_array.GetOffsetsArray(), cell_array.GetConnectivityArray()):
+        digest.update(np.ascontiguousarray(vtk_to_numpy(array)).tobytes())
+    return digest.hexdigest()
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def laplace_cache_keys(args, model, lp_specs):
+    """
+    Computes the cache key of every Laplace field from the mesh, the .par file and the content of its vtx files.
+
+    :return: Dictionary mapping every name of lp_specs to its key
+    """
+    mesh_key = mesh_digest(model)
+    keys = {}
+    for name, par_file, vtx_files in lp_specs:
+        digest = hashlib.sha1((args.laplace_solver + mesh_key + _file_digest(par_file)).encode())
+        for vtx_file in vtx_files:
+            digest.update(_file_digest(vtx_file if vtx_file.endswith('.vtx') else vtx_file + '.vtx').encode())
+        keys[name] = digest.hexdigest()
+    return keys
+
+
+def load_cached_laplace_fields(cache_dir, keys):
+    """
+    Loads the Laplace fields whose key is present in the cache.
+
+    :return: Dictionary mapping the names found in the cache to their nodal solution
+    """
+    solutions = {}
+    for name, key in keys.items():
+        cache_file = os.path.join(cache_dir, key + '.npy')
+        if os.path.exists(cache_file):
+            solutions[name] = np.load(cache_file, mmap_mode='r')
+    return solutions
+
+
+def store_laplace_field(cache_dir, key, solution):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = os.path.join(cache_dir, f'{key}.{os.getpid()}.tmp.npy')
+    np.save(tmp_file, np.asarray(solution))
+    os.replace(tmp_file, os.path.join(cache_dir, key + '.npy'))
+
+
+def _laplace_keys_file(result_file):
+    return os.path.splitext(result_file)[0] + '_laplace_keys.json'
+
+
+def write_laplace_keys(result_file, keys):
+    """
+    Records next to a result file the cache keys of the Laplace fields it was computed from.
+    """
+    with open(_laplace_keys_file(result_file), 'w') as f:
+        json.dump(keys, f, indent=2, sort_keys=True)
+
+
+def laplace_keys_match(result_file, keys):
+    """
+    Checks whether a result file exists and was computed from Laplace fields with the given cache keys.
+    """
+    keys_file = _laplace_keys_file(result_file)
+    if not (os.path.exists(result_file) and os.path.exists(keys_file)):
+        return False
+    with open(keys_file) as f:
+        return json.load(f) == keys
+
+
+def solve_laplace_fields(args, job, model, meshdir, lp_specs):
+    """
+    Returns every Laplace field of lp_specs. Fields cached for unchanged inputs under job.ID/Laplace_cache are
+    reused, the others are solved with the backend selected by args.laplace_solver and added to the cache.
+
+    :param args: Parsed command line arguments
+    :param job: carputils job
+    :param model: Mesh the openCARP mesh files were written from
+    :param meshdir: openCARP mesh name
+    :param lp_specs: List of (name, par_file, vtx_files); the openCARP simID is job.ID/Lp_<name>
+    :return: Dictionary mapping every name to its nodal solution
+    """
+    cache_dir = os.path.join(job.ID, 'Laplace_cache')
+    keys = laplace_cache_keys(args, model, lp_specs)
+    solutions = load_cached_laplace_fields(cache_dir, keys)
+    for name in solutions:
+        print(f"Reusing cached laplace solution {name}")
+
+    missing_specs = [lp_spec for lp_spec in lp_specs if lp_spec[0] not in solutions]
+    if missing_specs:
+        new_solutions = _solve_laplace_fields(args, job, model, meshdir, missing_specs)
+        for name, solution in new_solutions.items():
+            store_laplace_field(cache_dir, keys[name], solution)
+        solutions.update(new_solutions)
+    return solutions
+
+
+def _solve_laplace_fields(args, job, model, meshdir, lp_specs):
+    solutions = {}
+    if args.laplace_solver == 'scipy':
+        solver = get_laplace_solver(meshdir, model)
+        for name, par_file, vtx_files in lp_specs:
+            solutions[name] = solve_par(solver, par_file, vtx_files)
+        return solutions
+
+    # the openCARP solves are independent: run them side by side and split the --np budget between them, without
+    # partitioning small meshes more finely than pays off
+    n_parallel = max(1, min(len(lp_specs), args.np))
+    np_per_solve = processes_for_mesh(model.GetNumberOfPoints(), split_cores(args.np, n_parallel))
+    with ThreadPoolExecutor(max_workers=n_parallel) as executor:
+        parent_span = current_path()
+        runs = [executor.submit(run_carp_laplace, job, meshdir, lp_spec, np_per_solve, parent_span)
+                for lp_spec in lp_specs]
+        for run in runs:
+            run.result()
+
+    for name, _, _ in lp_specs:
+        solutions[name] = read_igb(job.ID + '/Lp_' + name + '/phie.igb', time_slice=-1)
+    return solutions
+
+
+def run_carp_laplace(job, meshdir, lp_spec, n_proc, parent_span=None):
+    """
+    Runs one openCARP Laplace solve under the simID job.ID/Lp_<name>.
+
+    :param job: carputils job
+    :param meshdir: openCARP mesh name
+    :param lp_spec: (name, par_file, vtx_files)
+    :param n_proc: Number of MPI processes for this solve
+    :param parent_span: Trace path of the span the solve belongs to when it runs on a worker thread
+    """
+    name, par_file, vtx_files = lp_spec
+    cmd = tools.carp_cmd(par_file)
+    cmd += ['-simID', job.ID + '/Lp_' + name,
+            '-meshname', meshdir]
+    for i, vtx_file in enumerate(vtx_files):
+        cmd += [f'-stimulus[{i}].vtx_file', vtx_file]
+
+    # Run simulation
+    with trace(f'carp Lp_{name}', parent=parent_span, np=n_proc):
+        job.carp(cmd, np=n_proc)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mask-based thresholding of the cells of a mesh.
+
+ThresholdMasks reproduces the cell selection of vtk_thr as boolean cell masks computed on the NumPy views of the
+mesh arrays. Masks of the same mesh combine with &, | and ~, so that thresholding a thresholded sub-mesh becomes the
+& of both masks. A VTK grid is built with extract only where the geometry of the selection is needed.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import numpy as np
+import vtk
+
+from Atrial_LDRBM.mesh_topology import MeshTopology
+from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, numpy_to_vtk
+
+# vtk_thr modes
+THRESHOLD_UPPER = 0
+THRESHOLD_LOWER = 1
+THRESHOLD_BETWEEN = 2
+
+MASK_ARRAY_NAME = 'threshold_mask'
+
+
+class ThresholdMasks:
+    """
+    Boolean cell masks of one mesh, equivalent to the cell selection of vtk_thr.
+    """
+
+    def __init__(self, mesh, topology=None):
+        self.mesh = mesh
+        self.topology = MeshTopology(mesh) if topology is None else topology
+
+    @property
+    def n_cells(self):
+        return self.mesh.GetNumberOfCells()
+
+    def all(self):
+        return np.ones(self.n_cells, dtype=bool)
+
+    def _data(self, points_cells):
+        if points_cells == "POINTS":
+            return self.mesh.GetPointData()
+        if points_cells == "CELLS":
+            return self.mesh.GetCellData()
+        raise ValueError(f"Unknown association {points_cells}, expected POINTS or CELLS")
+
+    def _array(self, points_cells, array):
+        vtk_array = self._data(points_cells).GetArray(array)
+        if vtk_array is None:
+            raise KeyError(f"The mesh has no {points_cells.lower()[:-1]} array {array}")
+        values = vtk_to_numpy(vtk_array)
+        # vtkThreshold uses the first component of multi component arrays
+        return values if values.ndim == 1 else values[:, 0]
+
+    def threshold(self, mode, points_cells, array, thr1, thr2=None):
+        """
+        Selects the cells vtk_thr(mesh, mode, points_cells, array, thr1, thr2) keeps. Bounds are inclusive and with
+        POINTS all points of a cell have to pass.
+
+        :param mode: THRESHOLD_UPPER (>= thr1), THRESHOLD_LOWER (<= thr1) or THRESHOLD_BETWEEN (thr1 to thr2)
+        :return: Boolean cell mask
+        """
+        values = self._array(points_cells, array)
+        if mode == THRESHOLD_UPPER:
+            passed = values >= thr1
+        elif mode == THRESHOLD_LOWER:
+            passed = values <= thr1
+        elif mode == THRESHOLD_BETWEEN:
+            passed = (values >= thr1) & (values <= thr2)
+        else:
+            raise ValueError(f"Unknown threshold mode {mode}")
+
+        if points_cells == "POINTS":
+            return self.topology.cells_with_all_points(passed)
+        return passed
+
+    def below_planes(self, planes):
+        """
+        Selects the cells get_elements_above_plane keeps for every plane.
+        """
+        return self.topology.cells_with_all_points(self.topology.below_planes(planes))
+
+    def cell_values(self, mask, array):
+        """
+        :return: Values of a cell array on the selected cells, in cell order
+        """
+        return self._array("CELLS", array)[mask]
+
+    def point_values(self, mask, array):
+        """
+        :return: Values of a point array on the points used by the selected cells, in point order
+        """
+        return self._array("POINTS", array)[self.topology.points_of_cells(mask)]
+
+    def ids(self, mask):
+        return self.cell_values(mask, 'Global_ids')
+
+    def point_ids(self, mask):
+        return self.point_values(mask, 'Global_ids')
+
+    def extract(self, mask):
+        """
+        Builds the selected cells as vtkUnstructuredGrid with all point and cell arrays, as vtk_thr returns it.
+        """
+        selection = self.mesh.NewInstance()
+        selection.ShallowCopy(self.mesh)
+        mask_array = numpy_to_vtk(np.asarray(mask, dtype=np.uint8), deep=True)
+        mask_array.SetName(MASK_ARRAY_NAME)
+        selection.GetCellData().AddArray(mask_array)
+
+        thresh = vtk.vtkThreshold()
+        thresh.SetInputData(selection)
+        thresh.SetLowerThreshold(1)
+        thresh.SetUpperThreshold(1)
+        thresh.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS, MASK_ARRAY_NAME)
+        thresh.Update()
+
+        output = vtk.vtkUnstructuredGrid()
+        output.ShallowCopy(thresh.GetOutput())
+        output.GetCellData().RemoveArray(MASK_ARRAY_NAME)
+        return output
@@ -24,6 +24,8 @@ KIND, either express or implied.  See the License for the
 specific language governing permissions and limitations
 under the License.  
 """
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import vtk
 from scipy.spatial import cKDTree
@@ -33,6 +35,8 @@ import standalones.function
 import vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations
 from Atrial_LDRBM.LDRBM.Fiber_LA import Methods_LA
 from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import generate_spline_points
+from Atrial_LDRBM.mesh_topology import cell_centroids, cells_around_path, closest_point_id, \
+    get_geodesic_paths, plane_band_edge_mask
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import normalize_vectors, \
     get_normalized_cross_product
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_elem, write_to_pts, write_to_lon
@@ -40,7 +44,7 @@ from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, num
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_unstructured_grid_writer, vtk_polydata_writer, \
     vtk_xml_unstructured_grid_writer, vtk_obj_writer
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, get_vtk_geom_filter_port, \
-    clean_polydata, vtk_append, apply_extract_cell_filter, get_elements_above_plane
+    clean_polydata, apply_extract_cell_filter, get_elements_above_plane
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.init_objects import initialize_plane, init_connectivity_filter, \
     ExtractionModes
@@ -105,57 +109,57 @@ def generate_bilayer(args, job, endo, epi, max_dist=np.inf):
 
     endo_ids = np.where(dd != np.inf)[0]
     epi_ids = ii[endo_ids]
-    lines = vtk.vtkCellArray()
-
-    for i in range(len(endo_ids)):
-        line = vtk.vtkLine()
-        line.GetPointIds().SetId(0, i);
-        line.GetPointIds().SetId(1, len(endo_ids) + i);
-        lines.InsertNextCell(line)
 
-    points = np.vstack((endo_pts[endo_ids], epi_pts[epi_ids]))
-    polydata = vtk.vtkUnstructuredGrid()
-    vtkPts = vtk.vtkPoints()
-    vtkPts.SetData(numpy_to_vtk(points))
-    polydata.SetPoints(vtkPts)
-    polydata.SetCells(3, lines)
+    return Methods_LA.assemble_bilayer(endo, epi, endo_ids, epi_ids)  # Has elemTag!
 
-    fibers = np.zeros((len(endo_ids), 3), dtype="float32")
-    fibers[:, 0] = 1
 
-    tag = np.ones((len(endo_ids),), dtype=int)
-    tag[:] = 100
-
-    meshNew = dsa.WrapDataObject(polydata)
-    meshNew.CellData.append(tag, "elemTag")
-    meshNew.CellData.append(fibers, "fiber")
-    fibers = np.zeros((len(endo_ids), 3), dtype="float32")
-    fibers[:, 1] = 1
-    meshNew.CellData.append(fibers, "sheet")
-    bilayer_1 = meshNew.VTKObject
-
-    if args.debug:
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/test_LA_RA_bilayer.vtu", bilayer_1)
+def keep_intermediates(args):
+    return bool(args.debug or getattr(args, 'keep_intermediates', 0))
 
-    reader = vtk.vtkXMLUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/result_RA/test_LA_RA_bilayer.vtu")  #
-    reader.Update()
-    test = reader.GetOutput()
 
-    bilayer = vtk_append([endo, epi, test], True)
+def write_intermediate(args, mesh, file_name):
+    """
+    Writes a grid passed on in memory between the RA fiber stages, only with --debug or --keep_intermediates.
 
+    :param file_name: Path without extension, the extension follows args.ofmt
+    """
+    if not keep_intermediates(args):
+        return
     if args.ofmt == 'vtk':
-        vtk_unstructured_grid_writer(job.ID + "/result_RA/LA_RA_bilayer_with_fiber.vtk", bilayer, store_binary=True)
+        vtk_unstructured_grid_writer(f"{file_name}.vtk", mesh, store_binary=True)
     else:
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_RA_bilayer_with_fiber.vtu",
-                                         bilayer)  # Has elemTag!
-
-    reader = vtk.vtkXMLUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/result_RA/LA_RA_bilayer_with_fiber.vtu")  # Has elemTag! :)
-    reader.Update()
-    bilayer = reader.GetOutput()
-
-    return bilayer
+        vtk_xml_unstructured_grid_writer(f"{file_name}.vtu", mesh)
+
+
+def unify_array_types(meshes):
+    """
+    Prepares meshes for vtk_append, which drops every array whose VTK type differs between its inputs. An elemTag
+    read from file is a vtkTypeInt64Array while one added with dsa is a vtkLongArray, so grids read from file and
+    grids built in memory lose it when appended together.
+
+    :param meshes: Meshes to append, left unchanged
+    :return: Shallow copies of the meshes in which every point and cell array they all have is of one type
+    """
+    copies = []
+    for mesh in meshes:
+        mesh_copy = mesh.NewInstance()
+        mesh_copy.ShallowCopy(mesh)
+        copies.append(mesh_copy)
+
+    for attributes in ([mesh.GetPointData() for mesh in copies], [mesh.GetCellData() for mesh in copies]):
+        names = set.intersection(*[{data.GetArrayName(i) for i in range(data.GetNumberOfArrays())}
+                                   for data in attributes])
+        for name in names:
+            arrays = [data.GetArray(name) for data in attributes]
+            if any(array is None for array in arrays) or len({array.GetClassName() for array in arrays}) == 1:
+                continue
+            values = [vtk_to_numpy(array) for array in arrays]
+            dtype = np.result_type(*values)
+            for data, value in zip(attributes, values):
+                array = numpy_to_vtk(np.ascontiguousarray(value, dtype=dtype), deep=True)
+                array.SetName(name)
+                data.AddArray(array)
+    return copies
 
 
 def write_bilayer(bilayer, args, job):
@@ -213,35 +217,21 @@ def generate_sheet_dir(args, model, job):
         '''
         calculate the centers of surface mesh cells
         '''
-        filter_cell_centers = vtk.vtkCellCenters()
-        filter_cell_centers.SetInputData(cln_surface)
-        filter_cell_centers.Update()
-        center_surface = filter_cell_centers.GetOutput().GetPoints()
-        center_surface_array = vtk_to_numpy(center_surface.GetData())
+        center_surface_array = cell_centroids(cln_surface)
         print('Number of center_surface: ', len(center_surface_array), '\n')
 
         '''
         calculate the centers of volume mesh cells
         '''
-        filter_cell_centers = vtk.vtkCellCenters()
-        filter_cell_centers.SetInputData(model)
-        filter_cell_centers.Update()
-        center_volume = filter_cell_centers.GetOutput().GetPoints().GetData()
-        center_volume = vtk_to_numpy(center_volume)
+        center_volume = cell_centroids(model)
         print('Number of center_volume: ', len(center_volume), '\n')
 
         '''
         Mapping
         '''
-        normals = np.ones([len(center_volume), 3], dtype=float)
-        kDTree = vtk.vtkKdTree()
-        kDTree.BuildLocatorFromPoints(center_surface)
-
-        for i in range(len(center_volume)):
-            id_list = vtk.vtkIdList()
-            kDTree.FindClosestNPoints(1, center_volume[i], id_list)
-            index = id_list.GetId(0)
-            normals[i] = normal_vectors[index]
+        # one batched query for all volume cells
+        _, index = cKDTree(center_surface_array).query(center_volume, workers=-1)
+        normals = normal_vectors[index].astype(float)
 
         print('Mapping done!')
         '''
@@ -331,7 +321,7 @@ def dijkstra_path_coord(polydata, StartVertex, EndVertex):
     return dijkstra_path(polydata, StartVertex, EndVertex)
 
 
-def dijkstra_path_on_a_plane(polydata, args, StartVertex, EndVertex, plane_point):
+def dijkstra_path_on_a_plane(polydata, args, StartVertex, EndVertex, plane_point, geodesic_paths=None):
     point_start = np.asarray(polydata.GetPoint(StartVertex))
     point_end = np.asarray(polydata.GetPoint(EndVertex))
     point_third = plane_point
@@ -340,21 +330,24 @@ def dijkstra_path_on_a_plane(polydata, args, StartVertex, EndVertex, plane_point
 
     plane = initialize_plane(norm_1, point_start)
 
-    extracted_mesh_1 = get_elements_above_plane(polydata, plane)
-
     point_moved = point_start - 2 * args.scale * norm_1
 
     plane2 = initialize_plane(-norm_1, point_moved)
 
-    band = clean_polydata(apply_vtk_geom_filter(get_elements_above_plane(extracted_mesh_1, plane2)))
-
     if args.debug:
+        band = clean_polydata(apply_vtk_geom_filter(get_elements_above_plane(get_elements_above_plane(polydata, plane),
+                                                                             plane2)))
         writer_vtk(band, f'{args.mesh}_surf/' + "band_" + str(StartVertex) + "_" + str(EndVertex) + ".vtk")
 
-    StartVertex = find_closest_point(band, point_start)
-    EndVertex = find_closest_point(band, point_end)
+    # restrict the cached surface graph to the band between both planes instead of extracting the band
+    if geodesic_paths is None:
+        geodesic_paths = get_geodesic_paths(polydata)
+    edge_mask, band_points = plane_band_edge_mask(polydata, [plane, plane2], geodesic_paths.topology)
+
+    StartVertex = closest_point_id(geodesic_paths.topology.points, point_start, band_points)
+    EndVertex = closest_point_id(geodesic_paths.topology.points, point_end, band_points)
 
-    points_data = dijkstra_path(band, StartVertex, EndVertex)
+    points_data = geodesic_paths.path(StartVertex, EndVertex, edge_mask)
     return points_data
 
 
@@ -382,86 +375,17 @@ def creat_tube(center1, center2, radius):
     return tube
 
 
-def find_elements_around_path_within_radius(mesh, points_data, radius):
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-
-    mesh_id_list = vtk.vtkIdList()
-    for i in range(len(points_data)):
-        temp_result = vtk.vtkIdList()
-        locator.FindPointsWithinRadius(radius, points_data[i], temp_result)
-        for j in range(temp_result.GetNumberOfIds()):
-            mesh_id_list.InsertNextId(temp_result.GetId(j))
-
-    mesh_cell_id_list = vtk.vtkIdList()
-    mesh_cell_temp_id_list = vtk.vtkIdList()
-    for i in range(mesh_id_list.GetNumberOfIds()):
-        mesh.GetPointCells(mesh_id_list.GetId(i), mesh_cell_temp_id_list)
-        for j in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-            mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(j))
-
-    id_set = set()
-    for i in range(mesh_cell_id_list.GetNumberOfIds()):
-        id_set.add(mesh_cell_id_list.GetId(i))
-
-    return id_set
-
-
-def get_element_ids_around_path_within_radius(mesh, points_data, radius):
-    gl_ids = vtk_to_numpy(mesh.GetCellData().GetArray('Global_ids'))
-
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-
-    mesh_id_list = vtk.vtkIdList()
-    for i in range(len(points_data)):
-        temp_result = vtk.vtkIdList()
-        locator.FindPointsWithinRadius(radius, points_data[i], temp_result)
-        for j in range(temp_result.GetNumberOfIds()):
-            mesh_id_list.InsertNextId(temp_result.GetId(j))
-
-    mesh_cell_id_list = vtk.vtkIdList()
-    mesh_cell_temp_id_list = vtk.vtkIdList()
-    for i in range(mesh_id_list.GetNumberOfIds()):
-        mesh.GetPointCells(mesh_id_list.GetId(i), mesh_cell_temp_id_list)
-        for j in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-            mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(j))
+def find_elements_around_path_within_radius(mesh, points_data, radius, topology=None):
+    return set(cells_around_path(mesh, points_data, radius, topology).tolist())
 
-    ids = []
 
-    for i in range(mesh_cell_id_list.GetNumberOfIds()):
-        index = mesh_cell_id_list.GetId(i)
-        ids.append(gl_ids[index])
+def get_element_ids_around_path_within_radius(mesh, points_data, radius, topology=None):
+    return list(Methods_LA.get_element_ids_around_path_within_radius(mesh, points_data, radius, topology))
 
-    return ids
 
-
-def assign_element_tag_around_path_within_radius(mesh, points_data, radius, tag, element_tag):
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-
-    mesh_id_list = vtk.vtkIdList()
-    for i in range(len(points_data)):
-        temp_result = vtk.vtkIdList()
-        locator.FindPointsWithinRadius(radius, points_data[i], temp_result)
-        for j in range(temp_result.GetNumberOfIds()):
-            mesh_id_list.InsertNextId(temp_result.GetId(j))
-
-    mesh_cell_id_list = vtk.vtkIdList()
-    mesh_cell_temp_id_list = vtk.vtkIdList()
-    for i in range(mesh_id_list.GetNumberOfIds()):
-        mesh.GetPointCells(mesh_id_list.GetId(i), mesh_cell_temp_id_list)
-        for j in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-            mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(j))
-
-    for i in range(mesh_cell_id_list.GetNumberOfIds()):
-        index = mesh_cell_id_list.GetId(i)
-        tag[index] = element_tag
-
-    return tag
+def assign_element_tag_around_path_within_radius(mesh, points_data, radius, tag, element_tag, topology=None):
+    return Methods_LA.assign_element_tag_around_path_within_radius(mesh, points_data, radius, tag, element_tag,
+                                                                   topology)
 
 
 def normalize_vector(vector):
@@ -474,49 +398,45 @@ def normalize_vector(vector):
     return vector_norm
 
 
-def assign_element_fiber_around_path_within_radius(mesh, points_data, radius, fiber, smooth=True):
-    locator = vtk.vtkStaticPointLocator()
-    locator.SetDataSet(mesh)
-    locator.BuildLocator()
-    if smooth:
-        for i in range(len(points_data)):
-            if i % 5 == 0 and i < 5:
-                vector = points_data[5] - points_data[0]
-            else:
-                vector = points_data[i] - points_data[i - 5]
-            vector = normalize_vector(vector)
-            mesh_point_temp_id_list = vtk.vtkIdList()
-            locator.FindPointsWithinRadius(radius, points_data[i], mesh_point_temp_id_list)
-            mesh_cell_temp_id_list = vtk.vtkIdList()
-            mesh_cell_id_list = vtk.vtkIdList()
-            for j in range(mesh_point_temp_id_list.GetNumberOfIds()):
-                mesh.GetPointCells(mesh_point_temp_id_list.GetId(j), mesh_cell_temp_id_list)
-                for h in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-                    mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(h))
-
-            for k in range(mesh_cell_id_list.GetNumberOfIds()):
-                index = mesh_cell_id_list.GetId(k)
-                fiber[index] = vector
-    else:
-        for i in range(len(points_data)):
-            if i < 1:
-                vector = points_data[1] - points_data[0]
-            else:
-                vector = points_data[i] - points_data[i - 1]
-            vector = normalize_vector(vector)
-            mesh_point_temp_id_list = vtk.vtkIdList()
-            locator.FindPointsWithinRadius(radius, points_data[i], mesh_point_temp_id_list)
-            mesh_cell_temp_id_list = vtk.vtkIdList()
-            mesh_cell_id_list = vtk.vtkIdList()
-            for j in range(mesh_point_temp_id_list.GetNumberOfIds()):
-                mesh.GetPointCells(mesh_point_temp_id_list.GetId(j), mesh_cell_temp_id_list)
-                for h in range(mesh_cell_temp_id_list.GetNumberOfIds()):
-                    mesh_cell_id_list.InsertNextId(mesh_cell_temp_id_list.GetId(h))
-
-            for k in range(mesh_cell_id_list.GetNumberOfIds()):
-                index = mesh_cell_id_list.GetId(k)
-                fiber[index] = vector
-    return fiber
+def assign_element_fiber_around_path_within_radius(mesh, points_data, radius, fiber, smooth=True, topology=None):
+    return Methods_LA.assign_element_fiber_around_path_within_radius(mesh, points_data, radius, fiber, smooth,
+                                                                     topology)
+
+
+def pectinate_muscles(args, surface, point_pairs, plane_point, topology, radius, tag_by_centroid=False,
+                      n_workers=1):
+    """
+    Computes the pectinate muscles running from the CT to the TV on the surface, and the cells of the mesh of
+    topology they tag and orient. The muscles do not depend on each other and are computed by n_workers threads
+    sharing the geodesic engine of the surface and the topology; the caller applies them in muscle order.
+
+    :param point_pairs: (CT point id, TV point id) on the surface for each muscle
+    :param topology: MeshTopology of the mesh receiving the muscles
+    :param tag_by_centroid: Tag the cells whose centroid is within radius instead of the cells touching the path
+    :return: (path, tagged cell ids, oriented cell ids, fiber of these cells) for each muscle, in point_pairs order
+    """
+    geodesic_paths = get_geodesic_paths(surface)
+    # the threads share both topologies and may only read their indices
+    geodesic_paths.topology.build_indices(around_path=False, edge_graph=True)
+    topology.build_indices(centroid_tree=tag_by_centroid)
+
+    def muscle(point_pair):
+        pm = dijkstra_path_on_a_plane(surface, args, point_pair[0], point_pair[1], plane_point, geodesic_paths)
+
+        # skip first 3% of the points since they will be on the roof of the RA
+        pm = pm[int(len(pm) * 0.03):, :]
+        pm = downsample_path(pm, int(len(pm) * 0.065))
+
+        if tag_by_centroid:
+            tag_ids = topology.cells_with_centroid_around_path(pm, radius)
+        else:
+            tag_ids = topology.cells_around_path(pm, radius)
+        fiber_ids, fiber = Methods_LA.element_fiber_around_path_within_radius(topology.mesh, pm, radius,
+                                                                              smooth=False, topology=topology)
+        return pm, tag_ids, fiber_ids, fiber
+
+    with ThreadPoolExecutor(max_workers=max(1, n_workers)) as executor:
+        return list(executor.map(muscle, point_pairs))
 
 
 def get_mean_point(data):
@@ -25,9 +25,12 @@ specific language governing permissions and limitations
 under the License.  
 """
 import csv
+import hashlib
 import os
 import pickle
+import shutil
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pymesh
@@ -37,19 +40,173 @@ from vtk.numpy_interface import dataset_adapter as dsa
 
 import Atrial_LDRBM.LDRBM.Fiber_RA.Methods_RA as Method
 from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import generate_spline_points
+from Atrial_LDRBM.mesh_topology import MeshTopology
+from Atrial_LDRBM.tracing import traced
 from vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations import vtk_thr
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_xml_unstructured_grid_writer, vtk_obj_writer, \
     vtk_unstructured_grid_writer
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, clean_polydata, vtk_append, \
-    apply_extract_cell_filter, get_cells_with_ids
+    get_cells_with_ids
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 
 EXAMPLE_DIR = os.path.dirname(os.path.realpath(__file__))
 
-
-def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
+BRIDGE_RESAMPLED_SUFFIXES = ["_bridge_resampled.obj", "_bridge_resampled.vtk"]
+BRIDGE_UNION_SUFFIXES = ["_union_to_resample.obj", "_union.obj"]
+
+
+def bridge_cache_key(input_files, *params):
+    """
+    Computes the cache key of a bridge step from the content of its input files and its parameters.
+    """
+    digest = hashlib.sha1(repr(params).encode())
+    for input_file in input_files:
+        with open(input_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_cached_bridge_files(cache_dir, key, bridges_dir, var, suffixes):
+    """
+    Copies the files cached under key to bridges_dir/<var><suffix>.
+
+    :return: True if all files were found in the cache
+    """
+    cache_files = [os.path.join(cache_dir, key + suffix) for suffix in suffixes]
+    if not all(os.path.exists(cache_file) for cache_file in cache_files):
+        return False
+    for cache_file, suffix in zip(cache_files, suffixes):
+        shutil.copyfile(cache_file, bridges_dir + str(var) + suffix)
+    print(f"Reusing cached bridge files of {var}")
+    return True
+
+
+def remove_bridge_files(bridges_dir, var, suffixes):
+    """
+    Removes the files bridges_dir/<var><suffix> left by a previous run, so that a failed step cannot leave them to
+    be cached as its outputs.
+    """
+    for suffix in suffixes:
+        output_file = bridges_dir + str(var) + suffix
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+
+def store_bridge_files(cache_dir, key, bridges_dir, var, suffixes):
+    """
+    Adds the files bridges_dir/<var><suffix> of a bridge step to the cache, unless the step failed to write one.
+    """
+    output_files = [bridges_dir + str(var) + suffix for suffix in suffixes]
+    if not all(os.path.exists(output_file) for output_file in output_files):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    for output_file, suffix in zip(output_files, suffixes):
+        tmp_file = os.path.join(cache_dir, f'{key}.{os.getpid()}.tmp')
+        shutil.copyfile(output_file, tmp_file)
+        os.replace(tmp_file, os.path.join(cache_dir, key + suffix))
+
+
+def build_bridge_mesh(bridges_dir, var, scale, cache_dir=None):
+    """
+    Unites the tube and both spheres of a bridge, remeshes the union and generates its volume with meshtool.
+    Reads and writes the files <var>_* in bridges_dir only, so that bridges can be built in separate processes.
+    With a cache_dir, the outputs of unchanged tube and spheres are copied from the cache instead.
+    """
+    if cache_dir is not None:
+        key = bridge_cache_key([bridges_dir + str(var) + suffix for suffix in
+                                ["_tube.obj", "_sphere_1.obj", "_sphere_2.obj"]], "bridge", scale)
+        if load_cached_bridge_files(cache_dir, key, bridges_dir, var, BRIDGE_RESAMPLED_SUFFIXES):
+            return
+    remove_bridge_files(bridges_dir, var, BRIDGE_RESAMPLED_SUFFIXES)
+
+    mesh_A = pymesh.load_mesh(bridges_dir + str(var) + "_tube.obj")
+    mesh_B = pymesh.load_mesh(bridges_dir + str(var) + "_sphere_1.obj")
+    mesh_C = pymesh.load_mesh(bridges_dir + str(var) + "_sphere_2.obj")
+
+    output_mesh_1 = pymesh.boolean(mesh_A, mesh_B, operation="union", engine="igl")
+
+    output_mesh = pymesh.boolean(output_mesh_1, mesh_C, operation="union", engine="igl")
+
+    m = pymeshlab.Mesh(output_mesh.vertices, output_mesh.faces)
+    # create a new MeshSet
+    ms = pymeshlab.MeshSet()
+    # add the mesh to the MeshSet
+    ms.add_mesh(m, "bridge_mesh")
+    # apply filter
+    ms.meshing_isotropic_explicit_remeshing(iterations=5, targetlen=pymeshlab.PureValue(0.4 * scale), adaptive=True)
+    ms.save_current_mesh(bridges_dir + str(var) + "_bridge_resampled.obj", \
+                         save_vertex_color=False, save_vertex_normal=False, save_face_color=False,
+                         save_wedge_texcoord=False, save_wedge_normal=False)
+
+    meshtool = subprocess.run(["meshtool",
+                               "generate",
+                               "mesh",
+                               "-ofmt=vtk",
+                               "-prsv_bdry=1",
+                               "-surf=" + bridges_dir + str(var) + "_bridge_resampled.obj",
+                               "-outmsh=" + bridges_dir + str(var) + "_bridge_resampled.vtk"])
+
+    if cache_dir is not None and meshtool.returncode == 0:
+        store_bridge_files(cache_dir, key, bridges_dir, var, BRIDGE_RESAMPLED_SUFFIXES)
+
+
+def union_bridge_with_earth(bridges_dir, var, scale, volumetric, cache_dir=None):
+    """
+    Cuts the resampled bridge out of its earth, remeshes the result to <var>_union.obj and, for volumetric meshes,
+    generates <var>_union_mesh.vtk with meshtool. Like build_bridge_mesh it only works on the files of the bridge
+    and reuses the outputs cached for the same bridge and earth.
+    """
+    suffixes = BRIDGE_UNION_SUFFIXES + ["_union_mesh.vtk"] if volumetric else BRIDGE_UNION_SUFFIXES
+    if cache_dir is not None:
+        key = bridge_cache_key([bridges_dir + str(var) + suffix for suffix in ["_bridge_resampled.obj", "_earth.obj"]],
+                               "union", scale, volumetric)
+        if load_cached_bridge_files(cache_dir, key, bridges_dir, var, suffixes):
+            return
+    remove_bridge_files(bridges_dir, var, suffixes)
+
+    # if args.mesh_type == "vol":
+    #     mesh_D = pymesh.load_mesh(job.ID+"/bridges/"+str(var)+"_bridge_resampled.obj")
+    #     mesh_E = pymesh.load_mesh(job.ID+"/bridges/"+str(var)+"_earth.obj")
+    #     output_mesh_2 = pymesh.boolean(mesh_D, mesh_E, operation="union", engine="igl")
+    # elif args.mesh_type == "bilayer":
+    # Here
+    mesh_D = pymesh.load_mesh(bridges_dir + str(var) + "_bridge_resampled.obj")
+    mesh_E = pymesh.load_mesh(bridges_dir + str(var) + "_earth.obj")
+    # # Warning: set -1 if pts normals are pointing outside
+    # output_mesh_2 = pymesh.boolean(mesh_D, mesh_E, operation="union", engine="corefinement")
+    # Use difference if the endo normals are pointing inside
+    output_mesh_2 = pymesh.boolean(mesh_E, mesh_D, operation="difference", engine="corefinement")
+    pymesh.save_mesh(bridges_dir + str(var) + "_union_to_resample.obj", output_mesh_2, ascii=True)
+
+    ms = pymeshlab.MeshSet()
+    # if args.just_bridges and var == 'BB_intern_bridges':
+    # job.ID='../'+job.ID# Change if you enter from ra_main and not from pipeline.py, otherwise comment the line
+    ms.load_new_mesh(bridges_dir + str(var) + "_union_to_resample.obj")
+    ms.meshing_isotropic_explicit_remeshing(iterations=5, targetlen=pymeshlab.PureValue(0.4 * scale), adaptive=True)
+    ms.save_current_mesh(bridges_dir + str(var) + "_union.obj", save_vertex_color=False,
+                         save_vertex_normal=False, save_face_color=False, save_wedge_texcoord=False,
+                         save_wedge_normal=False)
+
+    succeeded = True
+    if volumetric:
+        meshtool = subprocess.run(["meshtool",
+                                   "generate",
+                                   "mesh",
+                                   "-ofmt=vtk",
+                                   "-prsv_bdry=1",
+                                   # "-scale={}".format(0.4*args.scale),
+                                   "-surf=" + bridges_dir + str(var) + "_union.obj",
+                                   "-outmsh=" + bridges_dir + str(var) + "_union_mesh.vtk"])
+        succeeded = meshtool.returncode == 0
+
+    if cache_dir is not None and succeeded:
+        store_bridge_files(cache_dir, key, bridges_dir, var, suffixes)
+
+
+@traced()
+def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job, ra_endo=None):
     ########################################
     with open(os.path.join(EXAMPLE_DIR, '../../element_tag.csv')) as f:
         tag_dict = {}
@@ -122,7 +279,7 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
 
     if args.mesh_type == "vol":
 
-        biatrial_epi = vtk_append([la_epi, ra_epi])
+        biatrial_epi = vtk_append(Method.unify_array_types([la_epi, ra_epi]))
 
         tag = np.zeros((biatrial_epi.GetNumberOfCells(),), dtype=int)
         tag[:la_epi.GetNumberOfCells()] = vtk_to_numpy(la_epi.GetCellData().GetArray('elemTag'))
@@ -131,46 +288,22 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
         meshNew = dsa.WrapDataObject(biatrial_epi)
         meshNew.CellData.append(tag, "elemTag")
         biatrial_mesh = vtk_append([meshNew.VTKObject])
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/la_ra_res.vtu", biatrial_mesh)
+        Method.write_intermediate(args, biatrial_mesh, job.ID + "/result_RA/la_ra_res")
     elif args.mesh_type == "bilayer":
 
-        la_e = Method.smart_reader(job.ID + "/result_LA/LA_epi_with_fiber.vtu")
-        la_e = apply_vtk_geom_filter(la_e)
-
-        ra_e = Method.smart_reader(job.ID + "/result_RA/RA_epi_with_fiber.vtu")
-        ra_e = apply_vtk_geom_filter(ra_e)
-
-        biatrial_mesh = vtk_append([la_e, ra_e])
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_epi_RA_epi_with_tag.vtu", biatrial_mesh)
+        # la_epi and ra_epi are the LA_epi_with_fiber and RA_epi_with_fiber grids
+        biatrial_mesh = vtk_append(Method.unify_array_types([la_epi_surface, ra_epi_surface]))
+        Method.write_intermediate(args, biatrial_mesh, job.ID + "/result_RA/LA_epi_RA_epi_with_tag")
 
     bridge_list = ['BB_intern_bridges', 'coronary_sinus_bridge', 'middle_posterior_bridge', 'upper_posterior_bridge']
-    for var in bridge_list:
-        mesh_A = pymesh.load_mesh(job.ID + "/bridges/" + str(var) + "_tube.obj")
-        mesh_B = pymesh.load_mesh(job.ID + "/bridges/" + str(var) + "_sphere_1.obj")
-        mesh_C = pymesh.load_mesh(job.ID + "/bridges/" + str(var) + "_sphere_2.obj")
-
-        output_mesh_1 = pymesh.boolean(mesh_A, mesh_B, operation="union", engine="igl")
-
-        output_mesh = pymesh.boolean(output_mesh_1, mesh_C, operation="union", engine="igl")
-
-        m = pymeshlab.Mesh(output_mesh.vertices, output_mesh.faces)
-        # create a new MeshSet
-        ms = pymeshlab.MeshSet()
-        # add the mesh to the MeshSet
-        ms.add_mesh(m, "bridge_mesh")
-        # apply filter
-        ms.meshing_isotropic_explicit_remeshing(iterations=5, targetlen=pymeshlab.PureValue(0.4 * args.scale), adaptive=True)
-        ms.save_current_mesh(job.ID + "/bridges/" + str(var) + "_bridge_resampled.obj", \
-                             save_vertex_color=False, save_vertex_normal=False, save_face_color=False,
-                             save_wedge_texcoord=False, save_wedge_normal=False)
-
-        subprocess.run(["meshtool",
-                        "generate",
-                        "mesh",
-                        "-ofmt=vtk",
-                        "-prsv_bdry=1",
-                        "-surf=" + job.ID + "/bridges/" + str(var) + "_bridge_resampled.obj",
-                        "-outmsh=" + job.ID + "/bridges/" + str(var) + "_bridge_resampled.vtk"])
+    # the bridges are built independently from their files, one process each within the --np budget
+    n_workers = max(1, min(len(bridge_list), args.np))
+    bridges_dir = job.ID + "/bridges/"
+    # bridge volumes of unchanged tubes, spheres and earths are reused from earlier runs
+    cache_dir = os.path.join(job.ID, 'Bridge_cache')
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        list(executor.map(build_bridge_mesh, [bridges_dir] * len(bridge_list), bridge_list,
+                          [args.scale] * len(bridge_list), [cache_dir] * len(bridge_list)))
 
     la_ra_usg = biatrial_mesh  # this has already elemTag
 
@@ -179,7 +312,10 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
     print('reading done!')
 
     bridge_list = ['BB_intern_bridges', 'coronary_sinus_bridge', 'middle_posterior_bridge', 'upper_posterior_bridge']
-    earth_cell_ids_list = []
+    bridge_usgs = {}
+    # cells of the wall within the earth radius of a bridge point, as one ball query per bridge
+    la_ra_topology = MeshTopology(la_ra_usg)
+    earth_cells = np.zeros(la_ra_usg.GetNumberOfCells(), dtype=bool)
     for var in bridge_list:
         print(var)
 
@@ -187,49 +323,24 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
         reader.SetFileName(job.ID + "/bridges/" + str(var) + '_bridge_resampled.vtk')
         reader.Update()
         bridge_usg = reader.GetOutput()
+        bridge_usgs[var] = bridge_usg
+
+        earth_cell_ids = la_ra_topology.cells_around_path(vtk_to_numpy(bridge_usg.GetPoints().GetData()),
+                                                          0.7 * args.scale)
+        earth_cells[earth_cell_ids] = True
 
-        locator = vtk.vtkStaticPointLocator()
-        locator.SetDataSet(la_ra_usg)
-        locator.BuildLocator()
-
-        intersection_points = bridge_usg.GetPoints().GetData()
-        intersection_points = vtk_to_numpy(intersection_points)
-
-        earth_point_ids_temp = vtk.vtkIdList()
-        earth_point_ids = vtk.vtkIdList()
-        for i in range(len(intersection_points)):
-            locator.FindPointsWithinRadius(0.7 * args.scale, intersection_points[i], earth_point_ids_temp)
-            for j in range(earth_point_ids_temp.GetNumberOfIds()):
-                earth_point_ids.InsertNextId(earth_point_ids_temp.GetId(j))
-
-        earth_cell_ids_temp = vtk.vtkIdList()
-        earth_cell_ids = vtk.vtkIdList()
-        for i in range(earth_point_ids.GetNumberOfIds()):
-            la_ra_usg.GetPointCells(earth_point_ids.GetId(i), earth_cell_ids_temp)
-            for j in range(earth_cell_ids_temp.GetNumberOfIds()):
-                earth_cell_ids.InsertNextId(earth_cell_ids_temp.GetId(j))
-                earth_cell_ids_list += [earth_cell_ids_temp.GetId(j)]
-
-        earth = apply_vtk_geom_filter(apply_extract_cell_filter(la_ra_usg, earth_cell_ids))
+        earth = apply_vtk_geom_filter(get_cells_with_ids(la_ra_usg, earth_cell_ids))
         earth = clean_polydata(earth)
 
-        # meshNew = dsa.WrapDataObject(cleaner.GetOutput())
         vtk_obj_writer(job.ID + "/bridges/" + str(var) + "_earth.obj", earth)
-        # Here
 
         print("Extracted earth")
-        cell_id_all = []
-        for i in range(la_ra_usg.GetNumberOfCells()):
-            cell_id_all.append(i)
 
-        la_diff = list(set(cell_id_all).difference(set(earth_cell_ids_list)))
+    la_ra_epi = vtk_append([get_cells_with_ids(la_ra_usg, np.flatnonzero(~earth_cells))],
+                           merge_points=True)  # we lose this mesh, when defining the append filter later
 
-        la_ra_epi = vtk_append([get_cells_with_ids(la_ra_usg, la_diff)],
-                               merge_points=True)  # we lose this mesh, when defining the append filter later
-
-        if args.debug and var == 'upper_posterior_bridge':
-            # Still has element Tag
-            vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_RA_epi_with_holes.vtu", la_ra_epi)
+    # Still has element Tag
+    Method.write_intermediate(args, la_ra_epi, job.ID + "/result_RA/LA_RA_epi_with_holes")
 
     # Now extract earth from LA_endo as well
 
@@ -238,53 +349,16 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
     reader.Update()
     la_endo = reader.GetOutput()
 
-    earth_cell_ids_list = []
-
+    la_endo_topology = MeshTopology(la_endo)
+    earth_cells = np.zeros(la_endo.GetNumberOfCells(), dtype=bool)
     for var in bridge_list:
-        print(var)
+        earth_cells[la_endo_topology.cells_around_path(vtk_to_numpy(bridge_usgs[var].GetPoints().GetData()),
+                                                       0.7 * args.scale)] = True
 
-        reader = vtk.vtkUnstructuredGridReader()
-        reader.SetFileName(job.ID + "/bridges/" + str(var) + '_bridge_resampled.vtk')
-        reader.Update()
-        bridge_usg = reader.GetOutput()
-
-        locator = vtk.vtkStaticPointLocator()
-        locator.SetDataSet(la_endo)
-        locator.BuildLocator()
-
-        intersection_points = bridge_usg.GetPoints().GetData()
-        intersection_points = vtk_to_numpy(intersection_points)
-
-        earth_point_ids_temp = vtk.vtkIdList()
-        earth_point_ids = vtk.vtkIdList()
-        for i in range(len(intersection_points)):
-            locator.FindPointsWithinRadius(0.7 * args.scale, intersection_points[i], earth_point_ids_temp)
-            for j in range(earth_point_ids_temp.GetNumberOfIds()):
-                earth_point_ids.InsertNextId(earth_point_ids_temp.GetId(j))
-
-        earth_cell_ids_temp = vtk.vtkIdList()
-        earth_cell_ids = vtk.vtkIdList()
-        for i in range(earth_point_ids.GetNumberOfIds()):
-            la_endo.GetPointCells(earth_point_ids.GetId(i), earth_cell_ids_temp)
-            for j in range(earth_cell_ids_temp.GetNumberOfIds()):
-                earth_cell_ids.InsertNextId(earth_cell_ids_temp.GetId(j))
-                earth_cell_ids_list += [earth_cell_ids_temp.GetId(j)]
-
-        earth = apply_vtk_geom_filter(apply_extract_cell_filter(la_endo, earth_cell_ids))
-        earth = clean_polydata(earth)
-
-        print("Extracted earth")
-        cell_id_all = []
-        for i in range(la_endo.GetNumberOfCells()):
-            cell_id_all.append(i)
-
-        la_diff = list(set(cell_id_all).difference(set(earth_cell_ids_list)))
-
-        la_endo_final = vtk_append([get_cells_with_ids(la_endo, la_diff)],
-                                   merge_points=True)  # we lose this mesh, when defining the append filter later
+    la_endo_final = vtk_append([get_cells_with_ids(la_endo, np.flatnonzero(~earth_cells))],
+                               merge_points=True)  # we lose this mesh, when defining the append filter later
 
-        if args.debug and var == 'upper_posterior_bridge':
-            vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_endo_with_holes.vtu", la_endo_final)
+    Method.write_intermediate(args, la_endo_final, job.ID + "/result_RA/LA_endo_with_holes")
 
     filename = job.ID + '/bridges/bb_fiber.dat'
     f = open(filename, 'rb')
@@ -293,42 +367,15 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
     bb_fiber_points_data = vtk_to_numpy(generate_spline_points(bb_fiber).GetPoints().GetData())
 
     print("Union between earth and bridges")
-    for var in bridge_list:
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        list(executor.map(union_bridge_with_earth, [bridges_dir] * len(bridge_list), bridge_list,
+                          [args.scale] * len(bridge_list), [args.mesh_type == "vol"] * len(bridge_list),
+                          [cache_dir] * len(bridge_list)))
 
-        # if args.mesh_type == "vol":
-        #     mesh_D = pymesh.load_mesh(job.ID+"/bridges/"+str(var)+"_bridge_resampled.obj")
-        #     mesh_E = pymesh.load_mesh(job.ID+"/bridges/"+str(var)+"_earth.obj")
-        #     output_mesh_2 = pymesh.boolean(mesh_D, mesh_E, operation="union", engine="igl")
-        # elif args.mesh_type == "bilayer":
-        # Here
-        mesh_D = pymesh.load_mesh(job.ID + "/bridges/" + str(var) + "_bridge_resampled.obj")
-        mesh_E = pymesh.load_mesh(job.ID + "/bridges/" + str(var) + "_earth.obj")
-        # # Warning: set -1 if pts normals are pointing outside
-        #output_mesh_2 = pymesh.boolean(mesh_D, mesh_E, operation="union", engine="corefinement")
-        # Use difference if the endo normals are pointing inside
-        output_mesh_2 = pymesh.boolean(mesh_E, mesh_D, operation="difference", engine="corefinement")
-        pymesh.save_mesh(job.ID + "/bridges/" + str(var) + "_union_to_resample.obj", output_mesh_2, ascii=True)
+    for var in bridge_list:
         print("Union between earth and bridges in " + var)
 
-        ms = pymeshlab.MeshSet()
-        # if args.just_bridges and var == 'BB_intern_bridges':
-        # job.ID='../'+job.ID# Change if you enter from ra_main and not from pipeline.py, otherwise comment the line
-        ms.load_new_mesh(job.ID + "/bridges/" + str(var) + "_union_to_resample.obj")
-        ms.meshing_isotropic_explicit_remeshing(iterations=5, targetlen=pymeshlab.PureValue(0.4 * args.scale), adaptive=True)
-        ms.save_current_mesh(job.ID + "/bridges/" + str(var) + "_union.obj", save_vertex_color=False,
-                             save_vertex_normal=False, save_face_color=False, save_wedge_texcoord=False,
-                             save_wedge_normal=False)
-
         if args.mesh_type == "vol":
-            subprocess.run(["meshtool",
-                            "generate",
-                            "mesh",
-                            "-ofmt=vtk",
-                            "-prsv_bdry=1",
-                            # "-scale={}".format(0.4*args.scale),
-                            "-surf=" + job.ID + "/bridges/" + str(var) + "_union.obj",
-                            "-outmsh=" + job.ID + "/bridges/" + str(var) + "_union_mesh.vtk"])
-
             reader = vtk.vtkUnstructuredGridReader()  # vtkXMLUnstructuredGridReader
             reader.SetFileName(job.ID + "/bridges/" + str(var) + "_union_mesh.vtk")
             reader.Update()
@@ -368,8 +415,9 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
         meshNew.CellData.append(tag, "elemTag")
         meshNew.CellData.append(fiber, "fiber")
 
-        vtk_unstructured_grid_writer(job.ID + "/bridges/" + str(var) + "_union_mesh.vtk",
-                                     meshNew.VTKObject)  # we have the elemTags here
+        if Method.keep_intermediates(args):
+            vtk_unstructured_grid_writer(job.ID + "/bridges/" + str(var) + "_union_mesh.vtk",
+                                         meshNew.VTKObject)  # we have the elemTags here
 
         if var == 'BB_intern_bridges':
             bb = meshNew.VTKObject
@@ -380,69 +428,28 @@ def add_free_bridge(args, la_epi, ra_epi, CS_p, df, job):
         elif var == 'upper_posterior_bridge':
             up = meshNew.VTKObject
 
-    reader = vtk.vtkUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/bridges/BB_intern_bridges_union_mesh.vtk")
-    reader.Update()
-    bb = reader.GetOutput()
-
-    reader = vtk.vtkUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/bridges/coronary_sinus_bridge_union_mesh.vtk")
-    reader.Update()
-    cs = reader.GetOutput()
-
-    reader = vtk.vtkUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/bridges/middle_posterior_bridge_union_mesh.vtk")
-    reader.Update()
-    mp = reader.GetOutput()
-
-    reader = vtk.vtkUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/bridges/upper_posterior_bridge_union_mesh.vtk")
-    reader.Update()
-    up = reader.GetOutput()
-
-    bridges = vtk_append([bb, cs, mp, up])
+    bridges = vtk_append([bb, cs, mp, up])  # Has elementTag!
+    Method.write_intermediate(args, bridges, job.ID + "/result_RA/append_bridges_2")
 
-    vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/append_bridges_2.vtu", bridges)  # Has elementTag!
+    # la_ra_epi comes from the files of the LA and RA results, the bridges were built in memory
+    epi = vtk_append(Method.unify_array_types([la_ra_epi, bridges]))
 
-    reader = vtk.vtkXMLUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/result_RA/LA_RA_epi_with_holes.vtu")
-    reader.Update()
-    epi_new = reader.GetOutput()
-
-    reader = vtk.vtkXMLUnstructuredGridReader()
-    reader.SetFileName(job.ID + "/result_RA/append_bridges_2.vtu")
-    reader.Update()
-    bridges = reader.GetOutput()
-
-    epi = vtk_append([epi_new, bridges])
-
-    vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_RA_with_bundles.vtu", epi)
+    Method.write_intermediate(args, epi, job.ID + "/result_RA/LA_RA_with_bundles")
     epi = Method.generate_sheet_dir(args, epi, job)
 
-    vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/LA_RA_with_sheets.vtu", epi)
+    Method.write_intermediate(args, epi, job.ID + "/result_RA/LA_RA_with_sheets")
     if args.mesh_type == "bilayer":
 
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/la_ra_epi_with_sheets.vtu", epi)  # Has elemTag!
-        reader = vtk.vtkXMLUnstructuredGridReader()
-        reader.SetFileName(job.ID + "/result_RA/RA_CT_PMs.vtu")  # Has elemTag! :)
-        reader.Update()
-        ra_endo = reader.GetOutput()
-
-        reader = vtk.vtkXMLUnstructuredGridReader()
-        # reader.SetFileName(job.ID+"/result_LA/LA_endo_with_fiber.vtu") # Has elemTag! :)
-        reader.SetFileName(job.ID + "/result_RA/LA_endo_with_holes.vtu")  # Has elemTag! :)
-        reader.Update()
-        la_endo = reader.GetOutput()
+        if ra_endo is None:
+            ra_endo = Method.smart_reader(f"{job.ID}/result_RA/RA_CT_PMs.{args.ofmt}")  # Has elemTag! :)
 
-        bilayer_endo = vtk_append([la_endo, ra_endo])
+        bilayer_endo = vtk_append(Method.unify_array_types([la_endo_final, ra_endo]))  # Has elemTag!
+        Method.write_intermediate(args, bilayer_endo, job.ID + "/result_RA/append_LA_endo_RA_endo")
 
-        vtk_xml_unstructured_grid_writer(
-            job.ID + "/result_RA/append_LA_endo_RA_endo.vtu", bilayer_endo)
-        # Has elemTag!
         endo = Method.move_surf_along_normals(bilayer_endo, 0.1 * args.scale,
                                               1)  # # Warning: set -1 if pts normals are pointing outside
 
-        vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/la_ra_endo.vtu", endo)  # Has elemTag! :,
+        Method.write_intermediate(args, endo, job.ID + "/result_RA/la_ra_endo")  # Has elemTag! :,
         bilayer = Method.generate_bilayer(args, job, endo, epi, 0.12 * args.scale)  # Does not have elemTag :(!
 
         Method.write_bilayer(bilayer, args, job)
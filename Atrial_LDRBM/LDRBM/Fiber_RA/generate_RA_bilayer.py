@@ -10,12 +10,12 @@ import numpy as np
 # import pandas as pd
 import vtk
 from scipy.spatial import cKDTree
-from vtk.numpy_interface import dataset_adapter as dsa
 
+from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import assemble_bilayer
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, numpy_to_vtk
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_unstructured_grid_writer
-from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, get_vtk_geom_filter_port, vtk_append
+from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, get_vtk_geom_filter_port
 
 parser = argparse.ArgumentParser(description='Create Right Atrium.')
 
@@ -93,41 +93,12 @@ def generate_bilayer(endo, epi, max_dist=np.inf):
     epi_pts = vtk_to_numpy(epi.GetPoints().GetData())
 
     tree = cKDTree(epi_pts)
-    dd, ii = tree.query(endo_pts, distance_upper_bound=max_dist, n_jobs=-1)
+    dd, ii = tree.query(endo_pts, distance_upper_bound=max_dist)
 
     endo_ids = np.where(dd != np.inf)[0]
     epi_ids = ii[endo_ids]
-    lines = vtk.vtkCellArray()
 
-    for i in range(len(endo_ids)):
-        line = vtk.vtkLine()
-        line.GetPointIds().SetId(0, i);
-        line.GetPointIds().SetId(1, len(endo_ids) + i);
-        lines.InsertNextCell(line)
-
-    points = np.vstack((endo_pts[endo_ids], epi_pts[epi_ids]))
-    polydata = vtk.vtkUnstructuredGrid()
-    vtkPts = vtk.vtkPoints()
-    vtkPts.SetData(numpy_to_vtk(points))
-    polydata.SetPoints(vtkPts)
-    polydata.SetCells(3, lines)
-
-    fibers = np.zeros((len(endo_ids), 3), dtype="float32")
-    fibers[:, 0] = 1
-
-    tag = np.ones((len(endo_ids),), dtype=int)
-    tag[:] = 100
-
-    meshNew = dsa.WrapDataObject(polydata)
-    meshNew.CellData.append(tag, "elemTag")
-    meshNew.CellData.append(fibers, "fiber")
-    fibers = np.zeros((len(endo_ids), 3), dtype="float32")
-    fibers[:, 1] = 1
-    meshNew.CellData.append(fibers, "sheet")
-
-    bilayer = vtk_append([endo, epi, meshNew.VTKObject], True)
-
-    return bilayer
+    return assemble_bilayer(endo, epi, endo_ids, epi_ids)
 
 
 # Creates VTK and CARP files: .pts, .lon, .elem
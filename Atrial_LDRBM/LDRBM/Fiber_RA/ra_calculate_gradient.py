@@ -28,6 +28,7 @@ import os
 
 import vtk
 
+from Atrial_LDRBM.LDRBM.Fiber_LA.la_calculate_gradient import add_cell_gradients
 from vtk_opencarp_helper_methods.vtk_methods.converters import convert_point_to_cell_data
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_xml_unstructured_grid_writer
 
@@ -39,40 +40,15 @@ def ra_calculate_gradient(args, model, job):
 
     model_with_cell_data = convert_point_to_cell_data(model)
 
-    for var in name_list:
-        print('Calculating the gradient of ' + str(var) + '...')
-        if var == 'phi':
-            # using the vtkGradientFilter to calculate the gradient
-            if args.mesh_type == "vol":
-                gradientFilter = vtk.vtkGradientFilter()
-                gradientFilter.SetInputData(model_with_cell_data)
-                gradientFilter.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS,
-                                                      "phie_" + str(var))
-                gradientFilter.SetResultArrayName('grad_' + str(var))
-                gradientFilter.Update()
-                RA_gradient = gradientFilter.GetOutput()
-            else:
-                normalFilter = vtk.vtkPolyDataNormals()
-                normalFilter.SetInputData(model_with_cell_data)
-                normalFilter.ComputeCellNormalsOn()
-                normalFilter.ComputePointNormalsOff()
-                normalFilter.SplittingOff()
-                normalFilter.Update()
-                RA_gradient = normalFilter.GetOutput()
-                RA_gradient.GetCellData().GetArray("Normals").SetName('grad_' + str(var))
-        else:
-            gradientFilter = vtk.vtkGradientFilter()
-            gradientFilter.SetInputData(RA_gradient)
-            gradientFilter.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_CELLS,
-                                                  "phie_" + str(var))
-            gradientFilter.SetResultArrayName('grad_' + str(var))
-            gradientFilter.Update()
-            RA_gradient = gradientFilter.GetOutput()
-
-    print('Calculating the gradient of ' + str(var) + '... Done!')
+    print('Calculating the gradients of ' + ', '.join(name_list) + '...')
+    add_cell_gradients(model_with_cell_data, model, name_list, args.mesh_type)
+    print('Calculating the gradients of ' + ', '.join(name_list) + '... Done!')
 
-    output = vtk.vtkUnstructuredGrid()
-    output.DeepCopy(RA_gradient)
+    if isinstance(model_with_cell_data, vtk.vtkUnstructuredGrid):
+        output = model_with_cell_data
+    else:
+        output = vtk.vtkUnstructuredGrid()
+        output.DeepCopy(model_with_cell_data)
 
     if args.debug == 1:
         # write
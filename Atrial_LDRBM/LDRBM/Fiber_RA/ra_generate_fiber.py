@@ -38,7 +38,10 @@ from vtk.numpy_interface import dataset_adapter as dsa
 import Atrial_LDRBM.LDRBM.Fiber_RA.Methods_RA as Method
 from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import clean_all_data
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_generate_fiber import get_normalized_orthogonality
+from Atrial_LDRBM.LDRBM.Fiber_LA.threshold_masks import ThresholdMasks, THRESHOLD_BETWEEN, THRESHOLD_LOWER, \
+    THRESHOLD_UPPER
 from Atrial_LDRBM.LDRBM.Fiber_RA.Methods_RA import downsample_path
+from Atrial_LDRBM.mesh_topology import MeshTopology
 from vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations import vtk_thr, extract_largest_region
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import normalize_vectors
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
@@ -170,6 +173,8 @@ def ra_generate_fiber(model, args, job):
 
     model = generate_ids(model, "Global_ids", "Global_ids")
 
+    masks = ThresholdMasks(model)
+
     # TV
 
     tag = np.zeros((len(ab),), dtype=int)
@@ -190,16 +195,14 @@ def ra_generate_fiber(model, args, job):
 
     TV_s = get_cells_with_ids(model, TV_ids)
 
-    ra_diff = list(
-        set(list(vtk_to_numpy(model.GetCellData().GetArray('Global_ids')))).difference(
-            set(TV_ids)))
-
-    no_TV_s = get_cells_with_ids(model, ra_diff)
+    # Global_ids are the cell ids of model
+    no_TV_s = masks.all()
+    no_TV_s[TV_ids] = False
 
     # To check if TV was correctly identified
     if args.debug:
         Method.writer_vtk(TV_s, f'{args.mesh}_surf/' + "tv_s.vtk")
-        Method.writer_vtk(no_TV_s, f'{args.mesh}_surf/' + "no_tv_s.vtk")
+        Method.writer_vtk(masks.extract(no_TV_s), f'{args.mesh}_surf/' + "no_tv_s.vtk")
 
     # del ra_TV, ra_diff, ra_no_TV
 
@@ -207,17 +210,18 @@ def ra_generate_fiber(model, args, job):
 
     k[TV_ids] = r_grad[TV_ids]
 
-    IVC_s = vtk_thr(no_TV_s, 0, "CELLS", "phie_v", tao_icv)  # Changed 0-1 because ICV and SVC are inverted
-    no_IVC_s = vtk_thr(no_TV_s, 1, "CELLS", "phie_v", tao_icv)  # Changed 1-0
+    # Changed 0-1 because ICV and SVC are inverted
+    IVC_s = masks.extract(no_TV_s & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_v", tao_icv))
+    no_IVC_s = masks.extract(no_TV_s & masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_v", tao_icv))  # Changed 1-0
 
     IVC_s = extract_largest_region(IVC_s)  # Added
 
     max_phie_r_ivc = np.max(vtk_to_numpy(IVC_s.GetCellData().GetArray('phie_r'))) + 0.2
 
-    RAW_s = vtk_thr(no_TV_s, 1, "CELLS", "phie_r", max_phie_r_ivc)  # Added +0.03 fro dk01
+    RAW_s = no_TV_s & masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_r", max_phie_r_ivc)  # Added +0.03 fro dk01
 
-    SVC_s = vtk_thr(RAW_s, 1, "CELLS", "phie_v", tao_scv)  # Changed 1->0
-    no_SVC_s = vtk_thr(RAW_s, 0, "CELLS", "phie_v", tao_scv)  # Changed 0->1
+    SVC_s = masks.extract(RAW_s & masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_v", tao_scv))  # Changed 1->0
+    no_SVC_s = masks.extract(RAW_s & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_v", tao_scv))  # Changed 0->1
 
     SVC_s = extract_largest_region(SVC_s)
 
@@ -226,7 +230,7 @@ def ra_generate_fiber(model, args, job):
         Method.writer_vtk(no_IVC_s, f'{args.mesh}_surf/' + "no_ivc_s.vtk")
         Method.writer_vtk(SVC_s, f'{args.mesh}_surf/' + "svc_s.vtk")
         Method.writer_vtk(no_SVC_s, f'{args.mesh}_surf/' + "no_svc_s.vtk")
-        Method.writer_vtk(RAW_s, f'{args.mesh}_surf/' + "raw_s.vtk")
+        Method.writer_vtk(masks.extract(RAW_s), f'{args.mesh}_surf/' + "raw_s.vtk")
 
     tao_ct_plus = np.min(vtk_to_numpy(SVC_s.GetCellData().GetArray('phie_w')))
 
@@ -242,10 +246,11 @@ def ra_generate_fiber(model, args, job):
     IVC_max_r_CT_pt = IVC_s.GetPoint(np.argmax(vtk_to_numpy(
         IVC_s.GetPointData().GetArray('phie_r'))))  # not always the best choice for pm1
 
-    CT_band = vtk_thr(RAW_s, 2, "CELLS", "phie_w", 0.1, tao_ct_plus)  # grad_w
+    CT_band = masks.extract(RAW_s & masks.threshold(THRESHOLD_BETWEEN, "CELLS", "phie_w", 0.1, tao_ct_plus))  # grad_w
     CT_band = extract_largest_region(CT_band)
 
-    CT_ub = vtk_thr(RAW_s, 2, "CELLS", "phie_w", tao_ct_plus - 0.02, tao_ct_plus)  # grad_w
+    CT_ub = masks.extract(RAW_s & masks.threshold(THRESHOLD_BETWEEN, "CELLS", "phie_w", tao_ct_plus - 0.02,
+                                                  tao_ct_plus))  # grad_w
 
     CT_ub = extract_largest_region(CT_ub)
 
@@ -297,7 +302,7 @@ def ra_generate_fiber(model, args, job):
 
     # SVC_CT_pt_id = loc.FindClosestPoint(SVC_CT_pt)
 
-    CT_minus = vtk_thr(RAW_s, 1, "CELLS", "phie_w", tao_ct_plus)  # grad_ab
+    CT_minus = masks.extract(RAW_s & masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_w", tao_ct_plus))  # grad_ab
 
     RAW_I_ids = vtk_to_numpy(CT_minus.GetCellData().GetArray('Global_ids'))
 
@@ -311,27 +316,27 @@ def ra_generate_fiber(model, args, job):
 
     k[TV_ids] = r_grad[TV_ids]
 
-    CT_plus = vtk_thr(RAW_s, 0, "CELLS", "phie_w", tao_ct_plus)
+    CT_plus = RAW_s & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_w", tao_ct_plus)
 
-    RAW_S = vtk_thr(CT_plus, 2, "CELLS", "phie_v", tao_scv,
-                    tao_icv)  # IB_S grad_v Changed order tao_scv, tao_icv
+    RAW_S = CT_plus & masks.threshold(THRESHOLD_BETWEEN, "CELLS", "phie_v", tao_scv,
+                                      tao_icv)  # IB_S grad_v Changed order tao_scv, tao_icv
 
-    RAW_S_ids = vtk_to_numpy(RAW_S.GetCellData().GetArray('Global_ids'))
+    RAW_S_ids = masks.ids(RAW_S)
 
     tag[RAW_S_ids] = right_atrial_lateral_wall_epi
 
     k[RAW_S_ids] = ab_grad[RAW_S_ids]
 
-    IB = vtk_thr(RAW_S, 1, "CELLS", "phie_r", 0.05)  # grad_r or w
+    IB = RAW_S & masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_r", 0.05)  # grad_r or w
 
-    IB_ids = vtk_to_numpy(IB.GetCellData().GetArray('Global_ids'))
+    IB_ids = masks.ids(IB)
 
     tag[IB_ids] = inter_caval_bundle_epi  # Change to 68
 
     if args.debug:
-        Method.writer_vtk(IB, f'{args.mesh}_surf/' + "ib.vtk")
-        Method.writer_vtk(RAW_S, f'{args.mesh}_surf/' + "raw_s.vtk")
-        Method.writer_vtk(CT_plus, f'{args.mesh}_surf/' + "ct_plus.vtk")
+        Method.writer_vtk(masks.extract(IB), f'{args.mesh}_surf/' + "ib.vtk")
+        Method.writer_vtk(masks.extract(RAW_S), f'{args.mesh}_surf/' + "raw_s.vtk")
+        Method.writer_vtk(masks.extract(CT_plus), f'{args.mesh}_surf/' + "ct_plus.vtk")
 
     k[IB_ids] = v_grad[IB_ids]
 
@@ -348,36 +353,38 @@ def ra_generate_fiber(model, args, job):
 
     plane = initialize_plane(norm_1, df["TV"])
 
-    septal_surf = get_elements_above_plane(apply_vtk_geom_filter(RAW_S), plane)
+    # the surface of RAW_S, which differs from RAW_S for volumetric meshes
+    septal_surf = get_elements_above_plane(apply_vtk_geom_filter(masks.extract(RAW_S)), plane)
+    septal_masks = ThresholdMasks(septal_surf)
 
-    RAS_S = vtk_thr(septal_surf, 0, "CELLS", "phie_w", tao_ct_plus)
-    RAS_S = vtk_thr(RAS_S, 0, "CELLS", "phie_r", 0.05)  # grad_r or w
+    RAS_S = septal_masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_w", tao_ct_plus)
+    RAS_S &= septal_masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_r", 0.05)  # grad_r or w
 
     if args.debug:
         Method.writer_vtk(septal_surf, f'{args.mesh}_surf/' + "septal_surf.vtk")
-        Method.writer_vtk(RAS_S, f'{args.mesh}_surf/' + "ras_s.vtk")
+        Method.writer_vtk(septal_masks.extract(RAS_S), f'{args.mesh}_surf/' + "ras_s.vtk")
 
-    RAS_S_ids = vtk_to_numpy(RAS_S.GetCellData().GetArray('Global_ids'))
+    RAS_S_ids = septal_masks.ids(RAS_S)
 
     tag[RAS_S_ids] = right_atrial_septum_epi
 
     k[RAS_S_ids] = r_grad[RAS_S_ids]
 
-    RAW_low = vtk_thr(no_TV_s, 0, "CELLS", "phie_r", max_phie_r_ivc)
+    RAW_low = no_TV_s & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_r", max_phie_r_ivc)
 
-    RAS_low = get_elements_above_plane(RAW_low, plane)
+    RAS_low = RAW_low & masks.below_planes([plane])
 
-    RAS_low = vtk_thr(RAS_low, 0, "CELLS", "phie_w", 0)  # grad_r overwrites the previous
+    RAS_low &= masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_w", 0)  # grad_r overwrites the previous
 
-    RAS_low_ids = vtk_to_numpy(RAS_low.GetCellData().GetArray('Global_ids'))
+    RAS_low_ids = masks.ids(RAS_low)
 
     tag[RAS_low_ids] = right_atrial_septum_epi
 
     k[RAS_low_ids] = r_grad[RAS_low_ids]
 
-    RAW_low = vtk_thr(RAW_low, 1, "CELLS", "phie_w", 0)  # grad_ab
+    RAW_low &= masks.threshold(THRESHOLD_LOWER, "CELLS", "phie_w", 0)  # grad_ab
 
-    RAW_low_ids = vtk_to_numpy(RAW_low.GetCellData().GetArray('Global_ids'))
+    RAW_low_ids = masks.ids(RAW_low)
 
     tag[RAW_low_ids] = right_atrial_lateral_wall_epi
 
@@ -391,12 +398,9 @@ def ra_generate_fiber(model, args, job):
 
     plane = initialize_plane(norm_1, IVC_SEPT_CT_pt)
 
-    septal_surf = get_elements_above_plane(no_TV_s, plane)
-
     if args.debug:
-        Method.writer_vtk(septal_surf, f'{args.mesh}_surf/' + "septal_surf_2.vtk")
-
-    CS_ids = vtk_to_numpy(septal_surf.GetCellData().GetArray('Global_ids'))
+        Method.writer_vtk(masks.extract(no_TV_s & masks.below_planes([plane])),
+                          f'{args.mesh}_surf/' + "septal_surf_2.vtk")
 
     # if len(CS_ids) == 0:
     ring_ids = np.loadtxt(f'{args.mesh}_surf/' + 'ids_CS.vtx', skiprows=2, dtype=int)
@@ -409,14 +413,15 @@ def ra_generate_fiber(model, args, job):
     k[CS_ids] = ab_grad[CS_ids]
 
     # tag = Method.assign_ra_appendage(model, SVC_s, np.array(df["RAA"]), tag, right_atrial_appendage_epi)
-    RAA_s = vtk_thr(no_TV_s, 0, "CELLS", "phie_v2", tao_RAA)
+    RAA_s = no_TV_s & masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_v2", tao_RAA)
 
     if args.debug:
-        Method.writer_vtk(RAS_low, f'{args.mesh}_surf/' + "ras_low.vtk")
-        Method.writer_vtk(RAA_s, f'{args.mesh}_surf/' + "raa_s.vtk")  # Check here if RAA is correctly tagged
-        Method.writer_vtk(RAW_low, f'{args.mesh}_surf/' + "raw_low.vtk")
+        Method.writer_vtk(masks.extract(RAS_low), f'{args.mesh}_surf/' + "ras_low.vtk")
+        Method.writer_vtk(masks.extract(RAA_s),
+                          f'{args.mesh}_surf/' + "raa_s.vtk")  # Check here if RAA is correctly tagged
+        Method.writer_vtk(masks.extract(RAW_low), f'{args.mesh}_surf/' + "raw_low.vtk")
 
-    RAA_ids = vtk_to_numpy(RAA_s.GetCellData().GetArray('Global_ids'))
+    RAA_ids = masks.ids(RAA_s)
 
     tag[RAA_ids] = right_atrial_appendage_epi
 
@@ -489,11 +494,8 @@ def ra_generate_fiber(model, args, job):
         meshNew.CellData.append(tag, "elemTag")
         meshNew.CellData.append(el, "fiber")
         meshNew.CellData.append(sheet, "sheet")
-        if args.ofmt == 'vtk':
-            vtk_unstructured_grid_writer(job.ID + "/result_RA/RA_epi_with_fiber.vtk", meshNew.VTKObject,
-                                         store_binary=True)
-        else:
-            vtk_xml_unstructured_grid_writer(job.ID + "/result_RA/RA_epi_with_fiber.vtu", meshNew.VTKObject)
+        # RA_epi_with_fiber is written with the pectinate muscles below
+        Method.write_intermediate(args, meshNew.VTKObject, job.ID + "/result_RA/RA_epi_with_fiber")
         """
         PM and CT
         """
@@ -631,58 +633,53 @@ def ra_generate_fiber(model, args, job):
     if args.debug:
         Method.create_pts(pm, 'pm_0_downsampled', f'{args.mesh}_surf/')
 
+    # shared by all pectinate muscles
     if args.mesh_type == "bilayer":
-
-        tag_endo = Method.assign_element_tag_around_path_within_radius(endo, pm, w_pm, tag_endo, pectinate_muscle)
-        fiber_endo = Method.assign_element_fiber_around_path_within_radius(endo, pm, w_pm, fiber_endo, smooth=False)
-
+        endo_topology = MeshTopology(endo)
     elif args.mesh_type == "vol":
+        model_topology = MeshTopology(model)
 
-        filter_cell_centers = vtk.vtkCellCenters()
-        filter_cell_centers.SetInputData(model)
-        filter_cell_centers.Update()
-        centroids_array = vtk_to_numpy(filter_cell_centers.GetOutput().GetPoints().GetData())
-
-        tree = cKDTree(centroids_array)
-
-        ii = tree.query_ball_point(pm, r=w_pm, workers=-1)
-
-        ii = list(set([item for sublist in ii for item in sublist]))
+    if args.mesh_type == "bilayer":
 
-        tag[ii] = pectinate_muscle
+        tag_endo = Method.assign_element_tag_around_path_within_radius(endo, pm, w_pm, tag_endo, pectinate_muscle,
+                                                                       topology=endo_topology)
+        fiber_endo = Method.assign_element_fiber_around_path_within_radius(endo, pm, w_pm, fiber_endo, smooth=False,
+                                                                           topology=endo_topology)
 
-        el = Method.assign_element_fiber_around_path_within_radius(model, pm, w_pm, el, smooth=False)
+    elif args.mesh_type == "vol":
 
-    for i in range(3, pm_num - 1):  # skip the first 3 pm as they will be in the IVC side
-        pm_point_1 = pm_ct_id_list[(i + 1) * pm_ct_dis]
-        pm_point_2 = pm_tv_id_list[(i + 1) * pm_tv_dis]
-        pm = Method.dijkstra_path_on_a_plane(surface, args, pm_point_1, pm_point_2, center)
+        tag[model_topology.cells_with_centroid_around_path(pm, w_pm)] = pectinate_muscle
 
-        # skip first 3% of the points since they will be on the roof of the RA
-        pm = pm[int(len(pm) * 0.03):, :]  #
+        el = Method.assign_element_fiber_around_path_within_radius(model, pm, w_pm, el, smooth=False,
+                                                                   topology=model_topology)
 
-        pm = Method.downsample_path(pm, int(len(pm) * 0.065))
+    # skip the first 3 pm as they will be in the IVC side
+    pm_ids = range(3, pm_num - 1)
+    point_pairs = [(pm_ct_id_list[(i + 1) * pm_ct_dis], pm_tv_id_list[(i + 1) * pm_tv_dis]) for i in pm_ids]
+    # the bands written with --debug run VTK filters on the shared surface, keep those runs serial
+    n_workers = 1 if args.debug else min(len(point_pairs), args.np)
+    if args.mesh_type == "bilayer":
+        muscles = Method.pectinate_muscles(args, surface, point_pairs, center, endo_topology, w_pm,
+                                           n_workers=n_workers)
+    elif args.mesh_type == "vol":
+        muscles = Method.pectinate_muscles(args, surface, point_pairs, center, model_topology, w_pm,
+                                           tag_by_centroid=True, n_workers=n_workers)
 
+    # later muscles overwrite the tags and fibers of earlier ones, as in the serial construction
+    for i, (pm, tag_ids, fiber_ids, pm_fiber) in zip(pm_ids, muscles):
         if args.debug:
             Method.create_pts(pm, 'pm_' + str(i + 1) + '_downsampled', f'{args.mesh}_surf/')
 
         print("The ", i + 1, "th pm done")
         if args.mesh_type == "bilayer":
 
-            tag_endo = Method.assign_element_tag_around_path_within_radius(endo, pm, w_pm, tag_endo, pectinate_muscle)
-            print("The ", i + 1, "th pm's tag is done")
-            fiber_endo = Method.assign_element_fiber_around_path_within_radius(endo, pm, w_pm, fiber_endo, smooth=False)
-            print("The ", i + 1, "th pm's fiber is done")
+            tag_endo[tag_ids] = pectinate_muscle
+            fiber_endo[fiber_ids] = pm_fiber
 
         elif args.mesh_type == "vol":
 
-            ii = tree.query_ball_point(pm, r=w_pm, n_jobs=-1)
-
-            ii = list(set([item for sublist in ii for item in sublist]))
-
-            tag[ii] = pectinate_muscle
-
-            el = Method.assign_element_fiber_around_path_within_radius(model, pm, w_pm, el, smooth=False)
+            tag[tag_ids] = pectinate_muscle
+            el[fiber_ids] = pm_fiber
 
     if args.mesh_type == "bilayer":
 
@@ -798,8 +795,11 @@ def ra_generate_fiber(model, args, job):
     bb_step = int(len(bachmann_bundle_points_data) * 0.1)
     bb_points = downsample_path(bachmann_bundle_points_data, bb_step)
 
-    tag = Method.assign_element_tag_around_path_within_radius(model, bb_points, w_bb, tag, bachmann_bundel_right)
-    el = Method.assign_element_fiber_around_path_within_radius(model, bb_points, w_bb, el, smooth=True)
+    model_topology = MeshTopology(model)
+    tag = Method.assign_element_tag_around_path_within_radius(model, bb_points, w_bb, tag, bachmann_bundel_right,
+                                                              topology=model_topology)
+    el = Method.assign_element_fiber_around_path_within_radius(model, bb_points, w_bb, el, smooth=True,
+                                                               topology=model_topology)
 
     tag[SN_ids] = sinus_node
 
@@ -899,6 +899,6 @@ def ra_generate_fiber(model, args, job):
             print("No CS found, use last CT point instead")
 
         if args.mesh_type == "bilayer":
-            add_free_bridge(args, la_epi, model, CS_p, df, job)
+            add_free_bridge(args, la_epi, model, CS_p, df, job, ra_endo=CT_PMs)
         elif args.mesh_type == "vol":
             add_free_bridge(args, la, model, CS_p, df, job)
@@ -26,118 +26,57 @@ under the License.
 """
 import os
 
-from carputils import tools
-from carputils.carpio import igb
 from vtk.numpy_interface import dataset_adapter as dsa
 
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import solve_laplace_fields, laplace_cache_keys, write_laplace_keys
 from Atrial_LDRBM.LDRBM.Fiber_RA.ra_calculate_gradient import ra_calculate_gradient
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_xml_unstructured_grid_writer, vtk_polydata_writer
 
 EXAMPLE_DIR = os.path.dirname(os.path.realpath(__file__))
 
 
-def ra_laplace(args, job, model):
-    meshdir = args.mesh + '_surf/RA'
+def ra_laplace_specs(args):
+    """
+    Lists the RA Laplace solves as (name, par_file, vtx_files).
+    """
     surfdir = f'{args.mesh}_surf/'
     parfdir = os.path.join(EXAMPLE_DIR, 'Parfiles')
 
+    lp_specs = []
     if args.mesh_type == 'vol':
-        ####################################
-        # Solver for the phi laplace soluton
-        ####################################
-        cmd = tools.carp_cmd(parfdir + '/ra_lps_phi.par')
-        simid = job.ID + '/Lp_phi'
-        cmd += ['-simID', simid,
-                '-meshname', meshdir,
-                '-stimulus[0].vtx_file', surfdir + 'ids_ENDO',
-                '-stimulus[1].vtx_file', surfdir + 'ids_EPI']
-
-        # Run simulation
-        job.carp(cmd)
-
-    #####################################
-    # Solver for the ab laplace soluton
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/ra_lps_ab.par')
-    simid = job.ID + '/Lp_ab'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_SVC',
-            '-stimulus[1].vtx_file', surfdir + 'ids_IVC',
-            '-stimulus[2].vtx_file', surfdir + 'ids_TV_S',
-            '-stimulus[3].vtx_file', surfdir + 'ids_TV_F',
-            '-stimulus[4].vtx_file', surfdir + 'ids_RAA']
-
-    # Run simulation
-    job.carp(cmd)
-
-    #####################################
-    # Solver for the v laplace soluton
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/ra_lps_v.par')
-    simid = job.ID + '/Lp_v'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_SVC',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RAA',
-            '-stimulus[2].vtx_file', surfdir + 'ids_IVC']
-
-    # Run simulation
-    job.carp(cmd)
-
-    #####################################
-    # Solver for the v2 laplace soluton
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/ra_lps_phi.par')
-    simid = job.ID + '/Lp_v2'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_IVC',
-            '-stimulus[1].vtx_file', surfdir + 'ids_RAA']
-
-    # Run simulation
-    job.carp(cmd)
-
+        # phi laplace solution
+        lp_specs.append(('phi', parfdir + '/ra_lps_phi.par',
+                         [surfdir + 'ids_ENDO', surfdir + 'ids_EPI']))
+
+    # ab laplace solution
+    lp_specs.append(('ab', parfdir + '/ra_lps_ab.par',
+                     [surfdir + 'ids_SVC', surfdir + 'ids_IVC', surfdir + 'ids_TV_S', surfdir + 'ids_TV_F',
+                      surfdir + 'ids_RAA']))
+    # v laplace solution
+    lp_specs.append(('v', parfdir + '/ra_lps_v.par',
+                     [surfdir + 'ids_SVC', surfdir + 'ids_RAA', surfdir + 'ids_IVC']))
+    # v2 laplace solution
+    lp_specs.append(('v2', parfdir + '/ra_lps_phi.par',
+                     [surfdir + 'ids_IVC', surfdir + 'ids_RAA']))
+    # r laplace solution
     if args.mesh_type == 'vol':
-        #####################################
-        # Solver for the r laplace soluton
-        #####################################
-        cmd = tools.carp_cmd(parfdir + '/ra_lps_r_vol.par')
-        simid = job.ID + '/Lp_r'
-        cmd += ['-simID', simid,
-                '-meshname', meshdir,
-                '-stimulus[0].vtx_file', surfdir + 'ids_TOP_ENDO',
-                '-stimulus[1].vtx_file', surfdir + 'ids_TOP_EPI',
-                '-stimulus[2].vtx_file', surfdir + 'ids_TV_F',
-                '-stimulus[3].vtx_file', surfdir + 'ids_TV_S']
-
-        # Run simulation
-        job.carp(cmd)
-
+        lp_specs.append(('r', parfdir + '/ra_lps_r_vol.par',
+                         [surfdir + 'ids_TOP_ENDO', surfdir + 'ids_TOP_EPI', surfdir + 'ids_TV_F',
+                          surfdir + 'ids_TV_S']))
     else:
-        cmd = tools.carp_cmd(parfdir + '/ra_lps_r.par')
-        simid = job.ID + '/Lp_r'
-        cmd += ['-simID', simid,
-                '-meshname', meshdir,
-                '-stimulus[0].vtx_file', surfdir + 'ids_TOP_ENDO',
-                '-stimulus[1].vtx_file', surfdir + 'ids_TV_F',
-                '-stimulus[2].vtx_file', surfdir + 'ids_TV_S']
-
-        # Run simulation
-        job.carp(cmd)
-
-    #####################################
-    # Solver for the w laplace soluton
-    #####################################
-    cmd = tools.carp_cmd(parfdir + '/ra_lps_w.par')
-    simid = job.ID + '/Lp_w'
-    cmd += ['-simID', simid,
-            '-meshname', meshdir,
-            '-stimulus[0].vtx_file', surfdir + 'ids_TV_S',
-            '-stimulus[1].vtx_file', surfdir + 'ids_TV_F']
-
-    # Run simulation
-    job.carp(cmd)
+        lp_specs.append(('r', parfdir + '/ra_lps_r.par',
+                         [surfdir + 'ids_TOP_ENDO', surfdir + 'ids_TV_F', surfdir + 'ids_TV_S']))
+    # w laplace solution
+    lp_specs.append(('w', parfdir + '/ra_lps_w.par',
+                     [surfdir + 'ids_TV_S', surfdir + 'ids_TV_F']))
+
+    return lp_specs
+
+
+def ra_laplace(args, job, model):
+    meshdir = args.mesh + '_surf/RA'
+    lp_specs = ra_laplace_specs(args)
+    solutions = solve_laplace_fields(args, job, model, meshdir, lp_specs)
 
     """
     generate .vtu files that contain the result of laplace solution as point/cell data
@@ -148,9 +87,8 @@ def ra_laplace(args, job, model):
     if args.mesh_type == 'vol':
         name_list = ['phi', 'r', 'v', 'v2', 'ab', 'w']
     for var in name_list:
-        data = igb.IGBFile(job.ID + "/Lp_" + str(var) + "/phie.igb").data()
         # add the vtk array to model
-        meshNew.PointData.append(data, "phie_" + str(var))
+        meshNew.PointData.append(solutions[var], "phie_" + str(var))
 
     if args.debug == 1:
         # write
@@ -170,5 +108,9 @@ def ra_laplace(args, job, model):
     calculate the gradient
     """
     output = ra_calculate_gradient(args, meshNew.VTKObject, job)
+    if args.debug == 1:
+        # lets ra_main --laplace 0 check that the written gradient still matches the inputs
+        write_laplace_keys(job.ID + "/gradient/RA_with_lp_res_gradient.vtu",
+                           laplace_cache_keys(args, model, lp_specs))
 
     return output
@@ -35,9 +35,11 @@ from carputils import tools
 
 import Atrial_LDRBM.LDRBM.Fiber_RA.Methods_RA as Method
 from Atrial_LDRBM.LDRBM.Fiber_LA.la_main import init_mesh_and_fibers
+from Atrial_LDRBM.LDRBM.Fiber_LA.laplace_solver import LAPLACE_SOLVERS, laplace_cache_keys, laplace_keys_match
 from Atrial_LDRBM.LDRBM.Fiber_RA.create_bridges import add_free_bridge
 from Atrial_LDRBM.LDRBM.Fiber_RA.ra_generate_fiber import ra_generate_fiber
-from Atrial_LDRBM.LDRBM.Fiber_RA.ra_laplace import ra_laplace
+from Atrial_LDRBM.LDRBM.Fiber_RA.ra_laplace import ra_laplace, ra_laplace_specs
+from Atrial_LDRBM.tracing import trace, traced_run
 from vtk_opencarp_helper_methods.openCARP.exporting import write_to_pts, write_to_elem, write_to_lon
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.reader import smart_reader
@@ -64,6 +66,10 @@ def parser():
                         type=int,
                         default=1,
                         help='path to meshname')
+    parser.add_argument('--keep_intermediates',
+                        type=int,
+                        default=0,
+                        help='set to 1 to write the intermediate grids of the fiber and bridge stages, 0 otherwise')
     parser.add_argument('--scale',
                         type=int,
                         default=1,
@@ -88,6 +94,10 @@ def parser():
                         type=int,
                         default=1,
                         help='set to 1 to run laplace solutions')
+    parser.add_argument('--laplace_solver',
+                        default='carp',
+                        choices=LAPLACE_SOLVERS,
+                        help='backend for the laplace-dirichlet solves: openCARP or in-process scipy')
 
     return parser
 
@@ -101,41 +111,55 @@ def jobID(args):
 def run(args, job):
     RA = init_mesh_and_fibers(args, "RA")
 
-    start_time = datetime.datetime.now()
-    print('[Step 1] Solving laplace-dirichlet... ' + str(start_time))
-    if args.laplace:
-        output_laplace = ra_laplace(args, job, RA)
-    else:
-        output_laplace = Method.smart_reader(job.ID + "/gradient/RA_with_lp_res_gradient.vtu")
-        print("Reading Laplace: " + job.ID + "/gradient/RA_with_lp_res_gradient.vtu")
-
-    end_time = datetime.datetime.now()
-    running_time = end_time - start_time
-    print('[Step 1] Solving laplace-dirichlet...done! ' + str(end_time) + '\nRunning time: ' + str(running_time) + '\n')
-
-    start_time = datetime.datetime.now()
-    print('[Step 2] Generating fibers... ' + str(start_time))
-
-    if args.just_bridges:
-        la_epi = Method.smart_reader(job.ID + "/result_LA/LA_epi_with_fiber.vtu")
-        model = Method.smart_reader(job.ID + "/result_RA/RA_epi_with_fiber.vtu")
-        df = pd.read_csv(args.mesh + "_surf/rings_centroids.csv")
-        CS_p = np.array(df["CS"])
-        add_free_bridge(args, la_epi, model, CS_p, df, job)
-
-        args.atrium = "LA_RA"
-        os.system("meshtool convert -imsh={} -ifmt=carp_txt -omsh={} -ofmt=carp_txt -scale={}".format(
-            '{}_fibers/result_RA/{}_bilayer_with_fiber'.format(args.mesh, args.atrium),
-            '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium), 1000 * args.scale))
-        os.system("meshtool convert -imsh={} -ifmt=carp_txt -omsh={} -ofmt=vtk".format(
-            '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium),
-            '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium)))
-    else:
-        ra_generate_fiber(output_laplace, args, job)
-
-    end_time = datetime.datetime.now()
-    running_time = end_time - start_time
-    print('[Step 2] Generating fibers...done! ' + str(end_time) + '\nRunning time: ' + str(running_time) + '\n')
+    # standalone runs write their own profile, runs started by pipeline.py are part of its profile
+    with traced_run('ra_main', job.ID + '/result_RA/RA'):
+        start_time = datetime.datetime.now()
+        print('[Step 1] Solving laplace-dirichlet... ' + str(start_time))
+        gradient_file = job.ID + "/gradient/RA_with_lp_res_gradient.vtu"
+        if not args.laplace and not laplace_keys_match(gradient_file,
+                                                       laplace_cache_keys(args, RA, ra_laplace_specs(args))):
+            warnings.warn(f"{gradient_file} is missing or was computed for another mesh or boundaries, "
+                          "solving laplace again")
+            args.laplace = 1
+
+        if args.laplace:
+            with trace('ra_laplace'):
+                output_laplace = ra_laplace(args, job, RA)
+        else:
+            output_laplace = Method.smart_reader(gradient_file)
+            print("Reading Laplace: " + gradient_file)
+
+        end_time = datetime.datetime.now()
+        running_time = end_time - start_time
+        print('[Step 1] Solving laplace-dirichlet...done! ' + str(end_time) + '\nRunning time: ' + str(running_time)
+              + '\n')
+
+        start_time = datetime.datetime.now()
+        print('[Step 2] Generating fibers... ' + str(start_time))
+
+        if args.just_bridges:
+            la_epi = Method.smart_reader(job.ID + "/result_LA/LA_epi_with_fiber.vtu")
+            model = Method.smart_reader(job.ID + "/result_RA/RA_epi_with_fiber.vtu")
+            df = pd.read_csv(args.mesh + "_surf/rings_centroids.csv")
+            CS_p = np.array(df["CS"])
+            add_free_bridge(args, la_epi, model, CS_p, df, job)
+
+            args.atrium = "LA_RA"
+            with trace('meshtool convert'):
+                os.system("meshtool convert -imsh={} -ifmt=carp_txt -omsh={} -ofmt=carp_txt -scale={}".format(
+                    '{}_fibers/result_RA/{}_bilayer_with_fiber'.format(args.mesh, args.atrium),
+                    '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium), 1000 * args.scale))
+                os.system("meshtool convert -imsh={} -ifmt=carp_txt -omsh={} -ofmt=vtk".format(
+                    '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium),
+                    '{}_fibers/result_RA/{}_bilayer_with_fiber_um'.format(args.mesh, args.atrium)))
+        else:
+            with trace('ra_generate_fiber'):
+                ra_generate_fiber(output_laplace, args, job)
+
+        end_time = datetime.datetime.now()
+        running_time = end_time - start_time
+        print('[Step 2] Generating fibers...done! ' + str(end_time) + '\nRunning time: ' + str(running_time)
+              + '\n')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,673 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized mesh topology helpers shared by the mesh preprocessing and the fiber generation.
+
+MeshTopology memoizes the structures several stages rebuild for the same mesh (point -> cell adjacency,
+cell centroids, KD-trees, edge graph). Create it once per mesh and pass it to the functions working on that mesh.
+GeodesicPaths answers shortest edge path queries on the cached edge graph of a surface.
+BoundaryLoops finds the ordered boundary loops of a surface on its polygon array.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+import vtk
+from scipy import sparse
+from scipy.sparse import csgraph
+from scipy.spatial import cKDTree
+
+from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, numpy_to_vtk
+
+REGION_CELL_IDS = 'region_cell_ids'
+
+
+def cell_connectivity(mesh):
+    """
+    Returns the cells of a mesh as offsets and connectivity arrays, in cell id order.
+
+    :param mesh: vtkUnstructuredGrid or vtkPolyData
+    :return: offsets (n_cells + 1,), connectivity
+    """
+    if isinstance(mesh, vtk.vtkPolyData):
+        # vtkPolyData numbers its cells verts, lines, polys and then strips
+        cell_arrays = [mesh.GetVerts(), mesh.GetLines(), mesh.GetPolys(), mesh.GetStrips()]
+    else:
+        cell_arrays = [mesh.GetCells()]
+
+    offsets = [np.zeros(1, dtype=np.int64)]
+    connectivity = []
+    for cell_array in cell_arrays:
+        if cell_array is None or cell_array.GetNumberOfCells() == 0:
+            continue
+        offsets.append(vtk_to_numpy(cell_array.GetOffsetsArray())[1:].astype(np.int64) + offsets[-1][-1])
+        connectivity.append(vtk_to_numpy(cell_array.GetConnectivityArray()).astype(np.int64))
+    connectivity = np.concatenate(connectivity) if connectivity else np.zeros(0, dtype=np.int64)
+    return np.concatenate(offsets), connectivity
+
+
+def cell_types(mesh):
+    """
+    Returns the VTK cell type of every cell, in cell id order.
+    """
+    if isinstance(mesh, vtk.vtkPolyData):
+        offsets, _ = cell_connectivity(mesh)
+        sizes = np.diff(offsets)
+        types = []
+        for cell_array, single, multi in [(mesh.GetVerts(), vtk.VTK_VERTEX, vtk.VTK_POLY_VERTEX),
+                                          (mesh.GetLines(), vtk.VTK_LINE, vtk.VTK_POLY_LINE),
+                                          (mesh.GetPolys(), vtk.VTK_TRIANGLE, vtk.VTK_POLYGON),
+                                          (mesh.GetStrips(), vtk.VTK_TRIANGLE_STRIP, vtk.VTK_TRIANGLE_STRIP)]:
+            n_cells = cell_array.GetNumberOfCells() if cell_array is not None else 0
+            cell_sizes, sizes = sizes[:n_cells], sizes[n_cells:]
+            single_size = {vtk.VTK_VERTEX: 1, vtk.VTK_LINE: 2, vtk.VTK_TRIANGLE: 3}.get(single, 0)
+            block = np.where(cell_sizes == single_size, single, multi)
+            if single == vtk.VTK_TRIANGLE:
+                block[cell_sizes == 4] = vtk.VTK_QUAD
+            types.append(block)
+        return np.concatenate(types).astype(np.uint8)
+    if vtk.vtkVersion.GetVTKMajorVersion() * 100 + vtk.vtkVersion.GetVTKMinorVersion() >= 906:
+        return vtk_to_numpy(mesh.GetCellTypes())
+    return vtk_to_numpy(mesh.GetCellTypesArray())
+
+
+def point_cell_adjacency(mesh, cells=None):
+    """
+    Builds the point -> cell incidence of a mesh as a sparse CSR matrix (n_points x n_cells).
+    Row i lists the cells using point i, like GetPointCells.
+
+    :param cells: Optional (offsets, connectivity) of the mesh
+    """
+    offsets, connectivity = cell_connectivity(mesh) if cells is None else cells
+    cell_of_entry = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    return sparse.csr_matrix((np.ones(len(connectivity), dtype=bool), (connectivity, cell_of_entry)),
+                             shape=(mesh.GetNumberOfPoints(), len(offsets) - 1))
+
+
+def cell_centroids(mesh, cells=None):
+    """
+    Returns the mean of the points of every cell.
+
+    :param cells: Optional (offsets, connectivity) of the mesh
+    """
+    offsets, connectivity = cell_connectivity(mesh) if cells is None else cells
+    points = vtk_to_numpy(mesh.GetPoints().GetData()).astype(float)
+    counts = np.diff(offsets)
+    sums = np.add.reduceat(points[connectivity], offsets[:-1], axis=0) if len(connectivity) else np.zeros((0, 3))
+    return sums / np.maximum(counts, 1)[:, None]
+
+
+def _ball_query(tree, query_points, radius):
+    hits = tree.query_ball_point(np.asarray(query_points, dtype=float).reshape(-1, 3), radius)
+    return np.unique(np.fromiter((i for hit in hits for i in hit), dtype=np.int64))
+
+
+class MeshTopology:
+    """
+    Lazily built, memoized topology of one mesh. The mesh must not change while the index is in use.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+
+    @cached_property
+    def points(self):
+        return vtk_to_numpy(self.mesh.GetPoints().GetData()).astype(float)
+
+    @cached_property
+    def cells(self):
+        """
+        Offsets and connectivity of the cells, see cell_connectivity.
+        """
+        return cell_connectivity(self.mesh)
+
+    @cached_property
+    def point_cells(self):
+        """
+        Point -> cell incidence as sparse CSR matrix (n_points x n_cells).
+        """
+        return point_cell_adjacency(self.mesh, self.cells)
+
+    @cached_property
+    def centroids(self):
+        return cell_centroids(self.mesh, self.cells)
+
+    @cached_property
+    def point_tree(self):
+        return cKDTree(self.points)
+
+    @cached_property
+    def centroid_tree(self):
+        return cKDTree(self.centroids)
+
+    @cached_property
+    def is_tetra(self):
+        return cell_types(self.mesh) == vtk.VTK_TETRA
+
+    def build_indices(self, around_path=True, edge_graph=False, centroid_tree=False):
+        """
+        Builds the selected indices right away. cached_property is not thread safe, so a topology shared by threads
+        must have every index they use built before they start; afterwards the threads only read them.
+
+        :param around_path: Point -> cell adjacency, point KD-tree and cell centroids used by cells_around_path
+        :param edge_graph: Edge graph used by the geodesic paths
+        :param centroid_tree: KD-tree of the cell centroids
+        """
+        if around_path:
+            _ = self.point_cells, self.point_tree, self.centroids
+        if edge_graph:
+            _ = self.edge_graph
+        if centroid_tree:
+            _ = self.centroid_tree
+
+    def _cell_edges(self, cell_ids=None):
+        offsets, connectivity = self.cells
+        sizes = np.diff(offsets)
+        selected_cells = np.ones(len(sizes), dtype=bool)
+        if cell_ids is not None:
+            selected_cells = np.zeros(len(sizes), dtype=bool)
+            selected_cells[cell_ids] = True
+
+        first, second = [], []
+        for size in np.unique(sizes[sizes > 1]):
+            for tetra in (False, True):
+                selected = selected_cells & (sizes == size) & (self.is_tetra == tetra)
+                if not selected.any():
+                    continue
+                cells = connectivity[offsets[:-1][selected, None] + np.arange(size)]
+                if tetra:
+                    pairs = [(i, j) for i in range(4) for j in range(i + 1, 4)]
+                elif size == 2:
+                    pairs = [(0, 1)]
+                else:
+                    pairs = [(i, (i + 1) % size) for i in range(size)]
+                for i, j in pairs:
+                    first.append(cells[:, i])
+                    second.append(cells[:, j])
+
+        first = np.concatenate(first) if first else np.zeros(0, dtype=np.int64)
+        second = np.concatenate(second) if second else np.zeros(0, dtype=np.int64)
+        return first, second
+
+    @cached_property
+    def edge_graph(self):
+        """
+        Symmetric sparse matrix (n_points x n_points) holding the length of every cell edge.
+        Consecutive points of lines and polygons are connected, every point pair of a tetrahedron.
+        """
+        first, second = self._cell_edges()
+        n_points = len(self.points)
+        graph = sparse.coo_matrix((np.ones(len(first)), (first, second)), shape=(n_points, n_points)).tocsr()
+        graph.sum_duplicates()
+        # edges shared by several cells were summed, keep a single length
+        rows = np.repeat(np.arange(n_points), np.diff(graph.indptr))
+        graph.data = np.linalg.norm(self.points[rows] - self.points[graph.indices], axis=1)
+        graph = graph.maximum(graph.T).tocsr()
+        graph.sort_indices()
+        return graph
+
+    def edge_mask(self, cell_ids):
+        """
+        Selects the edges of the given cells.
+
+        :param cell_ids: Cell ids or boolean cell mask
+        :return: Boolean mask aligned with edge_graph.data
+        """
+        cell_ids = np.asarray(cell_ids)
+        if cell_ids.dtype == bool:
+            cell_ids = np.flatnonzero(cell_ids)
+        first, second = self._cell_edges(cell_ids)
+        n_points = len(self.points)
+        graph = self.edge_graph
+        rows = np.repeat(np.arange(n_points), np.diff(graph.indptr))
+        return np.isin(rows * n_points + graph.indices,
+                       np.concatenate([first * n_points + second, second * n_points + first]))
+
+    def cells_with_all_points(self, point_mask):
+        """
+        Selects the cells whose points are all selected by point_mask.
+
+        :return: Boolean cell mask
+        """
+        offsets, connectivity = self.cells
+        cell_mask = np.zeros(len(offsets) - 1, dtype=bool)
+        non_empty = np.diff(offsets) > 0
+        if non_empty.any():
+            cell_mask[non_empty] = np.logical_and.reduceat(point_mask[connectivity], offsets[:-1][non_empty])
+        return cell_mask
+
+    def points_of_cells(self, cell_mask):
+        """
+        Selects the points used by the cells selected by cell_mask.
+
+        :return: Boolean point mask
+        """
+        point_mask = np.zeros(len(self.points), dtype=bool)
+        point_mask[self.point_cells[:, cell_mask].nonzero()[0]] = True
+        return point_mask
+
+    def below_planes(self, planes):
+        """
+        Selects the points on the negative side of all planes, the side vtkExtractGeometry keeps.
+
+        :param planes: vtkPlane objects
+        :return: Boolean point mask
+        """
+        inside = np.ones(len(self.points), dtype=bool)
+        for plane in planes:
+            inside &= (self.points - np.asarray(plane.GetOrigin())) @ np.asarray(plane.GetNormal()) < 0.0
+        return inside
+
+    def cells_around_path(self, points_data, radius):
+        """
+        Finds the cells having at least one point within radius of any path point, with one batched ball query.
+
+        :return: Sorted unique cell ids
+        """
+        point_ids = _ball_query(self.point_tree, points_data, radius)
+        return np.unique(self.point_cells[point_ids].indices)
+
+    def cells_with_centroid_around_path(self, points_data, radius):
+        """
+        Finds the cells whose centroid is within radius of any path point.
+
+        :return: Sorted unique cell ids
+        """
+        return _ball_query(self.centroid_tree, points_data, radius)
+
+
+def cells_around_path(mesh, points_data, radius, topology=None):
+    """
+    Finds the cells having at least one point within radius of any path point, with one batched ball query.
+
+    :param mesh: Mesh to search
+    :param points_data: Path points (n, 3)
+    :param radius: Search radius
+    :param topology: Optional MeshTopology of the mesh, reused across calls
+    :return: Sorted unique cell ids
+    """
+    if topology is None:
+        topology = MeshTopology(mesh)
+    return topology.cells_around_path(points_data, radius)
+
+
+def path_segment_tangents(points_data, smooth):
+    """
+    Returns the unit tangent of every path segment (points i -> i+1).
+    With smooth the tangent of the segment ending in point i spans five points (i - 5 -> i).
+    """
+    points_data = np.asarray(points_data, dtype=float)
+    if smooth:
+        step = min(5, len(points_data) - 1)
+        ends = np.arange(1, len(points_data))
+        starts = np.maximum(ends - step, 0)
+        ends = np.maximum(ends, step)
+        tangents = points_data[ends] - points_data[starts]
+    else:
+        tangents = np.diff(points_data, axis=0)
+    norm = np.linalg.norm(tangents, axis=1)
+    tangents[norm > 0] /= norm[norm > 0, None]
+    return tangents
+
+
+def nearest_path_segment(points_data, query_points):
+    """
+    Returns for every query point the index of the closest path segment (points i -> i+1).
+    """
+    points_data = np.asarray(points_data, dtype=float)
+    n_segments = len(points_data) - 1
+    _, nearest_point = cKDTree(points_data).query(query_points)
+
+    # the closest segment is one of the two segments sharing the closest path point
+    candidates = np.stack([np.clip(nearest_point - 1, 0, n_segments - 1),
+                           np.clip(nearest_point, 0, n_segments - 1)], axis=1)
+    start = points_data[candidates]
+    direction = points_data[candidates + 1] - start
+    length2 = np.einsum('ijk,ijk->ij', direction, direction)
+    t = np.einsum('ijk,ijk->ij', query_points[:, None] - start, direction)
+    t = np.clip(np.divide(t, length2, out=np.zeros_like(t), where=length2 > 0), 0, 1)
+    distance = np.linalg.norm(start + t[..., None] * direction - query_points[:, None], axis=2)
+    return candidates[np.arange(len(candidates)), np.argmin(distance, axis=1)]
+
+
+class ConnectedRegions:
+    """
+    The connected regions of a mesh, split with a single vtkConnectivityFilter pass with ColorRegionsOn instead of one
+    AddSpecifiedRegion/Update/DeleteSpecifiedRegion pass per region. Regions are numbered as vtkConnectivityFilter
+    numbers them for AddSpecifiedRegion.
+    """
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        n_cells = mesh.GetNumberOfCells()
+
+        # tag the cells with their id, the filter outputs them grouped by region
+        tagged = mesh.NewInstance()
+        tagged.ShallowCopy(mesh)
+        cell_ids = numpy_to_vtk(np.arange(n_cells, dtype=np.int64), deep=True, array_type=vtk.VTK_ID_TYPE)
+        cell_ids.SetName(REGION_CELL_IDS)
+        tagged.GetCellData().AddArray(cell_ids)
+
+        connect = vtk.vtkConnectivityFilter()
+        connect.SetInputData(tagged)
+        connect.SetExtractionModeToAllRegions()
+        connect.ColorRegionsOn()
+        connect.Update()
+        output = connect.GetOutput()
+
+        self.n_regions = connect.GetNumberOfExtractedRegions()
+        self.cell_regions = np.full(n_cells, -1, dtype=np.int64)
+        if output.GetNumberOfCells():
+            self.cell_regions[vtk_to_numpy(output.GetCellData().GetArray(REGION_CELL_IDS))] = \
+                vtk_to_numpy(output.GetCellData().GetArray('RegionId'))
+
+        order = np.argsort(self.cell_regions, kind='stable')
+        bounds = np.searchsorted(self.cell_regions[order], np.arange(self.n_regions + 1))
+        self._cell_ids = [order[bounds[i]:bounds[i + 1]] for i in range(self.n_regions)]
+        self._regions = {}
+
+    def __len__(self):
+        return self.n_regions
+
+    def __iter__(self):
+        return (self.region(i) for i in range(self.n_regions))
+
+    @cached_property
+    def topology(self):
+        return MeshTopology(self.mesh)
+
+    def cell_ids(self, region_id):
+        """
+        :return: Sorted ids of the cells of a region
+        """
+        return self._cell_ids[region_id]
+
+    def point_ids(self, region_id):
+        """
+        :return: Sorted ids of the points used by the cells of a region
+        """
+        cell_mask = np.zeros(self.mesh.GetNumberOfCells(), dtype=bool)
+        cell_mask[self._cell_ids[region_id]] = True
+        return np.flatnonzero(self.topology.points_of_cells(cell_mask))
+
+    def region(self, region_id):
+        """
+        Extracts a region with all point and cell arrays, built on first use. The cells keep their order in the mesh.
+
+        :return: vtkUnstructuredGrid, or vtkPolyData for a vtkPolyData mesh
+        """
+        if region_id not in self._regions:
+            ids = vtk.vtkIdList()
+            for cell_id in self._cell_ids[region_id]:
+                ids.InsertNextId(int(cell_id))
+            extract = vtk.vtkExtractCells()
+            extract.SetInputData(self.mesh)
+            extract.SetCellList(ids)
+            extract.Update()
+            region = extract.GetOutput()
+            if isinstance(self.mesh, vtk.vtkPolyData):
+                geo_filter = vtk.vtkGeometryFilter()
+                geo_filter.SetInputData(region)
+                geo_filter.Update()
+                region = geo_filter.GetOutput()
+            self._regions[region_id] = region
+        return self._regions[region_id]
+
+
+def boundary_edges(surface):
+    """
+    Finds the edges of the polygons of a surface that are used by a single polygon, the edges vtkFeatureEdges returns
+    with BoundaryEdgesOn.
+
+    :return: (n_edges, 2) point ids, sorted within each edge and along the edges
+    """
+    polys = surface.GetPolys()
+    if polys is None or polys.GetNumberOfCells() == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    offsets = vtk_to_numpy(polys.GetOffsetsArray()).astype(np.int64)
+    connectivity = vtk_to_numpy(polys.GetConnectivityArray()).astype(np.int64)
+
+    # edge k of a polygon runs from its point k to its point k + 1, the last point closes back to the first
+    next_entry = np.arange(1, len(connectivity) + 1)
+    next_entry[offsets[1:] - 1] = offsets[:-1]
+    edges = np.sort(np.column_stack((connectivity, connectivity[next_entry])), axis=1)
+    edges, counts = np.unique(edges, axis=0, return_counts=True)
+    return edges[counts == 1]
+
+
+class BoundaryLoops:
+    """
+    The boundary loops of a surface computed on its polygon array, replacing vtkFeatureEdges followed by a
+    connectivity pass per loop. Loops are numbered by their smallest point id and their points are ordered along the
+    loop. A loop that touches another one or itself in a point cannot be ordered and keeps its points sorted by id.
+    """
+
+    def __init__(self, surface):
+        self.surface = surface
+        self.edges = boundary_edges(surface)
+        n_points = surface.GetNumberOfPoints()
+
+        graph = sparse.coo_matrix((np.ones(len(self.edges)), (self.edges[:, 0], self.edges[:, 1])),
+                                  shape=(n_points, n_points)).tocsr()
+        graph = (graph + graph.T).tocsr()
+        graph.sort_indices()
+        _, labels = csgraph.connected_components(graph, directed=False)
+
+        # components are numbered in point order, keep the ones with boundary edges
+        boundary_points = np.unique(self.edges)
+        loop_labels, loop_index = np.unique(labels[boundary_points], return_inverse=True)
+        self.edge_loops = np.searchsorted(loop_labels, labels[self.edges[:, 0]])
+
+        order = np.argsort(loop_index, kind='stable')
+        bounds = np.searchsorted(loop_index[order], np.arange(len(loop_labels) + 1))
+        degree = np.diff(graph.indptr)
+        self.ordered = np.zeros(len(loop_labels), dtype=bool)
+        self._point_ids = []
+        for i in range(len(loop_labels)):
+            loop = boundary_points[order[bounds[i]:bounds[i + 1]]]
+            if np.all(degree[loop] == 2):
+                loop = self._chain(graph, loop[0], len(loop))
+                self.ordered[i] = True
+            self._point_ids.append(loop)
+
+        # centroids and mean radii of all loops in one pass over the concatenated loop points
+        self.n_points = np.array([len(loop) for loop in self._point_ids], dtype=np.int64)
+        points = vtk_to_numpy(surface.GetPoints().GetData()) if n_points else np.zeros((0, 3))
+        if len(self._point_ids):
+            loop_points = points[np.concatenate(self._point_ids)]
+            starts = np.concatenate(([0], np.cumsum(self.n_points)[:-1]))
+            self.centers = np.add.reduceat(loop_points, starts, axis=0) / self.n_points[:, None]
+            distances = np.linalg.norm(loop_points - np.repeat(self.centers, self.n_points, axis=0), axis=1)
+            self.radii = np.add.reduceat(distances, starts) / self.n_points
+        else:
+            self.centers = np.zeros((0, 3))
+            self.radii = np.zeros(0)
+
+    @staticmethod
+    def _chain(graph, start, length):
+        """
+        Walks a loop of points that all have two neighbours, starting towards the smaller neighbour of start.
+        """
+        loop = np.empty(length, dtype=np.int64)
+        previous, current = -1, start
+        for k in range(length):
+            loop[k] = current
+            first, second = graph.indices[graph.indptr[current]:graph.indptr[current] + 2]
+            previous, current = current, (second if first == previous else first)
+        return loop
+
+    def __len__(self):
+        return len(self._point_ids)
+
+    def point_ids(self, loop_id):
+        """
+        :return: Surface point ids of a loop, in loop order
+        """
+        return self._point_ids[loop_id]
+
+    def polydata(self, loop_id):
+        """
+        Builds a loop as vtkPolyData of line cells with all point arrays of the surface, as the cleaned boundary
+        edges region of that loop.
+        """
+        point_ids = self._point_ids[loop_id]
+        local_ids = np.full(self.surface.GetNumberOfPoints(), -1, dtype=np.int64)
+        local_ids[point_ids] = np.arange(len(point_ids))
+        if self.ordered[loop_id]:
+            lines = np.column_stack((np.arange(len(point_ids)), np.roll(np.arange(len(point_ids)), -1)))
+        else:
+            lines = local_ids[self.edges[self.edge_loops == loop_id]]
+
+        loop = vtk.vtkPolyData()
+        vtk_points = vtk.vtkPoints()
+        vtk_points.SetData(numpy_to_vtk(vtk_to_numpy(self.surface.GetPoints().GetData())[point_ids], deep=True))
+        loop.SetPoints(vtk_points)
+        cells = vtk.vtkCellArray()
+        cells.SetData(numpy_to_vtk(np.arange(0, 2 * len(lines) + 1, 2, dtype=np.int64), deep=True,
+                                   array_type=vtk.VTK_ID_TYPE),
+                      numpy_to_vtk(lines.ravel().astype(np.int64), deep=True, array_type=vtk.VTK_ID_TYPE))
+        loop.SetLines(cells)
+
+        point_data = self.surface.GetPointData()
+        for i in range(point_data.GetNumberOfArrays()):
+            array = point_data.GetArray(i)
+            if array is None:
+                continue
+            values = numpy_to_vtk(np.ascontiguousarray(vtk_to_numpy(array)[point_ids]), deep=True,
+                                  array_type=array.GetDataType())
+            values.SetName(array.GetName())
+            loop.GetPointData().AddArray(values)
+        return loop
+
+
+class GeodesicPaths:
+    """
+    Shortest edge paths on a mesh, like vtkDijkstraGraphGeodesicPath, computed with scipy.sparse.csgraph on the
+    memoized edge graph of the mesh. Paths are returned from start to end, both included.
+    """
+
+    def __init__(self, mesh, topology=None):
+        self.mesh = mesh
+        self.topology = MeshTopology(mesh) if topology is None else topology
+        self.coordinates = vtk_to_numpy(mesh.GetPoints().GetData())
+
+    def _graph(self, edge_mask=None):
+        graph = self.topology.edge_graph
+        if edge_mask is None:
+            return graph
+        graph = graph.copy()
+        graph.data[~np.asarray(edge_mask, dtype=bool)] = 0
+        graph.eliminate_zeros()
+        return graph
+
+    def _trace(self, predecessors, end):
+        ids = [end]
+        while predecessors[ids[-1]] >= 0:
+            ids.append(predecessors[ids[-1]])
+        # an unreachable end is returned alone, as vtkDijkstraGraphGeodesicPath does
+        return np.asarray(ids[::-1], dtype=np.int64)
+
+    def path_ids_from(self, start, ends, edge_mask=None):
+        """
+        Computes the paths from one start point to several end points with a single Dijkstra run.
+
+        :return: List of point id arrays, one per end point
+        """
+        _, predecessors = csgraph.dijkstra(self._graph(edge_mask), indices=int(start), return_predecessors=True)
+        return [self._trace(predecessors, int(end)) for end in ends]
+
+    def path_ids_between(self, starts, ends, edge_mask=None):
+        """
+        Computes the paths between every start and every end point, one Dijkstra run per distinct start point.
+
+        :return: Nested list of point id arrays, indexed [start][end]
+        """
+        starts = np.asarray(starts, dtype=np.int64)
+        unique_starts, index = np.unique(starts, return_inverse=True)
+        _, predecessors = csgraph.dijkstra(self._graph(edge_mask), indices=unique_starts, return_predecessors=True)
+        return [[self._trace(predecessors[i], int(end)) for end in ends] for i in index]
+
+    def path_ids(self, start, end, edge_mask=None):
+        return self.path_ids_from(start, [end], edge_mask)[0]
+
+    def path(self, start, end, edge_mask=None):
+        """
+        :return: Coordinates of the points of the shortest path from start to end
+        """
+        return self.coordinates[self.path_ids(start, end, edge_mask)]
+
+    def paths_from(self, start, ends, edge_mask=None):
+        return [self.coordinates[ids] for ids in self.path_ids_from(start, ends, edge_mask)]
+
+    def paths_between(self, starts, ends, edge_mask=None):
+        return [[self.coordinates[ids] for ids in row] for row in self.path_ids_between(starts, ends, edge_mask)]
+
+
+GEODESIC_CACHE_SIZE = 8
+_geodesic_paths = OrderedDict()
+_geodesic_paths_lock = threading.Lock()
+
+
+def _mesh_key(mesh):
+    offsets, connectivity = cell_connectivity(mesh)
+    digest = hashlib.sha1()
+    for array in (vtk_to_numpy(mesh.GetPoints().GetData()), offsets, connectivity):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return type(mesh).__name__, digest.hexdigest()
+
+
+def get_geodesic_paths(mesh):
+    """
+    Returns the GeodesicPaths of a mesh. The engines of the last few meshes are kept, keyed on the points and cells,
+    so that filtered copies of the same surface share their edge graph.
+    """
+    key = _mesh_key(mesh)
+    with _geodesic_paths_lock:
+        if key in _geodesic_paths:
+            _geodesic_paths.move_to_end(key)
+            return _geodesic_paths[key]
+        engine = GeodesicPaths(mesh)
+        _geodesic_paths[key] = engine
+        if len(_geodesic_paths) > GEODESIC_CACHE_SIZE:
+            _geodesic_paths.popitem(last=False)
+        return engine
+
+
+def plane_band_edge_mask(mesh, planes, topology=None):
+    """
+    Selects the edges of the cells lying completely on the negative side of all planes, which are the cells
+    vtkExtractGeometry keeps with these planes as implicit functions.
+
+    :param planes: vtkPlane objects
+    :return: Boolean edge mask aligned with the edge graph, mask of the points of the kept cells
+    """
+    topology = MeshTopology(mesh) if topology is None else topology
+    kept_cells = topology.cells_with_all_points(topology.below_planes(planes))
+    return topology.edge_mask(kept_cells), topology.points_of_cells(kept_cells)
+
+
+def closest_point_id(points, point, mask=None):
+    """
+    Returns the id of the point closest to point, optionally among the points selected by mask only.
+    """
+    ids = np.arange(len(points)) if mask is None else np.flatnonzero(mask)
+    return int(ids[np.argmin(np.linalg.norm(points[ids] - np.asarray(point, dtype=float).reshape(3), axis=1))])
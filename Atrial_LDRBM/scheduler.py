@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Core budget of the pipeline.
+
+The usable cores are the CPUs the process may run on (CPU affinity, e.g. set by SLURM or taskset), limited by the CPU
+quota of its cgroup in containers. The budget is split between runs and solves that happen at the same time, and
+every openCARP solve gets only as many processes as its mesh size pays off.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import os
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+# Fewer mesh nodes per MPI process make a Laplace solve slower, not faster
+MIN_NODES_PER_PROCESS = 20000
+
+# Cores a mesh keeps busy on average; the mesh processing between the solves is mostly single threaded
+CORES_PER_RUN = 4
+
+
+def _read_numbers(path):
+    with open(path) as f:
+        return f.read().split()
+
+
+def cgroup_cpu_limit(cgroup_root=CGROUP_ROOT):
+    """
+    Reads the CPU quota of the cgroup, from cpu.max (cgroup v2) or cpu.cfs_quota_us and cpu.cfs_period_us (cgroup v1).
+
+    :param cgroup_root: Mount point of the cgroup file system
+    :return: Number of CPUs the quota allows, None without quota
+    """
+    try:
+        quota, period = _read_numbers(os.path.join(cgroup_root, 'cpu.max'))[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(_read_numbers(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'))[0])
+        period = int(_read_numbers(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us'))[0])
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def usable_cores(cgroup_root=CGROUP_ROOT):
+    """
+    :return: Number of cores the process can use, at least 1
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        n_cores = len(os.sched_getaffinity(0))
+    else:
+        n_cores = os.cpu_count() or 1
+    limit = cgroup_cpu_limit(cgroup_root)
+    if limit is not None:
+        n_cores = min(n_cores, int(limit))
+    return max(1, n_cores)
+
+
+def split_cores(n_cores, n_jobs):
+    """
+    :return: Cores of each of n_jobs runs or solves sharing n_cores, at least 1
+    """
+    return max(1, n_cores // max(1, n_jobs))
+
+
+def processes_for_mesh(n_nodes, n_cores):
+    """
+    Chooses the number of MPI processes of a solve on a mesh with n_nodes nodes, so that small meshes are not split
+    into more partitions than pay off.
+
+    :param n_nodes: Number of mesh nodes
+    :param n_cores: Cores available to the solve
+    :return: Number of processes, between 1 and n_cores
+    """
+    return max(1, min(n_cores, n_nodes // MIN_NODES_PER_PROCESS))
+
+
+def concurrent_runs(n_runs, n_cores):
+    """
+    :return: Number of meshes to process at once with n_cores, at most n_runs
+    """
+    return max(1, min(n_runs, n_cores // CORES_PER_RUN))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight tracing of the pipeline stages.
+
+A span is opened with the trace context manager or the traced decorator and records its wall time, the CPU time of
+the process and of the calling thread, the CPU time of the child processes (meshtool, openCARP) that finished during
+the span and the peak resident set size of the process and of its children. Spans nest per thread; a span opened on a
+worker thread continues the span path passed as its parent, usually current_path() of the submitting thread. The
+outermost span of a run opened with traced_run writes all spans of the process as JSON and CSV profile when it closes.
+
+The process CPU time of a span includes the work of other threads running at the same time, the thread CPU time only
+the calling thread. The child process CPU time cannot be told apart between threads either, so it is left empty for
+spans on worker threads and counted by the enclosing span of the submitting thread. Peak RSS values are high-water
+marks of the whole run up to the end of the span.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import csv
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_FIELDS = ['name', 'path', 'depth', 'pid', 'thread', 'start', 'wall_s', 'cpu_s', 'thread_cpu_s',
+                  'children_cpu_s', 'peak_rss_mb', 'children_peak_rss_mb', 'status']
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_RSS_TO_MB = 1.0 / (1024 * 1024) if sys.platform == 'darwin' else 1.0 / 1024
+
+_spans = []
+_spans_lock = threading.Lock()
+_local = threading.local()
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def current_path():
+    """
+    :return: Path of the innermost open span of the calling thread, to pass as parent to spans of worker threads
+    """
+    return '/'.join(_stack())
+
+
+def _usage(children):
+    """
+    :return: CPU time in s and peak RSS in MB of the process, or of its terminated and waited-for children
+    """
+    if resource is None:
+        return 0.0, 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * _RSS_TO_MB
+
+
+@contextmanager
+def trace(name, parent=None, **attrs):
+    """
+    Records a span around the enclosed block. Extra keyword arguments are stored with the span.
+
+    :param parent: Span path the span continues when it is the first span of a worker thread
+    """
+    stack = _stack()
+    inherited = parent.split('/') if parent and not stack else []
+    stack.extend(inherited)
+    stack.append(name)
+    in_worker = getattr(_local, 'in_worker', False)
+    _local.in_worker = in_worker or parent is not None
+    start = time.time()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    thread_cpu_start = time.thread_time()
+    children_cpu_start, _ = _usage(children=True)
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'failed'
+        raise
+    finally:
+        children_cpu, children_peak_rss = _usage(children=True)
+        _, peak_rss = _usage(children=False)
+        span = {
+            'name': name,
+            'path': '/'.join(stack),
+            'depth': len(stack) - 1,
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'start': start,
+            'wall_s': time.perf_counter() - wall_start,
+            'cpu_s': time.process_time() - cpu_start,
+            'thread_cpu_s': time.thread_time() - thread_cpu_start,
+            'children_cpu_s': None if _local.in_worker else children_cpu - children_cpu_start,
+            'peak_rss_mb': peak_rss,
+            'children_peak_rss_mb': children_peak_rss,
+            'status': status,
+        }
+        span.update(attrs)
+        del stack[len(stack) - 1 - len(inherited):]
+        _local.in_worker = in_worker
+        with _spans_lock:
+            _spans.append(span)
+
+
+def traced(name=None):
+    """
+    Decorator recording a span around every call of the function, named after the function by default.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with trace(name or func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def spans():
+    """
+    :return: Copy of the spans recorded by this process, in the order they closed
+    """
+    with _spans_lock:
+        return list(_spans)
+
+
+def write_profile(profile_base, recorded=None):
+    """
+    Writes spans as <profile_base>_profile.json and <profile_base>_profile.csv.
+
+    :param profile_base: Path of the profile without suffix
+    :param recorded: Spans to write, all spans of the process by default
+    """
+    recorded = spans() if recorded is None else recorded
+    directory = os.path.dirname(str(profile_base))
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{profile_base}_profile.json", 'w') as f:
+        json.dump(recorded, f, indent=2)
+    with open(f"{profile_base}_profile.csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=PROFILE_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(recorded)
+
+
+@contextmanager
+def traced_run(name, profile_base, **attrs):
+    """
+    Traces a whole run. If no other span of the thread is open, the spans recorded since the run started are written
+    to the profile when it ends, also on failure. A run nested in another span is only traced, the enclosing run
+    writes it.
+    """
+    outermost = not _stack()
+    with _spans_lock:
+        first_span = len(_spans)
+    try:
+        with trace(name, **attrs):
+            yield
+    finally:
+        if outermost:
+            try:
+                write_profile(profile_base, spans()[first_span:])
+                print(f"INFO: Profile written to {profile_base}_profile.json")
+            except OSError as e:
+                print(f"WARNING: Could not write profile {profile_base}_profile.json: {e}")
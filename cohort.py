@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch mode of AugmentA for a cohort of meshes.
+
+The cohort is given as a CSV manifest with one row per mesh. The 'mesh' column is required, every other column is a
+main.py option without the leading dashes (e.g. 'atrium', 'resample_input', 'apex-file') and overrides the value given
+on the command line for that mesh. Empty cells keep the command line value.
+
+Meshes that need no user input are processed in a process pool right away. The appendage apex picks of all other
+meshes are collected in one interactive session while the pool is running, and each mesh is handed to the pool as
+soon as its apexes are known. Meshes that need the user during their run (manual orifice opening, LA_RA resampling)
+run one after the other in the main process.
+
+Licensed to the Apache Software Foundation (ASF) under one
+or more contributor license agreements.  See the NOTICE file
+distributed with this work for additional information
+regarding copyright ownership.  The ASF licenses this file
+to you under the Apache License, Version 2.0 (the
+"License"); you may not use this file except in compliance
+with the License.  You may obtain a copy of the License at
+
+  http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing,
+software distributed under the License is distributed on an
+"AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+KIND, either express or implied.  See the License for the
+specific language governing permissions and limitations
+under the License.
+"""
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from Atrial_LDRBM.scheduler import usable_cores, split_cores, concurrent_runs
+from pipeline import run_pipeline, _load_apex_ids, _pick_apex_ids, _save_apex_ids_to_file
+
+# How a cohort member gets its appendage apexes
+READY = 'ready'
+PICK_FIRST = 'pick_first'
+INTERACTIVE = 'interactive'
+
+
+def read_manifest(manifest_path: str, parser: argparse.ArgumentParser, argv: List[str]) -> List[argparse.Namespace]:
+    """
+    Reads a cohort manifest into one argument namespace per mesh.
+
+    :param manifest_path: CSV file with a 'mesh' column and optional main.py option columns
+    :param parser: main.py argument parser
+    :param argv: Command line arguments shared by all meshes
+    :return: Parsed arguments of every mesh, in manifest order
+    """
+    if not os.path.isfile(manifest_path):
+        raise FileNotFoundError(f"Cohort manifest not found: {manifest_path}")
+
+    df = pd.read_csv(manifest_path, dtype=str, keep_default_na=False)
+    if "mesh" not in df.columns:
+        raise ValueError("Cohort manifest must contain a 'mesh' column.")
+
+    cohort = []
+    for _, row in df.iterrows():
+        row_argv = []
+        for option, value in row.items():
+            if value.strip():
+                row_argv += [f"--{option}", value.strip()]
+        args = parser.parse_args(argv + row_argv)
+        args.mesh = os.path.abspath(args.mesh)
+        args.cohort = None
+        cohort.append(args)
+    return cohort
+
+
+def apex_atria(atrium: str) -> List[str]:
+    return {"LA": ["LAA"], "RA": ["RAA"], "LA_RA": ["LAA", "RAA"]}[atrium]
+
+
+def interaction_mode(args: argparse.Namespace) -> str:
+    """
+    Tells whether a cohort member can run without the user (READY), only needs its appendage apexes picked on the input
+    mesh before it runs (PICK_FIRST), or needs the user during its run (INTERACTIVE).
+    """
+    resamples = args.resample_input and args.find_appendage
+    if args.SSM_fitting and args.resample_input:
+        return INTERACTIVE
+    if args.apex_file:
+        # resample_surf_mesh picks the RA apex of LA_RA meshes itself
+        return INTERACTIVE if resamples and args.atrium == "LA_RA" else READY
+    if args.closed_surface:
+        return INTERACTIVE if resamples else READY
+    if args.open_orifices:
+        return INTERACTIVE
+    if not args.find_appendage:
+        return READY
+    return INTERACTIVE if resamples and args.atrium == "LA_RA" else PICK_FIRST
+
+
+def apex_file_path(args: argparse.Namespace) -> str:
+    # one file per atrium, manifest rows may annotate the same mesh as LA and as RA
+    return f"{os.path.splitext(args.mesh)[0]}_{args.atrium}_apex_ids.csv"
+
+
+def collect_apex_ids(args: argparse.Namespace) -> str:
+    """
+    Provides the appendage apexes of a PICK_FIRST member as apex file, reusing the IDs saved by a previous run of the
+    mesh and asking the user for the missing ones.
+
+    :return: Path of the apex file
+    """
+    laa_id, raa_id = _load_apex_ids(os.path.splitext(args.mesh)[0])
+    saved = {key: value for key, value in (("LAA", laa_id), ("RAA", raa_id)) if value is not None}
+    if all(key in saved for key in apex_atria(args.atrium)):
+        apex_ids = {key: saved[key] for key in apex_atria(args.atrium)}
+        print(f"INFO: Reusing saved apex IDs for {args.mesh}: {apex_ids}")
+    else:
+        print(f"INFO: Pick the appendage apex of {args.mesh}")
+        apex_ids = _pick_apex_ids(args.mesh, args.atrium)
+
+    filepath = apex_file_path(args)
+    _save_apex_ids_to_file(filepath, apex_ids)
+    return filepath
+
+
+def run_member(row: int, args: argparse.Namespace, n_cores: int) -> Tuple[int, bool]:
+    """
+    Runs the whole pipeline for the manifest row with a core budget of n_cores. AugmentA exits on failure, which is
+    reported instead of ending the cohort.
+
+    :return: The manifest row and whether its run succeeded
+    """
+    try:
+        run_pipeline(args, n_cores)
+    except SystemExit as e:
+        return row, e.code in (None, 0)
+    return row, True
+
+
+def run_cohort(cohort: List[argparse.Namespace], n_workers: int = 0) -> Dict[int, bool]:
+    """
+    Runs AugmentA for every mesh of a cohort.
+
+    :param cohort: Arguments of every mesh, as read by read_manifest
+    :param n_workers: Number of meshes processed at once, 0 to derive it from the usable cores
+    :return: Success of every manifest row, keyed by its index
+    """
+    modes = [interaction_mode(args) for args in cohort]
+    n_cores = usable_cores()
+    if n_workers <= 0:
+        n_workers = concurrent_runs(len(cohort), n_cores)
+    # the interactive meshes run in this process next to the pool
+    n_cores_per_mesh = split_cores(n_cores, n_workers + (INTERACTIVE in modes))
+
+    print(f"INFO: Cohort of {len(cohort)} meshes: {modes.count(READY)} ready, {modes.count(PICK_FIRST)} waiting for "
+          f"apex picks, {modes.count(INTERACTIVE)} interactive. Running {n_workers} at once with {n_cores_per_mesh} "
+          f"cores each.")
+
+    results = {}
+    # spawn the workers so that they do not inherit the render windows of the interactive session
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = [executor.submit(run_member, row, cohort[row], n_cores_per_mesh) for row, mode in enumerate(modes)
+                   if mode == READY]
+
+        # One interactive session for all apex picks, the pool keeps working on the ready meshes meanwhile
+        for row in [row for row, mode in enumerate(modes) if mode == PICK_FIRST]:
+            args = cohort[row]
+            try:
+                args.apex_file = collect_apex_ids(args)
+            except Exception as e:
+                print(f"ERROR: Apex picking failed for {args.mesh}: {e}")
+                results[row] = False
+                continue
+            futures.append(executor.submit(run_member, row, args, n_cores_per_mesh))
+
+        for row in [row for row, mode in enumerate(modes) if mode == INTERACTIVE]:
+            print(f"INFO: Running {cohort[row].mesh} interactively")
+            row, success = run_member(row, cohort[row], n_cores_per_mesh)
+            results[row] = success
+
+        for future in as_completed(futures):
+            row, success = future.result()
+            results[row] = success
+
+    failed = [row for row in range(len(cohort)) if not results.get(row, False)]
+    print(f"\n--- Cohort Finished: {len(cohort) - len(failed)} of {len(cohort)} meshes succeeded ---")
+    for row in failed:
+        print(f"FAILED: row {row + 1}: {cohort[row].mesh} ({cohort[row].atrium})")
+    return results
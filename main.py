@@ -30,8 +30,10 @@ EXAMPLE_AUTHOR = 'Luca Azzolin <luca.azzolin@kit.edu>'
 
 import argparse
 import os
+import sys
 
-from pipeline import AugmentA
+from cohort import read_manifest, run_cohort
+from pipeline import run_pipeline
 
 EXAMPLE_DIR = os.path.dirname(os.path.realpath(__file__))
 
@@ -112,21 +114,34 @@ def parser():
                         default=None,
                         help='Path to a CSV file specifying apex IDs to bypass interactive picking. '
                              'Format: a header row "atrium,id" followed by rows like "LAA,123".')
+    parser.add_argument('--resume',
+                        type=int,
+                        default=0,
+                        help='set to 1 to skip the stages recorded in the workflow manifest of the mesh whose inputs, '
+                             'parameters and outputs are unchanged, 0 to run all stages')
+    parser.add_argument('--cohort',
+                        type=str,
+                        default=None,
+                        help='Path to a CSV manifest with a "mesh" column and optional per-mesh option columns, '
+                             'to process a cohort of meshes instead of --mesh')
+    parser.add_argument('--cohort_workers',
+                        type=int,
+                        default=0,
+                        help='number of cohort meshes processed at once, 0 to derive it from the number of cores')
     return parser
 
 
 def run():
     args = parser().parse_args()
 
-    # In case both atria and closed surface are given process LA first and RA later
-    if args.atrium == 'LA_RA' and args.closed_surface:
-        print("Current no support for biatrial volumetric bridge generation. Annotating LA and RA separately")
-        args.atrium = 'LA'
-        AugmentA(args)
-        args.atrium = 'RA'
-        AugmentA(args)
+    if args.cohort:
+        cohort = read_manifest(args.cohort, parser(), sys.argv[1:])
+        results = run_cohort(cohort, args.cohort_workers)
+        if not all(results.values()):
+            sys.exit(1)
     else:
-        AugmentA(args)
+        # In case both atria and closed surface are given LA and RA are processed side by side
+        run_pipeline(args)
 
 
 if __name__ == '__main__':
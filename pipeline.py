@@ -29,10 +29,13 @@ under the License.
 # TODO: !!!Done but needs testing!!! Allow appendage point to be provided from a text file instead of manual picking.
 # TODO: Enable or disable steps by choice so that we resample first for X amount of meshes, then the user can pick the apex point.
 
+import copy
+import multiprocessing
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from string import Template
-from typing import Dict, Tuple, Any, Optional
+from typing import Dict, Tuple, Any, Optional, Callable, Iterable
 from pathlib import Path
 
 import numpy as np
@@ -58,6 +61,8 @@ from vtk_opencarp_helper_methods.vtk_methods.reader import smart_reader
 
 from Atrial_LDRBM.Generate_Boundaries.atrial_boundary_generator import AtrialBoundaryGenerator
 from Atrial_LDRBM.Generate_Boundaries.workflow_paths import WorkflowPaths
+from Atrial_LDRBM.scheduler import usable_cores, split_cores
+from Atrial_LDRBM.tracing import trace, traced_run
 
 EXAMPLE_DESCRIPTIVE_NAME = 'AugmentA: Patient-specific Augmented Atrial model Generation Tool'
 EXAMPLE_AUTHOR = 'Luca Azzolin <luca.azzolin@kit.edu>'
@@ -67,10 +72,8 @@ RAA_APEX_ID_FOR_SSM = 21685
 
 pv.set_plot_theme('dark')
 
-# Determine number of CPU cores for parallel processing
-n_cpu = os.cpu_count()
-if n_cpu is not None and n_cpu % 2 == 0:
-    n_cpu = int(n_cpu / 2)
+# Core budget of a run, passed as --np to the fiber scripts which choose the processes of every solve within it
+n_cpu = usable_cores()
 
 
 # --- Helper Functions ---
@@ -125,6 +128,55 @@ def _load_apex_ids_from_file(filepath: str) -> Dict[str, int]:
         raise RuntimeError(f"Error parsing apex file {filepath}: {e}")
 
 
+def _save_apex_ids_to_file(filepath: str, apex_ids: Dict[str, int]) -> None:
+    """
+    Writes appendage apex IDs in the format read by _load_apex_ids_from_file.
+    :param filepath: Path of the CSV file to write
+    :param apex_ids: Dictionary mapping atrium names ('LAA', 'RAA') to integer IDs
+    :return: None
+    """
+    df = pd.DataFrame({"atrium": list(apex_ids.keys()), "id": [int(v) for v in apex_ids.values()]})
+    df.to_csv(filepath, index=False)
+
+
+def _pick_apex_ids(mesh_path: str, atrium: str) -> Dict[str, int]:
+    """
+    Lets the user pick the appendage apex (and the RA appendage apex for LA_RA) on a mesh.
+    :param mesh_path: Path of the mesh to pick on
+    :param atrium: 'LA', 'RA' or 'LA_RA'
+    :return: A dictionary mapping atrium names ('LAA', 'RAA') to the point IDs closest to the picked points.
+    """
+    if atrium not in ("LA", "RA", "LA_RA"):
+        raise ValueError(f"Unknown atrium value '{atrium}'. Aborting...")
+
+    polydata = apply_vtk_geom_filter(smart_reader(mesh_path))
+    if polydata is None:
+        raise FileNotFoundError(f"Could not read mesh: {mesh_path}")
+    if polydata.GetNumberOfPoints() == 0:
+        raise ValueError(f"Mesh is empty (no points): {mesh_path}")
+
+    pv_mesh = pv.PolyData(polydata)
+    # Ensure points are double for cKDTree
+    tree = cKDTree(pv_mesh.points.astype(np.double))
+
+    initial_apex = pick_point(pv_mesh, "appendage apex")
+    if initial_apex is None:
+        raise RuntimeError("Initial 'appendage apex' picking cancelled or failed")
+
+    _, initial_apex_id = tree.query(initial_apex)
+    print(f"Initial 'appendage apex' picked: ID={initial_apex_id}")
+
+    if atrium == "RA":
+        return {"RAA": int(initial_apex_id)}
+
+    apex_ids = {"LAA": int(initial_apex_id)}
+    if atrium == "LA_RA":
+        raa_apex = pick_point_with_preselection(pv_mesh, "RA appendage apex", initial_apex)
+        _, raa_apex_id = tree.query(raa_apex)
+        apex_ids["RAA"] = int(raa_apex_id)
+    return apex_ids
+
+
 def _save_apex_ids(csv_base: str, ids: Dict[str, int]) -> None:
     """
     Saves apex IDs to '<csv_base>_mesh_data.csv'.
@@ -133,7 +185,10 @@ def _save_apex_ids(csv_base: str, ids: Dict[str, int]) -> None:
     :return: None
     """
     df = pd.DataFrame(ids)
-    df.to_csv(f"{csv_base}_mesh_data.csv", float_format="%.2f", index=False)
+    # the LA and RA runs of a biatrial mesh write this file concurrently, replace it in one step
+    tmp_path = f"{csv_base}_mesh_data.csv.{os.getpid()}.tmp"
+    df.to_csv(tmp_path, float_format="%.2f", index=False)
+    os.replace(tmp_path, f"{csv_base}_mesh_data.csv")
 
 
 def _ensure_obj_available(base_path_no_ext: str, original_extension: str = ".vtk") -> str:
@@ -177,6 +232,41 @@ def _ensure_obj_available(base_path_no_ext: str, original_extension: str = ".vtk
     )
 
 
+def _run_stage(paths: WorkflowPaths, args: Any, stage_name: str, run: Callable[[], Optional[Dict[str, Any]]],
+               inputs: Iterable = (), params: Optional[Dict[str, Any]] = None,
+               outputs: Optional[Callable[[], Iterable]] = None) -> Dict[str, Any]:
+    """
+    Runs a pipeline stage and records it in the workflow manifest. With --resume, the stages before the first one whose
+    inputs or parameters changed since its recorded run, or whose outputs are gone, are skipped.
+
+    :param paths: WorkflowPaths holding the stage table
+    :param args: Command-line arguments, --resume enables skipping
+    :param stage_name: Name of the stage in the manifest
+    :param run: Runs the stage, may return a dictionary of JSON results needed by later stages
+    :param inputs: Files and directories the stage reads
+    :param params: JSON parameters the stage output depends on
+    :param outputs: Returns the files and directories the stage wrote, called after run
+    :return: Results of the stage, recorded ones if it was skipped
+    """
+    inputs = list(inputs)
+    if getattr(args, 'resume', 0) and paths.stage_is_current(stage_name, inputs, params):
+        print(f"INFO: Resuming: stage '{stage_name}' is up to date, skipping it.")
+        return paths.resume_stage(stage_name)
+
+    input_digests = paths.input_digests(inputs)
+    with trace(stage_name):
+        results = run() or {}
+    paths.record_stage(stage_name, input_digests=input_digests, outputs=outputs() if outputs else (), params=params,
+                       results=results)
+    return results
+
+
+def _run_meshtool(cmd: str) -> None:
+    """Runs a meshtool command line, traced as a stage of its own."""
+    with trace(f"meshtool {cmd.split()[1]}"):
+        os.system(cmd)
+
+
 def _setup(args) -> Tuple[WorkflowPaths, AtrialBoundaryGenerator]:
     """Initializes and returns the path and boundary generator objects."""
     paths = WorkflowPaths(initial_mesh_path=args.mesh, atrium=args.atrium)
@@ -237,10 +327,18 @@ def _prepare_surface(paths: WorkflowPaths, generator: AtrialBoundaryGenerator, a
     elif not args.apex_file:  # Otherwise, perform closed-surface or orifice logic
         if args.closed_surface:
             generator.load_element_tags(csv_filepath=args.tag_csv)
-            generator.separate_epi_endo(tagged_volume_mesh_path=str(paths.initial_mesh), atrium=args.atrium)
 
-            # After this stage, the "active" mesh for subsequent steps is the epi mesh.
-            paths._update_stage('epi_separated', base_path=str(paths.closed_surface_epi_mesh))
+            def separate():
+                generator.separate_epi_endo(tagged_volume_mesh_path=str(paths.initial_mesh), atrium=args.atrium)
+
+                # After this stage, the "active" mesh for subsequent steps is the epi mesh.
+                paths._update_stage('epi_separated', base_path=str(paths.closed_surface_epi_mesh))
+
+            wall_base = paths.initial_mesh_base.with_name(f"{paths.initial_mesh_base.name}_{args.atrium}")
+            _run_stage(paths, args, 'epi_separated', separate,
+                       inputs=[paths.initial_mesh, args.tag_csv],
+                       params={'atrium': args.atrium},
+                       outputs=lambda: [Path(f"{wall_base}{suffix}.vtk") for suffix in ("", "_epi", "_endo")])
 
         else:
             if open_orifices_manually is None or open_orifices_with_curvature is None:
@@ -249,30 +347,37 @@ def _prepare_surface(paths: WorkflowPaths, generator: AtrialBoundaryGenerator, a
             if args.open_orifices:
                 # Pick which opening function to use
                 orifice_func = open_orifices_with_curvature if args.use_curvature_to_open else open_orifices_manually
-                print(f"Calling {orifice_func.__name__} for mesh='{args.mesh}', atrium='{args.atrium}'...")
-
-                # cut_path: path to the final cut and cleaned mesh
-                cut_path, apex_id = orifice_func(meshpath=str(paths.initial_mesh),
-                                                 atrium=args.atrium,
-                                                 MRI=args.MRI,
-                                                 scale=args.scale,
-                                                 min_cutting_radius=getattr(args, 'min_cutting_radius', 7.5),
-                                                 max_cutting_radius=getattr(args, 'max_cutting_radius', 17.5),
-                                                 debug=args.debug)
-
-                if cut_path is None or not Path(cut_path).exists():
-                    raise FileNotFoundError(f"{orifice_func.__name__} failed: Invalid cut_path")
-                if apex_id is None or apex_id < 0:
-                    raise ValueError(f"{orifice_func.__name__} failed: Invalid apex_id")
-                print(f"Mesh after orifice cutting: {cut_path}\nApex ID picked: {apex_id}")
+                cutting_params = {'atrium': args.atrium, 'MRI': args.MRI, 'scale': args.scale,
+                                  'min_cutting_radius': getattr(args, 'min_cutting_radius', 7.5),
+                                  'max_cutting_radius': getattr(args, 'max_cutting_radius', 17.5)}
+
+                def cut():
+                    print(f"Calling {orifice_func.__name__} for mesh='{args.mesh}', atrium='{args.atrium}'...")
+
+                    # cut_path: path to the final cut and cleaned mesh
+                    cut_path, apex_id = orifice_func(meshpath=str(paths.initial_mesh), debug=args.debug,
+                                                     **cutting_params)
+
+                    if cut_path is None or not Path(cut_path).exists():
+                        raise FileNotFoundError(f"{orifice_func.__name__} failed: Invalid cut_path")
+                    if apex_id is None or apex_id < 0:
+                        raise ValueError(f"{orifice_func.__name__} failed: Invalid apex_id")
+                    print(f"Mesh after orifice cutting: {cut_path}\nApex ID picked: {apex_id}")
+
+                    # Register the 'cut' stage as complete. The `paths` object now knows the active mesh is the one
+                    # that was just created.
+                    paths._update_stage('cut', base_path=str(Path(cut_path).with_suffix('')))
+                    return {'cut_path': str(cut_path), 'apex_id': int(apex_id)}
+
+                cut_results = _run_stage(paths, args, 'cut', cut,
+                                         inputs=[paths.initial_mesh],
+                                         params=dict(cutting_params, function=orifice_func.__name__),
+                                         outputs=lambda: [paths.active_mesh_base.with_suffix('.vtk')])
+                apex_id = cut_results['apex_id']
 
                 # Carrying the apex_id for resampling
                 apex_id_for_resampling = apex_id
 
-                # Register the 'cut' stage as complete. The `paths` object now knows the active mesh is the one that was
-                # just created.
-                paths._update_stage('cut', base_path=str(Path(cut_path).with_suffix('')))
-
                 if args.atrium == "LA":
                     generator.la_apex = apex_id
                     print(f"Updating generator.la_apex from {generator.la_apex} to {apex_id}.")
@@ -295,45 +400,12 @@ def _prepare_surface(paths: WorkflowPaths, generator: AtrialBoundaryGenerator, a
                 print("No apex file provided. Starting interactive point picking...")
 
                 if args.find_appendage and not args.resample_input:
-                    polydata = apply_vtk_geom_filter(smart_reader(str(paths.initial_mesh)))
-                    if polydata is None:
-                        raise FileNotFoundError(f"Could not read mesh: {paths.initial_mesh}")
-                    if polydata.GetNumberOfPoints() == 0:
-                        raise ValueError(f"Mesh is empty (no points): {paths.initial_mesh}")
-
-                    pv_mesh = pv.PolyData(polydata)
-                    # Ensure points are double for cKDTree
-                    points_for_tree = pv_mesh.points.astype(np.double)
-                    tree = cKDTree(points_for_tree)
-
-                    picked_apex_data_for_csv: Dict[str, Any] = {}
-                    initial_apex = pick_point(pv_mesh, "appendage apex")
-                    if initial_apex is None:
-                        raise RuntimeError("Initial 'appendage apex' picking cancelled or failed")
-
-                    _, initial_apex_id = tree.query(initial_apex)
-                    print(f"Initial 'appendage apex' picked: ID={initial_apex_id}")
-
-                    if args.atrium == "LA":
-                        generator.la_apex = initial_apex_id
-                        picked_apex_data_for_csv["LAA_id"] = [initial_apex_id]
-                    elif args.atrium == "RA":
-                        generator.ra_apex = initial_apex_id
-                        picked_apex_data_for_csv["RAA_id"] = [initial_apex_id]
-                    elif args.atrium == "LA_RA":
-                        generator.la_apex = initial_apex_id
-                        picked_apex_data_for_csv["LAA_id"] = [initial_apex_id]
-                        raa_apex = pick_point_with_preselection(pv_mesh, "RA appendage apex", initial_apex)
-
-                        pv_mesh = pv.PolyData(polydata)
-                        points_for_tree = pv_mesh.points.astype(np.double)
-                        tree = cKDTree(points_for_tree)
-                        _, raa_apex_id = tree.query(raa_apex)
-                        generator.ra_apex = raa_apex_id
-                        picked_apex_data_for_csv["RAA_id"] = [raa_apex_id]
-
-                    else:
-                        raise ValueError(f"Unknown atrium value '{args.atrium}'. Aborting...")
+                    apex_ids = _pick_apex_ids(str(paths.initial_mesh), args.atrium)
+                    if "LAA" in apex_ids:
+                        generator.la_apex = apex_ids["LAA"]
+                    if "RAA" in apex_ids:
+                        generator.ra_apex = apex_ids["RAA"]
+                    picked_apex_data_for_csv = {f"{key}_id": [value] for key, value in apex_ids.items()}
 
                     _save_apex_ids(str(paths.initial_mesh_base), picked_apex_data_for_csv)
                     print(f"Apex IDs saved to {paths.initial_mesh_base}_mesh_data.csv")
@@ -565,12 +637,13 @@ def _run_ssm_fitting(paths: WorkflowPaths, generator: AtrialBoundaryGenerator, a
     _run_final_labeling_and_fibers_for_ssm(args, paths, generator, n_cpu)
 
 
-def _resample_mesh_if_needed(args: Any, paths: WorkflowPaths):
+def _resample_mesh_if_needed(args: Any, paths: WorkflowPaths, apex_id: int = -1):
     """
     If requested, resamples the mesh and updates the pipeline path.
 
     :param args: Workflow arguments containing resample flags and parameters
     :param paths: WorkflowPaths object tracking mesh file paths
+    :param apex_id: Apex ID on the active mesh, -1 to pick it on the resampled mesh
     :return: None
     """
     if not (args.resample_input and args.find_appendage):
@@ -584,25 +657,89 @@ def _resample_mesh_if_needed(args: Any, paths: WorkflowPaths):
     source_ext = mesh_base.suffix or paths.initial_mesh_ext
     _ensure_obj_available(str(mesh_base), original_extension=source_ext)
 
-    # Perform the resampling operation
-    try:
-        resample_surf_mesh(meshname=str(paths.active_mesh_base),
-                           target_mesh_resolution=args.target_mesh_resolution,
-                           find_apex_with_curv=0,
-                           scale=args.scale,
-                           apex_id=-1,
-                           atrium=args.atrium)
-    except Exception as e:
-        raise RuntimeError(f"Mesh resampling failed for '{paths.active_mesh_base}': {e}")
-
-    try:
-        paths._update_stage(stage_name='resampled', base_path=str(paths.resampled_mesh))
-    except Exception as e:
-        raise RuntimeError(f"Failed to update workflow path after resampling: {e}")
+    def resample():
+        # Perform the resampling operation
+        try:
+            resample_surf_mesh(meshname=str(paths.active_mesh_base),
+                               target_mesh_resolution=args.target_mesh_resolution,
+                               find_apex_with_curv=0,
+                               scale=args.scale,
+                               apex_id=apex_id,
+                               atrium=args.atrium)
+        except Exception as e:
+            raise RuntimeError(f"Mesh resampling failed for '{paths.active_mesh_base}': {e}")
+
+        try:
+            paths._update_stage(stage_name='resampled', base_path=str(paths.resampled_mesh))
+        except Exception as e:
+            raise RuntimeError(f"Failed to update workflow path after resampling: {e}")
+
+    _run_stage(paths, args, 'resampled', resample,
+               inputs=[mesh_base.with_suffix('.obj')],
+               params={'target_mesh_resolution': args.target_mesh_resolution, 'scale': args.scale,
+                       'apex_id': apex_id, 'atrium': args.atrium},
+               outputs=lambda: [paths.active_mesh_base.with_suffix('.ply'), paths.mesh_data_csv])
 
     print(f'INFO: Resampling complete. Active mesh is now: {paths.active_mesh_base.name}')
 
 
+def _mesh_files(mesh_path: str) -> list:
+    """The file of a mesh path, or all files of a mesh base path given without extension."""
+    path = Path(mesh_path)
+    return [path] if path.is_file() else sorted(path.parent.glob(f"{path.name}.*"))
+
+
+def _extract_rings_stage(paths: WorkflowPaths, args: Any, generator: AtrialBoundaryGenerator, surface_mesh_path: str,
+                         top_epi_endo: bool = False) -> None:
+    """
+    Extracts the rings of a surface into the surf directory of the active mesh as resumable stage.
+    """
+    extract = generator.extract_rings_top_epi_endo if top_epi_endo else generator.extract_rings
+    _run_stage(paths, args, 'rings',
+               lambda: extract(surface_mesh_path=surface_mesh_path, output_dir=str(paths.surf_dir)),
+               inputs=_mesh_files(surface_mesh_path),
+               params={'la_apex': None if generator.la_apex is None else int(generator.la_apex),
+                       'ra_apex': None if generator.ra_apex is None else int(generator.ra_apex),
+                       'top_epi_endo': top_epi_endo},
+               outputs=lambda: [paths.surf_dir])
+
+
+def _generate_volumetric_stage(paths: WorkflowPaths, args: Any, generator: AtrialBoundaryGenerator,
+                               resampled: bool) -> None:
+    """
+    Generates the volumetric mesh of the combined wall and its surface IDs as resumable stage. The volumetric mesh
+    becomes the active mesh.
+    """
+    combined_wall_path = paths.initial_mesh_base.with_name(f"{paths.initial_mesh_base.name}_{args.atrium}.vtk")
+
+    def generate():
+        generator.generate_mesh(input_surface_path=str(combined_wall_path))
+
+        volumetric_mesh_path_vtk = str(paths.closed_surface_vol_mesh.with_suffix('.vtk'))  # Output of generate_mesh
+        print(f"INFO: Surface ID generation for {args.atrium} volumetric mesh: {volumetric_mesh_path_vtk}")
+        generator.generate_surf_id(volumetric_mesh_path=volumetric_mesh_path_vtk, atrium=args.atrium,
+                                   resampled=resampled)
+
+        # The active mesh for fiber generation is now the volumetric one.
+        paths._update_stage(stage_name='volumetric', base_path=str(paths.closed_surface_vol_mesh))
+
+    _run_stage(paths, args, 'volumetric', generate,
+               inputs=[combined_wall_path],
+               params={'atrium': args.atrium, 'resampled': int(resampled)},
+               outputs=lambda: [paths.closed_surface_vol_mesh.with_suffix('.vtk'), paths.surf_dir])
+
+
+def _run_fiber_stage(paths: WorkflowPaths, args: Any, fiber_main: Any, atrium: str, argv: list) -> None:
+    """
+    Runs la_main or ra_main on the active mesh as resumable stage writing result_<atrium> of its fiber directory.
+    """
+    # the number of processes does not change the result
+    params_argv = [arg for i, arg in enumerate(argv) if arg != "--np" and (i == 0 or argv[i - 1] != "--np")]
+    _run_stage(paths, args, f'{atrium}_fibers', lambda: fiber_main.run(argv),
+               params={'argv': params_argv},
+               outputs=lambda: [paths.fiber_base_dir / f"result_{atrium}"])
+
+
 def _update_generator_with_apex_ids(paths: WorkflowPaths, generator: AtrialBoundaryGenerator) -> None:
     """
     Load the correct apex IDs for the active mesh and set them on the generator.
@@ -640,7 +777,7 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
         if args.atrium == "LA_RA":
             try:
                 # Ring extraction for combined LA and RA
-                generator.extract_rings(surface_mesh_path=path_for_labeling_obj, output_dir=str(paths.surf_dir))
+                _extract_rings_stage(paths, args, generator, path_for_labeling_obj)
                 print(f"INFO: Ring extraction for LA_RA on {path_for_labeling_obj} complete.")
             except FileNotFoundError as e:
                 raise FileNotFoundError(
@@ -653,7 +790,8 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
             # Run fiber generation for both atria
             print(f"INFO: Running LA fibers for LA_RA on mesh: {str(paths.active_mesh_base)}")
             args.atrium = "LA"
-            la_main.run(
+            _run_fiber_stage(
+                paths, args, la_main, "LA",
                 ["--mesh", str(paths.active_mesh_base),
                  "--np", str(n_cpu),
                  "--normals_outside", str(args.normals_outside),
@@ -665,7 +803,8 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
 
             print(f"INFO: Running RA fibers for LA_RA on mesh: {str(paths.active_mesh_base)}")
             args.atrium = "RA"
-            ra_main.run(
+            _run_fiber_stage(
+                paths, args, ra_main, "RA",
                 ["--mesh", str(paths.active_mesh_base),
                  "--np", str(n_cpu),
                  "--normals_outside", str(args.normals_outside),
@@ -693,16 +832,15 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
                     f"-omsh={output_mesh_carp_txt_um} "
                     f"-ofmt=vtk")
 
-            os.system(cmd1)
-            os.system(cmd2)
+            _run_meshtool(cmd1)
+            _run_meshtool(cmd2)
 
         elif args.atrium == "LA":
             print(f"INFO: LA path (non-SSM). Labeling and preparing fibers for: {path_for_labeling_obj}")
             print(f"INFO: Using LAA: {generator.la_apex} for labeling.")
 
             try:
-                generator.extract_rings(surface_mesh_path=path_for_labeling_obj,
-                                        output_dir=str(paths.surf_dir))
+                _extract_rings_stage(paths, args, generator, path_for_labeling_obj)
                 print(f"INFO: Ring extraction for LA_RA on {path_for_labeling_obj} complete.")
             except FileNotFoundError as e:
                 raise FileNotFoundError(
@@ -714,22 +852,7 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
 
             if args.closed_surface:
                 # Generate volumetric mesh from combined wall
-                combined_wall_path = paths.initial_mesh_base.with_name(
-                    f"{paths.initial_mesh_base.name}_{args.atrium}.vtk")
-                generator.generate_mesh(input_surface_path=str(combined_wall_path))
-
-                volumetric_mesh_path_vtk = str(
-                    paths.closed_surface_vol_mesh.with_suffix('.vtk'))  # Output of generate_mesh
-
-                print(f"INFO: Surface ID generation for LA volumetric mesh: {volumetric_mesh_path_vtk}")
-                generator.generate_surf_id(
-                    volumetric_mesh_path=volumetric_mesh_path_vtk,
-                    atrium=args.atrium,
-                    resampled=args.resample_input
-                )
-
-                # The active mesh for fiber generation is now the volumetric one.
-                paths._update_stage(stage_name='volumetric', base_path=str(paths.closed_surface_vol_mesh))
+                _generate_volumetric_stage(paths, args, generator, resampled=bool(args.resample_input))
 
                 # This logic for mapping IDs from a resampled surf dir to the new vol surf dir is preserved.
                 resampled_suffix_for_map = "_res" if args.resample_input else ""
@@ -737,7 +860,8 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
                     f"{paths.closed_surface_epi_mesh.name}{resampled_suffix_for_map}_surf")
                 new_surf_dir = paths.surf_dir  # The surf_dir for the volumetric mesh
 
-                la_main.run(
+                _run_fiber_stage(
+                    paths, args, la_main, "LA",
                     ["--mesh", str(paths.active_mesh_base),
                      "--np", str(n_cpu),
                      "--normals_outside", str(0),
@@ -749,7 +873,8 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
                 )
 
             else:
-                la_main.run(
+                _run_fiber_stage(
+                    paths, args, la_main, "LA",
                     ["--mesh", str(paths.active_mesh_base),
                      "--np", str(n_cpu),
                      "--normals_outside", str(args.normals_outside),
@@ -776,39 +901,22 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
                            f"-omsh={output_mesh_carp_txt_um_LA} "
                            f"-ofmt=vtk")
 
-                os.system(cmd1_la)
-                os.system(cmd2_la)
+                _run_meshtool(cmd1_la)
+                _run_meshtool(cmd2_la)
 
         elif args.atrium == "RA":
             try:
-                if args.closed_surface:
-                    generator.extract_rings_top_epi_endo(
-                        surface_mesh_path=str(paths.active_mesh_base),
-                        output_dir=str(paths.surf_dir)
-                    )
-                else:
-                    generator.extract_rings(
-                        surface_mesh_path=str(paths.active_mesh_base),
-                        output_dir=str(paths.surf_dir)
-                    )
+                _extract_rings_stage(paths, args, generator, str(paths.active_mesh_base),
+                                     top_epi_endo=bool(args.closed_surface))
             except Exception as e:
                 raise RuntimeError(f"RA ring extraction failed: {e}") from e
 
             if args.closed_surface:
-                combined_wall_path = paths.initial_mesh_base.with_name(
-                    f"{paths.initial_mesh_base.name}_{args.atrium}.vtk")
-                generator.generate_mesh(input_surface_path=str(combined_wall_path))
-
-                volumetric_mesh_path_vtk = str(paths.closed_surface_vol_mesh.with_suffix('.vtk'))
-                generator.generate_surf_id(
-                    volumetric_mesh_path=volumetric_mesh_path_vtk,
-                    atrium=args.atrium,
-                    resampled=False  # `resampled` is always False for RA in original code
-                )
+                # `resampled` is always False for RA in original code
+                _generate_volumetric_stage(paths, args, generator, resampled=False)
 
-                paths._update_stage(stage_name='volumetric', base_path=str(paths.closed_surface_vol_mesh))
-
-                ra_main.run(
+                _run_fiber_stage(
+                    paths, args, ra_main, "RA",
                     ["--mesh", str(paths.active_mesh_base),
                      "--np", str(n_cpu),
                      "--normals_outside", "0",
@@ -818,7 +926,8 @@ def _execute_labeling_and_fiber_generation(args: Any, paths: WorkflowPaths, gene
                      "--overwrite-behaviour", "append"]
                 )
             else:  # RA, not closed_surface
-                ra_main.run(
+                _run_fiber_stage(
+                    paths, args, ra_main, "RA",
                     ["--mesh", str(paths.active_mesh_base),
                      "--np", str(n_cpu),
                      "--normals_outside", str(args.normals_outside),
@@ -844,8 +953,9 @@ def _run_fiber_generation(paths: WorkflowPaths, generator: AtrialBoundaryGenerat
     :param n_cpu: Number of CPU cores to use for parallel fiber generation
     :return: None
     """
-    # Step 1: Resample the surface if requested by the user.
-    _resample_mesh_if_needed(args, paths)
+    # Step 1: Resample the surface if requested by the user, reusing an apex that is already known.
+    known_apex = generator.ra_apex if args.atrium == "RA" else generator.la_apex
+    _resample_mesh_if_needed(args, paths, apex_id=-1 if known_apex is None else int(known_apex))
 
     # Step 2: Load the apex IDs for the current mesh (which may have been resampled).
     _update_generator_with_apex_ids(paths, generator)
@@ -942,31 +1052,91 @@ def _plot_debug_results(paths: WorkflowPaths, args) -> None:
         print(f"ERROR during debug plotting: {e}")
 
 
-def AugmentA(args):
-    try:
-        print("\n--- Initializing Pipeline ---")
-        paths, generator = _setup(args)
-        paths.log_current_stage()
-
-        print("\n--- Preparing Surface ---")
-        apex_id = _prepare_surface(paths=paths, generator=generator, args=args)
-        paths.log_current_stage()
+def AugmentA(args, n_cores: int = n_cpu):
+    """
+    Runs the whole pipeline for one mesh and atrium, exits on failure.
 
-        if args.SSM_fitting and not args.closed_surface:
-            print("\n--- Running SSM Fitting ---")
-            _run_ssm_fitting(paths=paths, generator=generator, args=args, apex_id_for_resampling=apex_id)
+    :param args: Command-line arguments
+    :param n_cores: Number of CPU cores passed as --np to the fiber scripts
+    """
+    # the profile of the run is written next to its workflow manifest
+    profile_base = f"{os.path.splitext(os.path.abspath(args.mesh))[0]}_{args.atrium}"
+    try:
+        with traced_run("AugmentA", profile_base, mesh=args.mesh, atrium=args.atrium):
+            print("\n--- Initializing Pipeline ---")
+            with trace("_setup"):
+                paths, generator = _setup(args)
             paths.log_current_stage()
-        elif not args.SSM_fitting:
-            print("\n--- Running Fiber Generation ---")
-            _run_fiber_generation(paths, generator, args, n_cpu)
+
+            print("\n--- Preparing Surface ---")
+            with trace("_prepare_surface"):
+                apex_id = _prepare_surface(paths=paths, generator=generator, args=args)
             paths.log_current_stage()
 
-        if args.debug:
-            print("\n--- Plotting Debug Results ---")
-            _plot_debug_results(paths, args)
+            if args.SSM_fitting and not args.closed_surface:
+                print("\n--- Running SSM Fitting ---")
+                with trace("_run_ssm_fitting"):
+                    _run_ssm_fitting(paths=paths, generator=generator, args=args, apex_id_for_resampling=apex_id,
+                                     n_cpu=n_cores)
+                paths.log_current_stage()
+            elif not args.SSM_fitting:
+                print("\n--- Running Fiber Generation ---")
+                with trace("_run_fiber_generation"):
+                    _run_fiber_generation(paths, generator, args, n_cores)
+                paths.log_current_stage()
 
-        print("\n--- Pipeline Finished ---")
+            if args.debug:
+                print("\n--- Plotting Debug Results ---")
+                _plot_debug_results(paths, args)
+
+            print("\n--- Pipeline Finished ---")
 
     except Exception as e:
         print(f"\nFATAL ERROR: Pipeline failed — {e}", file=sys.stderr)
         sys.exit(1)
+
+
+def _run_atrium(args, atrium: str, n_cores: int) -> bool:
+    """
+    Runs AugmentA for one atrium of a biatrial mesh on a copy of the arguments.
+
+    :return: Whether the run succeeded, AugmentA's exit on failure is reported instead
+    """
+    args = copy.copy(args)
+    args.atrium = atrium
+    try:
+        AugmentA(args, n_cores)
+    except SystemExit as e:
+        return e.code in (None, 0)
+    return True
+
+
+def run_pipeline(args, n_cores: int = n_cpu):
+    """
+    Runs AugmentA for one mesh. Closed biatrial surfaces are annotated as LA and as RA separately. The two runs share
+    no files, so they run side by side with half of the cores each, unless the user has to pick the appendage apexes
+    during resampling.
+
+    :param args: Command-line arguments
+    :param n_cores: Core budget of the mesh
+    """
+    if args.atrium == 'LA_RA' and args.closed_surface:
+        print("Current no support for biatrial volumetric bridge generation. Annotating LA and RA separately")
+        if args.resample_input and args.find_appendage and not args.apex_file:
+            args.atrium = 'LA'
+            AugmentA(args, n_cores)
+            args.atrium = 'RA'
+            AugmentA(args, n_cores)
+            return
+
+        n_cores = split_cores(n_cores, 2)
+        print(f"INFO: Annotating LA and RA concurrently with {n_cores} cores each")
+        # spawn the runs so that they do not inherit render windows or VTK state of this process
+        with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context("spawn")) as executor:
+            runs = {atrium: executor.submit(_run_atrium, args, atrium, n_cores) for atrium in ('LA', 'RA')}
+            failed = [atrium for atrium, run in runs.items() if not run.result()]
+        if failed:
+            print(f"\nFATAL ERROR: Pipeline failed for {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        AugmentA(args, n_cores)
@@ -29,6 +29,7 @@ import numpy as np
 import scipy.spatial as spatial
 import vtk
 
+from Atrial_LDRBM.mesh_topology import get_geodesic_paths
 from vtk_opencarp_helper_methods.mathematical_operations.vector_operations import get_normalized_cross_product
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filter, clean_polydata, \
@@ -143,15 +144,8 @@ def cut_into_two_parts(polydata, point_1, point_2, point_3):
 
 
 def dijkstra_path(polydata, start_vertex, end_vertex):
-    path = vtk.vtkDijkstraGraphGeodesicPath()
-    path.SetInputData(polydata)
-    # attention the return value will be reversed
-    path.SetStartVertex(end_vertex)
-    path.SetEndVertex(start_vertex)
-    path.Update()
-    points_data = path.GetOutput().GetPoints().GetData()
-    points_data = vtk_to_numpy(points_data)
-    return points_data
+    # the edge graph is cached per surface, so repeated paths on the same surface only run the search
+    return get_geodesic_paths(polydata).path(start_vertex, end_vertex)
 
 
 def get_mv_l_and_r(mv_band, center_lpv):
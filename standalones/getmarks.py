@@ -32,6 +32,7 @@ import pandas as pd
 import vtk
 
 import standalones.function as function
+from Atrial_LDRBM.mesh_topology import get_geodesic_paths
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.thresholding import get_threshold_between
@@ -200,10 +201,9 @@ def get_landmarks(mesh, prealigned=1, scale=1):
     #
     p1_id = function.get_closest_point_id_from_polydata(model_polydata, p1)
     roof_50_id = function.get_closest_point_id_from_polydata(model_polydata, roof_50)
-    p1_roof_path = function.dijkstra_path(model_polydata, roof_50_id, p1_id)
-
     p2_id = function.get_closest_point_id_from_polydata(model_polydata, p2)
-    p2_roof_path = function.dijkstra_path(model_polydata, roof_50_id, p2_id)
+    # both paths start at roof_50, one search serves both
+    p1_roof_path, p2_roof_path = get_geodesic_paths(model_polydata).paths_from(roof_50_id, [p1_id, p2_id])
 
     #
     mv_an_middle_id = function.get_closest_point_id_from_polydata(model_polydata, mv_an_middle)
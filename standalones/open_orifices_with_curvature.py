@@ -46,7 +46,6 @@ from vtk_opencarp_helper_methods.vtk_methods.filters import apply_vtk_geom_filte
 from vtk_opencarp_helper_methods.vtk_methods.finder import find_closest_point
 from vtk_opencarp_helper_methods.vtk_methods.helper_methods import get_maximum_distance_of_points, cut_mesh_with_radius, \
     cut_elements_from_mesh, find_elements_within_radius
-from vtk_opencarp_helper_methods.vtk_methods.init_objects import init_connectivity_filter, ExtractionModes
 from vtk_opencarp_helper_methods.vtk_methods.mapper import point_array_mapper
 from vtk_opencarp_helper_methods.vtk_methods.reader import smart_reader
 
@@ -54,6 +53,7 @@ pv.set_plot_theme('dark')
 
 sys.path.append('./Atrial_LDRBM/Generate_Boundaries')
 from Atrial_LDRBM.Generate_Boundaries.extract_rings import label_atrial_orifices
+from Atrial_LDRBM.mesh_topology import ConnectedRegions
 
 vtk_version = vtk.vtkVersion.GetVTKSourceVersion().split()[-1].split('.')[0]
 
@@ -195,16 +195,16 @@ def open_orifices_with_curvature(meshpath, atrium, MRI, scale=1, size=30, min_cu
 
         pts_low_v = set(list(vtk_to_numpy(low_v.GetPointData().GetArray('Ids'))))
 
+        # regions of low voltage, split once and shared by all high curvature regions
+        low_v_regions = ConnectedRegions(low_v)
+
         high_v = vtk_thr(model, 0, "POINTS", "bi", 0.5001)
 
     high_c = vtk_thr(model, 0, "POINTS", "curv", np.median(curv) * 1.15)  # (np.min(curv)+np.max(curv))/2)
 
     vtk_unstructured_grid_writer(f"{full_path}/{atrium}_h_curv.vtk", high_c, True)
 
-    connect = init_connectivity_filter(high_c, ExtractionModes.ALL_REGIONS)
-    num = connect.GetNumberOfExtractedRegions()
-
-    connect = init_connectivity_filter(high_c, ExtractionModes.SPECIFIED_REGIONS)
+    high_c_regions = ConnectedRegions(high_c)
 
     rings = []
 
@@ -232,11 +232,7 @@ def open_orifices_with_curvature(meshpath, atrium, MRI, scale=1, size=30, min_cu
             transeptal_punture_id = vtk_to_numpy(model.GetPointData().GetArray('Ids'))[
                 find_closest_point(model, picked_point)]
 
-    for i in range(num):
-        connect.AddSpecifiedRegion(i)
-        connect.Update()
-        surface = connect.GetOutput()
-
+    for surface in high_c_regions:
         # Clean unused points
         surface = apply_vtk_geom_filter(surface)
         surface = clean_polydata(surface)
@@ -250,16 +246,7 @@ def open_orifices_with_curvature(meshpath, atrium, MRI, scale=1, size=30, min_cu
                     pt_max_curv = np.asarray(model.GetPoint(Gl_pt_id.index(pt_high_c[np.argmax(curv_s)])))
                     el_low_vol = set()
 
-                    connect2 = init_connectivity_filter(low_v, ExtractionModes.ALL_REGIONS)
-                    num2 = connect2.GetNumberOfExtractedRegions()
-
-                    connect2.SetExtractionModeToSpecifiedRegions()
-
-                    for ii in range(num2):
-                        connect2.AddSpecifiedRegion(ii)
-                        connect2.Update()
-                        surface2 = connect2.GetOutput()
-
+                    for surface2 in low_v_regions:
                         # Clean unused points
                         surface2 = apply_vtk_geom_filter(surface2)
                         surface2 = clean_polydata(surface2)
@@ -269,9 +256,6 @@ def open_orifices_with_curvature(meshpath, atrium, MRI, scale=1, size=30, min_cu
                             for el in vtk_to_numpy(surface2.GetCellData().GetArray('Ids')):
                                 el_low_vol.add(Gl_cell_id.index(el))
 
-                        connect2.DeleteSpecifiedRegion(ii)
-                        connect2.Update()
-
                     geo_port, _geo_filter = get_vtk_geom_filter_port(get_cells_with_ids(model, el_low_vol))
 
                     loc_low_V = clean_polydata(geo_port, input_is_connection=True)  # local low voltage area
@@ -295,9 +279,6 @@ def open_orifices_with_curvature(meshpath, atrium, MRI, scale=1, size=30, min_cu
                 for el in vtk_to_numpy(surface.GetCellData().GetArray('Ids')):
                     el_to_del_tot.add(Gl_cell_id.index(el))
 
-        connect.DeleteSpecifiedRegion(i)
-        connect.Update()
-
     model = cut_elements_from_mesh(model, el_to_del_tot)
 
     model = extract_largest_region(model)
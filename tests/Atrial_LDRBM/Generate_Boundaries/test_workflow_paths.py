@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.Generate_Boundaries.workflow_paths import WorkflowPaths
+
+
+class TestWorkflowPathsManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mesh = os.path.join(self.tmp_dir.name, "patient.vtk")
+        with open(self.mesh, "w") as f:
+            f.write("mesh")
+        self.cut_mesh = os.path.join(self.tmp_dir.name, "LA_cutted.vtk")
+        with open(self.cut_mesh, "w") as f:
+            f.write("cut")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def record_cut(self, paths):
+        digests = paths.input_digests([self.mesh])
+        paths._update_stage('cut', base_path=self.cut_mesh)
+        paths.record_stage('cut', input_digests=digests, outputs=[self.cut_mesh], params={'scale': 1},
+                           results={'apex_id': 42})
+
+    def test_stage_table_survives_a_new_run(self):
+        self.record_cut(WorkflowPaths(self.mesh, "LA"))
+
+        paths = WorkflowPaths(self.mesh, "LA")
+
+        self.assertTrue(paths.manifest_path.exists())
+        self.assertTrue(paths.stage_is_current('cut', [self.mesh], {'scale': 1}))
+        self.assertEqual(paths.resume_stage('cut'), {'apex_id': 42})
+        self.assertEqual(paths.active_mesh_base.name, "LA_cutted")
+
+    def test_changed_inputs_params_or_outputs_invalidate_the_stage(self):
+        self.record_cut(WorkflowPaths(self.mesh, "LA"))
+
+        self.assertFalse(WorkflowPaths(self.mesh, "LA").stage_is_current('cut', [self.mesh], {'scale': 10}))
+        self.assertFalse(WorkflowPaths(self.mesh, "RA").stage_is_current('cut', [self.mesh], {'scale': 1}))
+
+        with open(self.mesh, "w") as f:
+            f.write("edited mesh")
+        self.assertFalse(WorkflowPaths(self.mesh, "LA").stage_is_current('cut', [self.mesh], {'scale': 1}))
+
+        self.record_cut(WorkflowPaths(self.mesh, "LA"))
+        os.remove(self.cut_mesh)
+        self.assertFalse(WorkflowPaths(self.mesh, "LA").stage_is_current('cut', [self.mesh], {'scale': 1}))
+
+    def test_stages_after_a_rerun_stage_are_not_current(self):
+        paths = WorkflowPaths(self.mesh, "LA")
+        self.record_cut(paths)
+        paths.record_stage('rings', params={'la_apex': 42})
+
+        paths = WorkflowPaths(self.mesh, "LA")
+        self.assertTrue(paths.stage_is_current('rings', params={'la_apex': 42}))
+        self.record_cut(paths)
+        self.assertFalse(paths.stage_is_current('rings', params={'la_apex': 42}))
+
+
+if __name__ == "__main__":
+    unittest.main()
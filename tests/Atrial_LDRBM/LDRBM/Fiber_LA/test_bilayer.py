@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import assemble_bilayer
+
+
+def layer(radius, tag):
+    source = vtk.vtkSphereSource()
+    source.SetRadius(radius)
+    source.SetThetaResolution(12)
+    source.SetPhiResolution(12)
+    source.Update()
+    append = vtk.vtkAppendFilter()
+    append.AddInputData(source.GetOutput())
+    append.Update()
+    grid = append.GetOutput()
+
+    n_cells = grid.GetNumberOfCells()
+    for name, values in [("elemTag", np.full(n_cells, tag)), ("fiber", np.tile([0.0, 0.0, 1.0], (n_cells, 1))),
+                         ("sheet", np.tile([0.0, 1.0, 0.0], (n_cells, 1)))]:
+        array = numpy_to_vtk(values, deep=True)
+        array.SetName(name)
+        grid.GetCellData().AddArray(array)
+    return grid
+
+
+def appended_bilayer(endo, epi, endo_ids, epi_ids):
+    """Bilayer built the way generate_bilayer used to: a line grid appended with merged points."""
+    lines = vtk.vtkCellArray()
+    for i in range(len(endo_ids)):
+        lines.InsertNextCell(2, [i, len(endo_ids) + i])
+    points = np.vstack((vtk_to_numpy(endo.GetPoints().GetData())[endo_ids],
+                        vtk_to_numpy(epi.GetPoints().GetData())[epi_ids]))
+    grid = vtk.vtkUnstructuredGrid()
+    vtk_points = vtk.vtkPoints()
+    vtk_points.SetData(numpy_to_vtk(points, deep=True))
+    grid.SetPoints(vtk_points)
+    grid.SetCells(vtk.VTK_LINE, lines)
+    for name, values in [("elemTag", np.full(len(endo_ids), 100)),
+                         ("fiber", np.tile([1.0, 0.0, 0.0], (len(endo_ids), 1))),
+                         ("sheet", np.tile([0.0, 1.0, 0.0], (len(endo_ids), 1)))]:
+        array = numpy_to_vtk(values, deep=True)
+        array.SetName(name)
+        grid.GetCellData().AddArray(array)
+
+    append = vtk.vtkAppendFilter()
+    append.MergePointsOn()
+    for mesh in (endo, epi, grid):
+        append.AddInputData(mesh)
+    append.Update()
+    return append.GetOutput()
+
+
+class TestAssembleBilayer(unittest.TestCase):
+    def test_matches_append_with_merged_points(self):
+        endo, epi = layer(1.0, 1), layer(1.1, 2)
+        endo_ids = np.arange(0, endo.GetNumberOfPoints(), 2)
+        epi_ids = endo_ids[::-1]
+
+        bilayer = assemble_bilayer(endo, epi, endo_ids, epi_ids)
+        expected = appended_bilayer(endo, epi, endo_ids, epi_ids)
+
+        np.testing.assert_allclose(vtk_to_numpy(bilayer.GetPoints().GetData()),
+                                   vtk_to_numpy(expected.GetPoints().GetData()))
+        self.assertEqual(bilayer.GetNumberOfCells(), expected.GetNumberOfCells())
+        for i in range(expected.GetNumberOfCells()):
+            self.assertEqual(bilayer.GetCellType(i), expected.GetCellType(i))
+            expected_ids, ids = expected.GetCell(i).GetPointIds(), bilayer.GetCell(i).GetPointIds()
+            self.assertEqual([ids.GetId(j) for j in range(ids.GetNumberOfIds())],
+                             [expected_ids.GetId(j) for j in range(expected_ids.GetNumberOfIds())])
+        for name in ("elemTag", "fiber", "sheet"):
+            np.testing.assert_array_equal(vtk_to_numpy(bilayer.GetCellData().GetArray(name)),
+                                          vtk_to_numpy(expected.GetCellData().GetArray(name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_LA.Methods_LA import find_tau, threshold_region_counts
+
+
+def two_basin_plane(resolution=20):
+    """Triangulated unit plane with a cell field 'phie_v' growing with the distance to the nearer of two sources."""
+    plane = vtk.vtkPlaneSource()
+    plane.SetResolution(resolution, resolution)
+    triangles = vtk.vtkTriangleFilter()
+    triangles.SetInputConnection(plane.GetOutputPort())
+    append = vtk.vtkAppendFilter()
+    append.SetInputConnection(triangles.GetOutputPort())
+    append.Update()
+    grid = append.GetOutput()
+
+    centers = vtk.vtkCellCenters()
+    centers.SetInputData(grid)
+    centers.Update()
+    cell_centers = vtk_to_numpy(centers.GetOutput().GetPoints().GetData())[:, :2]
+    sources = np.array([[-0.3, 0.0], [0.3, 0.0]])
+    # the second basin is shallower, so that the lowest thresholds keep a single region
+    distance = (np.linalg.norm(cell_centers[:, None] - sources, axis=2) + [0.0, 0.1]).min(axis=1)
+    array = numpy_to_vtk(np.round(distance / distance.max(), 6), deep=True)
+    array.SetName("phie_v")
+    grid.GetCellData().AddArray(array)
+    return grid
+
+
+def vtk_region_count(mesh, low_up, value):
+    thresh = vtk.vtkThreshold()
+    thresh.SetInputData(mesh)
+    if low_up == "low":
+        thresh.SetThresholdFunction(vtk.vtkThreshold.THRESHOLD_LOWER)
+        thresh.SetLowerThreshold(value)
+    else:
+        thresh.SetThresholdFunction(vtk.vtkThreshold.THRESHOLD_UPPER)
+        thresh.SetUpperThreshold(value)
+    thresh.SetInputArrayToProcess(0, 0, 0, "vtkDataObject::FIELD_ASSOCIATION_CELLS", "phie_v")
+    thresh.Update()
+    connect = vtk.vtkConnectivityFilter()
+    connect.SetInputData(thresh.GetOutput())
+    connect.SetExtractionModeToAllRegions()
+    connect.Update()
+    return connect.GetNumberOfExtractedRegions()
+
+
+def expected_tau(thresholds, counts, fallback):
+    """Last threshold before the regions first merge again, scanning in the direction the kept cells grow."""
+    separated = False
+    for i, count in enumerate(counts):
+        if count > 1:
+            separated = True
+        elif separated:
+            return thresholds[i - 1]
+    return thresholds[-1] if separated else fallback
+
+
+class TestFindTau(unittest.TestCase):
+    def setUp(self):
+        self.mesh = two_basin_plane()
+        self.values = vtk_to_numpy(self.mesh.GetCellData().GetArray("phie_v")).astype(float)
+
+    def test_region_counts_match_vtk(self):
+        thresholds, counts = threshold_region_counts(self.mesh, self.values)
+
+        np.testing.assert_array_equal(thresholds, np.unique(self.values))
+        self.assertEqual(counts.tolist(), [vtk_region_count(self.mesh, "low", t) for t in thresholds])
+        self.assertGreater(counts.max(), 1)
+
+    def test_find_tau_matches_vtk(self):
+        # an upper threshold of the flipped field has the same two basins
+        flipped = vtk.vtkUnstructuredGrid()
+        flipped.DeepCopy(self.mesh)
+        array = numpy_to_vtk(1.0 - self.values, deep=True)
+        array.SetName("phie_v")
+        flipped.GetCellData().AddArray(array)
+
+        for mesh, low_up in [(self.mesh, "low"), (flipped, "up")]:
+            values = vtk_to_numpy(mesh.GetCellData().GetArray("phie_v"))
+            thresholds = np.unique(values[(values >= 0.0) & (values <= 0.8)])
+            if low_up == "up":
+                thresholds = thresholds[::-1]
+            counts = [vtk_region_count(mesh, low_up, t) for t in thresholds]
+            fallback = 0.0 if low_up == "low" else 0.8
+
+            tau = find_tau(mesh, 0.8, 0.0, low_up, "phie_v")
+
+            self.assertEqual(tau, expected_tau(thresholds, counts, fallback))
+            self.assertNotEqual(tau, fallback)
+            self.assertGreater(vtk_region_count(mesh, low_up, tau), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_LA.igb_reader import read_igb, read_igb_header
+
+
+def write_igb(path, data, data_type="float", systeme="little_endian"):
+    header = f"x:{data.shape[1]} y:1 z:1 t:{data.shape[0]} type:{data_type} systeme:{systeme} \r\n"
+    header = header.encode("ascii").ljust(1023, b" ") + b"\f"
+    dtype = {"float": "f4", "double": "f8"}[data_type]
+    byte_order = ">" if systeme == "big_endian" else "<"
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(data.astype(byte_order + dtype).tobytes())
+
+
+class TestIgbReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.igb_file = os.path.join(self.tmp_dir.name, "phie.igb")
+        self.data = np.arange(12, dtype=float).reshape(3, 4)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_header(self):
+        write_igb(self.igb_file, self.data)
+        header, size = read_igb_header(self.igb_file)
+        self.assertEqual(size, 1024)
+        self.assertEqual(header["x"], "4")
+        self.assertEqual(header["t"], "3")
+
+    def test_memmap_and_time_slice(self):
+        write_igb(self.igb_file, self.data)
+        data = read_igb(self.igb_file)
+        self.assertIsInstance(data, np.memmap)
+        np.testing.assert_array_equal(data, self.data)
+        np.testing.assert_array_equal(read_igb(self.igb_file, time_slice=-1), self.data[-1])
+
+    def test_big_endian_double(self):
+        write_igb(self.igb_file, self.data, data_type="double", systeme="big_endian")
+        data = read_igb(self.igb_file, time_slice=1)
+        self.assertTrue(data.dtype.isnative)
+        np.testing.assert_array_equal(data, self.data[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
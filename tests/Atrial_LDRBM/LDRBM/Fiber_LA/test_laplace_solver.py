@@ -0,0 +1,144 @@
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+import vtk
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_LA import laplace_solver
+
+PARFILE_DIR = os.path.join(PROJECT_ROOT, "Atrial_LDRBM", "LDRBM", "Fiber_LA", "Parfiles")
+
+
+def structured_grid(n, dim):
+    """Points of a regular grid on the unit square/cube and its triangle/tetrahedron connectivity."""
+    axis = np.linspace(0.0, 1.0, n)
+    if dim == 2:
+        x, y = np.meshgrid(axis, axis, indexing="ij")
+        points = np.column_stack([x.ravel(), y.ravel(), np.zeros(x.size)])
+        idx = np.arange(n * n).reshape(n, n)
+        a, b, c, d = idx[:-1, :-1].ravel(), idx[1:, :-1].ravel(), idx[1:, 1:].ravel(), idx[:-1, 1:].ravel()
+        cells = np.vstack([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+        return points, cells
+
+    x, y, z = np.meshgrid(axis, axis, axis, indexing="ij")
+    points = np.column_stack([x.ravel(), y.ravel(), z.ravel()])
+    idx = np.arange(n ** 3).reshape(n, n, n)
+    corners = [idx[i:n - 1 + i, j:n - 1 + j, k:n - 1 + k].ravel() for i in (0, 1) for j in (0, 1) for k in (0, 1)]
+    c000, c001, c010, c011, c100, c101, c110, c111 = corners
+    # Kuhn subdivision of every cube into six tetrahedra sharing the main diagonal
+    cells = np.vstack([np.column_stack(t) for t in [(c000, c100, c110, c111), (c000, c100, c101, c111),
+                                                    (c000, c010, c110, c111), (c000, c010, c011, c111),
+                                                    (c000, c001, c101, c111), (c000, c001, c011, c111)]])
+    return points, cells
+
+
+class TestLaplaceSolver(unittest.TestCase):
+    def test_read_stimulus_values(self):
+        values = laplace_solver.read_stimulus_values(os.path.join(PARFILE_DIR, "la_lps_ab.par"))
+        self.assertEqual(values, [0.0, 2.0, 1.0, -1.0])
+
+        values = laplace_solver.read_stimulus_values(os.path.join(PARFILE_DIR, "la_lps_r.par"))
+        self.assertEqual(values, [0.0, 0.0, 0.0, 1.0])
+
+    def test_read_vtx(self):
+        with tempfile.NamedTemporaryFile(mode="w", suffix=".vtx", delete=False) as tmp:
+            tmp.write("3\nextra\n4\n8\n15\n")
+        try:
+            np.testing.assert_array_equal(laplace_solver.read_vtx(tmp.name[:-4]), [4, 8, 15])
+        finally:
+            os.remove(tmp.name)
+
+    def test_stiffness_rows_sum_to_zero(self):
+        for dim in (2, 3):
+            points, cells = structured_grid(4, dim)
+            stiffness = laplace_solver.assemble_stiffness(points, cells)
+            np.testing.assert_allclose(np.asarray(stiffness.sum(axis=1)).ravel(), 0.0, atol=1e-12)
+            np.testing.assert_allclose((stiffness - stiffness.T).toarray(), 0.0, atol=1e-12)
+
+    def test_linear_solution_is_reproduced(self):
+        for dim in (2, 3):
+            points, cells = structured_grid(5, dim)
+            solver = laplace_solver.LaplaceSolver(points, cells)
+            left = np.flatnonzero(np.isclose(points[:, 0], 0.0))
+            right = np.flatnonzero(np.isclose(points[:, 0], 1.0))
+
+            solution = solver.solve([left, right], [0.0, 1.0])
+
+            np.testing.assert_allclose(solution, points[:, 0], atol=1e-10)
+
+    def test_cell_gradients_of_linear_fields(self):
+        for dim in (2, 3):
+            points, cells = structured_grid(4, dim)
+            fields = np.column_stack([points[:, 0], 2.0 * points[:, 1] - points[:, 0]])
+
+            gradients = laplace_solver.cell_gradients(points, cells, fields)
+
+            self.assertEqual(gradients.shape, (2, len(cells), 3))
+            np.testing.assert_allclose(gradients[0], np.tile([1.0, 0.0, 0.0], (len(cells), 1)), atol=1e-12)
+            np.testing.assert_allclose(gradients[1], np.tile([-1.0, 2.0, 0.0], (len(cells), 1)), atol=1e-12)
+
+    def test_factorization_is_reused_for_same_boundary_nodes(self):
+        points, cells = structured_grid(5, 2)
+        solver = laplace_solver.LaplaceSolver(points, cells)
+        left = np.flatnonzero(np.isclose(points[:, 0], 0.0))
+        right = np.flatnonzero(np.isclose(points[:, 0], 1.0))
+
+        first = solver.solve([left, right], [0.0, 1.0])
+        second = solver.solve([right, left], [0.0, 2.0])
+
+        self.assertEqual(len(solver._factorizations), 1)
+        np.testing.assert_allclose(second, 2.0 * (1.0 - first), atol=1e-10)
+
+    def test_later_boundary_sets_override_earlier_ones(self):
+        ids, values = laplace_solver.dirichlet_conditions([np.array([0, 1]), np.array([1, 2])], [0.0, 1.0])
+        np.testing.assert_array_equal(ids, [0, 1, 2])
+        np.testing.assert_array_equal(values, [0.0, 1.0, 1.0])
+
+    def test_cache_keys_follow_inputs(self):
+        sphere = vtk.vtkSphereSource()
+        sphere.Update()
+        args = SimpleNamespace(laplace_solver="scipy")
+        par_file = os.path.join(PARFILE_DIR, "la_lps_phi.par")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            vtx_files = [os.path.join(tmp_dir, "ids_A"), os.path.join(tmp_dir, "ids_B")]
+            for i, vtx_file in enumerate(vtx_files):
+                with open(vtx_file + ".vtx", "w") as f:
+                    f.write(f"1\nextra\n{i}\n")
+            lp_specs = [("ab", par_file, vtx_files)]
+
+            keys = laplace_solver.laplace_cache_keys(args, sphere.GetOutput(), lp_specs)
+            laplace_solver.store_laplace_field(tmp_dir, keys["ab"], np.arange(3.0))
+            cached = laplace_solver.load_cached_laplace_fields(tmp_dir, keys)
+            np.testing.assert_array_equal(cached["ab"], np.arange(3.0))
+
+            with open(vtx_files[1] + ".vtx", "w") as f:
+                f.write("1\nextra\n7\n")
+            self.assertNotEqual(laplace_solver.laplace_cache_keys(args, sphere.GetOutput(), lp_specs), keys)
+
+    def test_solver_follows_mesh_geometry(self):
+        sphere = vtk.vtkSphereSource()
+        sphere.Update()
+        model = sphere.GetOutput()
+
+        solver = laplace_solver.get_laplace_solver("mesh", model)
+        self.assertIs(laplace_solver.get_laplace_solver("mesh", model), solver)
+
+        # same point and cell counts, moved points
+        moved = vtk.vtkPolyData()
+        moved.DeepCopy(model)
+        moved.GetPoints().SetPoint(0, 0.0, 0.0, 0.7)
+        moved_solver = laplace_solver.get_laplace_solver("mesh", moved)
+        self.assertIsNot(moved_solver, solver)
+        self.assertIs(laplace_solver.get_laplace_solver("mesh", moved), moved_solver)
+        self.assertIsNot(laplace_solver.get_laplace_solver("mesh", model), solver)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import vtk
+from vtk.util.numpy_support import numpy_to_vtk, vtk_to_numpy
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_LA.threshold_masks import ThresholdMasks, THRESHOLD_BETWEEN, THRESHOLD_LOWER, \
+    THRESHOLD_UPPER
+
+
+def sphere_grid():
+    source = vtk.vtkSphereSource()
+    source.SetThetaResolution(30)
+    source.SetPhiResolution(30)
+    source.Update()
+    append = vtk.vtkAppendFilter()
+    append.AddInputData(source.GetOutput())
+    append.Update()
+    grid = append.GetOutput()
+
+    points = vtk_to_numpy(grid.GetPoints().GetData())
+    for name, values, data in [("phie_z", points[:, 2], grid.GetPointData()),
+                               ("Global_ids", np.arange(grid.GetNumberOfPoints()), grid.GetPointData()),
+                               ("Global_ids", np.arange(grid.GetNumberOfCells()), grid.GetCellData()),
+                               ("phie_c", np.linspace(0.0, 1.0, grid.GetNumberOfCells()), grid.GetCellData())]:
+        array = numpy_to_vtk(np.ascontiguousarray(values), deep=True)
+        array.SetName(name)
+        data.AddArray(array)
+    return grid
+
+
+def vtk_threshold_ids(mesh, mode, points_cells, array, thr1, thr2=None):
+    thresh = vtk.vtkThreshold()
+    thresh.SetInputData(mesh)
+    if mode == THRESHOLD_UPPER:
+        thresh.SetThresholdFunction(vtk.vtkThreshold.THRESHOLD_UPPER)
+        thresh.SetUpperThreshold(thr1)
+    elif mode == THRESHOLD_LOWER:
+        thresh.SetThresholdFunction(vtk.vtkThreshold.THRESHOLD_LOWER)
+        thresh.SetLowerThreshold(thr1)
+    else:
+        thresh.SetLowerThreshold(thr1)
+        thresh.SetUpperThreshold(thr2)
+    thresh.SetInputArrayToProcess(0, 0, 0, "vtkDataObject::FIELD_ASSOCIATION_" + points_cells, array)
+    thresh.Update()
+    return vtk_to_numpy(thresh.GetOutput().GetCellData().GetArray("Global_ids"))
+
+
+class TestThresholdMasks(unittest.TestCase):
+    def setUp(self):
+        self.mesh = sphere_grid()
+        self.masks = ThresholdMasks(self.mesh)
+
+    def test_masks_match_vtk_threshold(self):
+        for query in [(THRESHOLD_UPPER, "CELLS", "phie_c", 0.4), (THRESHOLD_LOWER, "CELLS", "phie_c", 0.4),
+                      (THRESHOLD_BETWEEN, "CELLS", "phie_c", 0.2, 0.6), (THRESHOLD_UPPER, "POINTS", "phie_z", 0.1),
+                      (THRESHOLD_BETWEEN, "POINTS", "phie_z", -0.2, 0.3)]:
+            mask = self.masks.threshold(*query)
+            np.testing.assert_array_equal(self.masks.ids(mask), vtk_threshold_ids(self.mesh, *query))
+
+    def test_combined_masks_and_extract(self):
+        mask = self.masks.threshold(THRESHOLD_UPPER, "CELLS", "phie_c", 0.3) & \
+               ~self.masks.threshold(THRESHOLD_UPPER, "POINTS", "phie_z", 0.0)
+
+        extracted = self.masks.extract(mask)
+
+        np.testing.assert_array_equal(vtk_to_numpy(extracted.GetCellData().GetArray("Global_ids")),
+                                      np.flatnonzero(mask))
+        self.assertIsNone(extracted.GetCellData().GetArray("threshold_mask"))
+        self.assertIsNone(self.mesh.GetCellData().GetArray("threshold_mask"))
+        np.testing.assert_array_equal(np.sort(vtk_to_numpy(extracted.GetPointData().GetArray("Global_ids"))),
+                                      self.masks.point_ids(mask))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import vtk
+from vtk.numpy_interface import dataset_adapter as dsa
+from vtk.util.numpy_support import vtk_to_numpy
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM.LDRBM.Fiber_RA.Methods_RA import unify_array_types
+
+
+def tagged_grid(center, tag):
+    source = vtk.vtkSphereSource()
+    source.SetCenter(center)
+    source.Update()
+    append = vtk.vtkAppendFilter()
+    append.AddInputData(source.GetOutput())
+    append.Update()
+    grid = append.GetOutput()
+    mesh = dsa.WrapDataObject(grid)
+    mesh.CellData.append(np.full(grid.GetNumberOfCells(), tag, dtype=int), "elemTag")
+    mesh.CellData.append(np.tile([1.0, 0.0, 0.0], (grid.GetNumberOfCells(), 1)), "fiber")
+    return mesh.VTKObject
+
+
+def append(meshes):
+    append_filter = vtk.vtkAppendFilter()
+    for mesh in meshes:
+        append_filter.AddInputData(mesh)
+    append_filter.Update()
+    return append_filter.GetOutput()
+
+
+class TestUnifyArrayTypes(unittest.TestCase):
+    def test_elem_tag_survives_append_of_file_and_memory_grids(self):
+        in_memory = tagged_grid((0.0, 0.0, 0.0), 11)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_name = os.path.join(tmp_dir, "LA_epi_with_fiber.vtu")
+            writer = vtk.vtkXMLUnstructuredGridWriter()
+            writer.SetFileName(file_name)
+            writer.SetInputData(tagged_grid((3.0, 0.0, 0.0), 22))
+            writer.Write()
+            reader = vtk.vtkXMLUnstructuredGridReader()
+            reader.SetFileName(file_name)
+            reader.Update()
+            from_file = reader.GetOutput()
+
+        meshes = [from_file, in_memory]
+        memory_array_class = in_memory.GetCellData().GetArray("elemTag").GetClassName()
+        copies = unify_array_types(meshes)
+        appended = append(copies)
+
+        tags = appended.GetCellData().GetArray("elemTag")
+        self.assertIsNotNone(tags)
+        np.testing.assert_array_equal(vtk_to_numpy(tags), np.repeat([22, 11], [m.GetNumberOfCells() for m in meshes]))
+        self.assertIsNotNone(appended.GetCellData().GetArray("fiber"))
+        # the inputs keep their arrays
+        self.assertEqual(in_memory.GetCellData().GetArray("elemTag").GetClassName(), memory_array_class)
+
+
+if __name__ == "__main__":
+    unittest.main()
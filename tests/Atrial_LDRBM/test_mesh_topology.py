@@ -0,0 +1,220 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import vtk
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM import mesh_topology
+from vtk.util.numpy_support import vtk_to_numpy
+
+
+def sphere(resolution=40):
+    source = vtk.vtkSphereSource()
+    source.SetThetaResolution(resolution)
+    source.SetPhiResolution(resolution)
+    source.Update()
+    return source.GetOutput()
+
+
+def path_length(points):
+    return np.linalg.norm(np.diff(points, axis=0), axis=1).sum()
+
+
+class TestMeshTopology(unittest.TestCase):
+    def setUp(self):
+        self.mesh = sphere()
+        self.path = np.array([[0.5 * np.cos(t), 0.5 * np.sin(t), 0.0] for t in np.linspace(0.0, 2.0, 30)])
+
+    def test_cells_around_path_matches_point_locator(self):
+        locator = vtk.vtkStaticPointLocator()
+        locator.SetDataSet(self.mesh)
+        locator.BuildLocator()
+        expected = set()
+        for point in self.path:
+            point_ids = vtk.vtkIdList()
+            locator.FindPointsWithinRadius(0.05, point, point_ids)
+            for i in range(point_ids.GetNumberOfIds()):
+                cell_ids = vtk.vtkIdList()
+                self.mesh.GetPointCells(point_ids.GetId(i), cell_ids)
+                expected.update(cell_ids.GetId(j) for j in range(cell_ids.GetNumberOfIds()))
+
+        cells = mesh_topology.cells_around_path(self.mesh, self.path, 0.05)
+
+        self.assertEqual(set(cells.tolist()), expected)
+
+    def test_edge_graph_matches_extract_edges(self):
+        edges = vtk.vtkExtractEdges()
+        edges.SetInputData(self.mesh)
+        edges.Update()
+        lines = edges.GetOutput().GetLines()
+
+        graph = mesh_topology.MeshTopology(self.mesh).edge_graph
+
+        self.assertEqual(graph.nnz, 2 * lines.GetNumberOfCells())
+        self.assertEqual((graph != graph.T).nnz, 0)
+
+    def test_geodesic_path_matches_vtk_dijkstra(self):
+        mesh = sphere(23)
+        geodesic_paths = mesh_topology.GeodesicPaths(mesh)
+        for start, end in [(0, 300), (17, 401), (250, 3)]:
+            dijkstra = vtk.vtkDijkstraGraphGeodesicPath()
+            dijkstra.SetInputData(mesh)
+            dijkstra.SetStartVertex(end)
+            dijkstra.SetEndVertex(start)
+            dijkstra.Update()
+            expected = vtk_to_numpy(dijkstra.GetOutput().GetPoints().GetData())
+
+            path = geodesic_paths.path(start, end)
+
+            np.testing.assert_allclose(path[[0, -1]], expected[[0, -1]])
+            self.assertAlmostEqual(path_length(path), path_length(expected), places=5)
+
+        paths = geodesic_paths.paths_between([0, 17], [300, 401])
+        np.testing.assert_array_equal(paths[1][1], geodesic_paths.path(17, 401))
+
+    def test_plane_band_matches_extract_geometry(self):
+        plane_1 = vtk.vtkPlane()
+        plane_1.SetOrigin(0.0, 0.0, 0.05)
+        plane_1.SetNormal(0.0, 0.0, 1.0)
+        plane_2 = vtk.vtkPlane()
+        plane_2.SetOrigin(0.0, 0.0, -0.1)
+        plane_2.SetNormal(0.0, 0.0, -1.0)
+        extract = vtk.vtkExtractGeometry()
+        extract.SetInputData(self.mesh)
+        extract.SetImplicitFunction(plane_1)
+        extract.Update()
+        band = vtk.vtkExtractGeometry()
+        band.SetInputData(extract.GetOutput())
+        band.SetImplicitFunction(plane_2)
+        band.Update()
+
+        edge_mask, band_points = mesh_topology.plane_band_edge_mask(self.mesh, [plane_1, plane_2])
+        expected = vtk.vtkExtractEdges()
+        expected.SetInputData(band.GetOutput())
+        expected.Update()
+
+        self.assertEqual(band_points.sum(), band.GetOutput().GetNumberOfPoints())
+        self.assertEqual(edge_mask.sum(), 2 * expected.GetOutput().GetNumberOfLines())
+
+    def test_connected_regions_match_specified_regions(self):
+        append = vtk.vtkAppendPolyData()
+        for i, resolution in enumerate([8, 12, 10]):
+            source = vtk.vtkSphereSource()
+            source.SetCenter(3.0 * i, 0.0, 0.0)
+            source.SetThetaResolution(resolution)
+            source.SetPhiResolution(resolution)
+            source.Update()
+            append.AddInputData(source.GetOutput())
+        append.Update()
+        mesh = append.GetOutput()
+        centers = vtk.vtkCellCenters()
+        centers.SetInputData(mesh)
+        centers.Update()
+        cell_centers = vtk_to_numpy(centers.GetOutput().GetPoints().GetData())
+
+        regions = mesh_topology.ConnectedRegions(mesh)
+        connect = vtk.vtkConnectivityFilter()
+        connect.SetInputData(mesh)
+        connect.SetExtractionModeToSpecifiedRegions()
+        connect.Update()
+
+        self.assertEqual(len(regions), 3)
+        for region_id in range(len(regions)):
+            connect.AddSpecifiedRegion(region_id)
+            connect.Update()
+            expected = connect.GetOutput()
+            connect.DeleteSpecifiedRegion(region_id)
+
+            region = regions.region(region_id)
+            self.assertIsInstance(region, vtk.vtkPolyData)
+            self.assertEqual(region.GetNumberOfCells(), expected.GetNumberOfCells())
+            # the filter output keeps every point of the mesh, only count the used ones
+            used_points = np.unique(vtk_to_numpy(expected.GetPolys().GetConnectivityArray()))
+            self.assertEqual(len(regions.point_ids(region_id)), len(used_points))
+            expected_centers = vtk.vtkCellCenters()
+            expected_centers.SetInputData(expected)
+            expected_centers.Update()
+            np.testing.assert_allclose(cell_centers[regions.cell_ids(region_id)].mean(axis=0),
+                                       vtk_to_numpy(expected_centers.GetOutput().GetPoints().GetData()).mean(axis=0))
+
+    def test_boundary_loops_match_feature_edges(self):
+        mesh = sphere(30)
+        ids = vtk.vtkIdTypeArray()
+        ids.SetName("Ids")
+        for i in range(mesh.GetNumberOfPoints()):
+            ids.InsertNextValue(i)
+        mesh.GetPointData().AddArray(ids)
+        centers = vtk.vtkCellCenters()
+        centers.SetInputData(mesh)
+        centers.Update()
+        cell_centers = vtk_to_numpy(centers.GetOutput().GetPoints().GetData())
+        # cut three orifices into the sphere
+        orifices = np.array([[0.0, 0.0, 0.5], [0.5, 0.0, 0.0], [0.0, -0.5, 0.0]])
+        keep = np.linalg.norm(cell_centers[:, None] - orifices, axis=2).min(axis=1) > 0.15
+        kept = vtk.vtkIdList()
+        for cell_id in np.flatnonzero(keep):
+            kept.InsertNextId(int(cell_id))
+        extract = vtk.vtkExtractCells()
+        extract.SetInputData(mesh)
+        extract.SetCellList(kept)
+        extract.Update()
+        geo_filter = vtk.vtkGeometryFilter()
+        geo_filter.SetInputData(extract.GetOutput())
+        geo_filter.Update()
+        surface = geo_filter.GetOutput()
+
+        feature_edges = vtk.vtkFeatureEdges()
+        feature_edges.SetInputData(surface)
+        feature_edges.BoundaryEdgesOn()
+        feature_edges.FeatureEdgesOff()
+        feature_edges.ManifoldEdgesOff()
+        feature_edges.NonManifoldEdgesOff()
+        feature_edges.Update()
+        expected = mesh_topology.ConnectedRegions(feature_edges.GetOutput())
+        expected_ids = [vtk_to_numpy(feature_edges.GetOutput().GetPointData().GetArray("Ids"))[
+                            expected.point_ids(i)] for i in range(len(expected))]
+
+        loops = mesh_topology.BoundaryLoops(surface)
+
+        self.assertEqual(len(loops), 3)
+        self.assertEqual(sorted(sorted(ids.tolist()) for ids in expected_ids),
+                         sorted(sorted(vtk_to_numpy(loops.polydata(i).GetPointData().GetArray("Ids")).tolist())
+                                for i in range(len(loops))))
+        points = vtk_to_numpy(surface.GetPoints().GetData())
+        for i in range(len(loops)):
+            self.assertTrue(loops.ordered[i])
+            loop_points = points[loops.point_ids(i)]
+            np.testing.assert_allclose(loops.centers[i], loop_points.mean(axis=0), atol=1e-6)
+            # consecutive loop points share a boundary edge
+            edges = {tuple(edge) for edge in loops.edges.tolist()}
+            ordered = loops.point_ids(i)
+            for a, b in zip(ordered, np.roll(ordered, -1)):
+                self.assertIn((min(a, b), max(a, b)), edges)
+            self.assertEqual(loops.polydata(i).GetNumberOfLines(), len(ordered))
+
+    def test_build_indices(self):
+        topology = mesh_topology.MeshTopology(self.mesh)
+        topology.build_indices(centroid_tree=True)
+        for name in ("point_cells", "point_tree", "centroids", "centroid_tree"):
+            self.assertIn(name, vars(topology))
+        self.assertNotIn("edge_graph", vars(topology))
+
+        topology.build_indices(around_path=False, edge_graph=True)
+        self.assertIn("edge_graph", vars(topology))
+
+    def test_nearest_path_segment_and_tangents(self):
+        path = np.array([[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [1.0, 1.0, 0.0]])
+        segments = mesh_topology.nearest_path_segment(path, np.array([[0.4, 0.1, 0.0], [1.1, 0.8, 0.0]]))
+        np.testing.assert_array_equal(segments, [0, 1])
+
+        tangents = mesh_topology.path_segment_tangents(path, smooth=False)
+        np.testing.assert_allclose(tangents, [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM import scheduler
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+class TestScheduler(unittest.TestCase):
+    def test_cgroup_cpu_limit(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.assertIsNone(scheduler.cgroup_cpu_limit(root))
+
+            write(os.path.join(root, "cpu", "cpu.cfs_quota_us"), "-1\n")
+            write(os.path.join(root, "cpu", "cpu.cfs_period_us"), "100000\n")
+            self.assertIsNone(scheduler.cgroup_cpu_limit(root))
+            write(os.path.join(root, "cpu", "cpu.cfs_quota_us"), "250000\n")
+            self.assertEqual(scheduler.cgroup_cpu_limit(root), 2.5)
+
+            # cgroup v2 takes precedence
+            write(os.path.join(root, "cpu.max"), "max 100000\n")
+            self.assertIsNone(scheduler.cgroup_cpu_limit(root))
+            write(os.path.join(root, "cpu.max"), "150000 100000\n")
+            self.assertEqual(scheduler.cgroup_cpu_limit(root), 1.5)
+
+    def test_usable_cores_respects_quota(self):
+        with tempfile.TemporaryDirectory() as root:
+            unlimited = scheduler.usable_cores(root)
+            self.assertGreaterEqual(unlimited, 1)
+            if hasattr(os, "sched_getaffinity"):
+                self.assertEqual(unlimited, len(os.sched_getaffinity(0)))
+
+            write(os.path.join(root, "cpu.max"), "50000 100000\n")
+            self.assertEqual(scheduler.usable_cores(root), 1)
+
+    def test_budget_split(self):
+        self.assertEqual(scheduler.split_cores(16, 3), 5)
+        self.assertEqual(scheduler.split_cores(2, 4), 1)
+        self.assertEqual(scheduler.processes_for_mesh(5000, 16), 1)
+        self.assertEqual(scheduler.processes_for_mesh(10 * scheduler.MIN_NODES_PER_PROCESS, 16), 10)
+        self.assertEqual(scheduler.processes_for_mesh(10 ** 7, 16), 16)
+        self.assertEqual(scheduler.concurrent_runs(10, 2), 1)
+        self.assertEqual(scheduler.concurrent_runs(3, 64), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from Atrial_LDRBM import tracing
+
+
+class TestTracing(unittest.TestCase):
+    def test_traced_run_writes_nested_spans(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_base = os.path.join(tmp_dir, "mesh_LA")
+
+            @tracing.traced()
+            def stage():
+                subprocess.run([sys.executable, "-c", "sum(range(10 ** 6))"], check=True)
+
+            with tracing.traced_run("run", profile_base, atrium="LA"):
+                with tracing.traced_run("inner", os.path.join(tmp_dir, "inner")):
+                    stage()
+                with self.assertRaises(ValueError):
+                    with tracing.trace("failing"):
+                        raise ValueError
+
+            self.assertFalse(os.path.exists(os.path.join(tmp_dir, "inner_profile.json")))
+            with open(profile_base + "_profile.json") as f:
+                spans = {span["path"]: span for span in json.load(f)}
+            with open(profile_base + "_profile.csv") as f:
+                rows = list(csv.DictReader(f))
+
+        self.assertEqual(sorted(spans), ["run", "run/failing", "run/inner", "run/inner/stage"])
+        self.assertEqual([row["path"] for row in rows], ["run/inner/stage", "run/inner", "run/failing", "run"])
+        self.assertEqual(spans["run"]["atrium"], "LA")
+        self.assertEqual(spans["run/failing"]["status"], "failed")
+        self.assertEqual(spans["run/inner/stage"]["depth"], 2)
+        self.assertGreaterEqual(spans["run"]["wall_s"], spans["run/inner"]["wall_s"])
+        if tracing.resource is not None:
+            self.assertGreater(spans["run/inner/stage"]["children_cpu_s"], 0.0)
+            self.assertGreater(spans["run"]["peak_rss_mb"], 0.0)
+
+    def test_worker_thread_spans_continue_parent(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_base = os.path.join(tmp_dir, "mesh_RA")
+
+            def solve(name, parent):
+                with tracing.trace(name, parent=parent):
+                    with tracing.trace("inner"):
+                        subprocess.run([sys.executable, "-c", "pass"], check=True)
+
+            with tracing.traced_run("run", profile_base):
+                with tracing.trace("laplace"):
+                    parent = tracing.current_path()
+                    with ThreadPoolExecutor(max_workers=2) as executor:
+                        list(executor.map(solve, ["carp a", "carp b"], [parent] * 2))
+
+            with open(profile_base + "_profile.json") as f:
+                spans = {span["path"]: span for span in json.load(f)}
+
+        self.assertEqual(sorted(spans), ["run", "run/laplace", "run/laplace/carp a", "run/laplace/carp a/inner",
+                                         "run/laplace/carp b", "run/laplace/carp b/inner"])
+        self.assertEqual(spans["run/laplace/carp a"]["depth"], 2)
+        self.assertEqual(spans["run/laplace/carp b/inner"]["depth"], 3)
+        for path in ["run/laplace/carp a", "run/laplace/carp b/inner"]:
+            self.assertIsNone(spans[path]["children_cpu_s"])
+        self.assertIsNotNone(spans["run/laplace"]["children_cpu_s"])
+
+
+if __name__ == "__main__":
+    unittest.main()
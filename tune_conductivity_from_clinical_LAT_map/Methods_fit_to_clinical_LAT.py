@@ -32,6 +32,7 @@ import vtk
 from scipy.spatial import cKDTree
 from vtk.numpy_interface import dataset_adapter as dsa
 
+from Atrial_LDRBM.mesh_topology import ConnectedRegions
 from vtk_opencarp_helper_methods.AugmentA_methods.vtk_operations import vtk_thr
 from vtk_opencarp_helper_methods.vtk_methods.converters import vtk_to_numpy, convert_point_to_cell_data
 from vtk_opencarp_helper_methods.vtk_methods.exporting import vtk_xml_unstructured_grid_writer
@@ -214,16 +215,9 @@ def areas_to_clean(endo, args, min_LAT, stim_pt):
 
             tree = cKDTree(pts)
 
-            connect = init_connectivity_filter(el_removed, ExtractionModes.SPECIFIED_REGIONS)
-            num = connect.GetNumberOfExtractedRegions()
-            for n in range(num):
-                connect.AddSpecifiedRegion(n)
-                connect.Update()
-
-                geo_port, _geo_filter = get_vtk_geom_filter_port(connect.GetOutputPort(), True)
-
+            for region in ConnectedRegions(el_removed):
                 # Clean unused points
-                surface = clean_polydata(geo_port, input_is_connection=True)
+                surface = clean_polydata(apply_vtk_geom_filter(region))
 
                 filter_cell_centers = vtk.vtkCellCenters()
                 filter_cell_centers.SetInputData(surface)
@@ -240,10 +234,6 @@ def areas_to_clean(endo, args, min_LAT, stim_pt):
 
                     tot_el_to_clean = np.union1d(tot_el_to_clean, loc_el_to_clean)
 
-                # delete added region id
-                connect.DeleteSpecifiedRegion(n)
-                connect.Update()
-
     print("Bands to clean ready ... ")
 
     idss = np.zeros((endo.GetNumberOfCells(),))
@@ -266,16 +256,9 @@ def areas_to_clean(endo, args, min_LAT, stim_pt):
     tree = cKDTree(pts)
 
     # Find elements at the boundary of the areas to clean, which are gonna be used for the fitting of the conductivities
-    connect = init_connectivity_filter(endo_to_interpolate, ExtractionModes.SPECIFIED_REGIONS)
-    num = connect.GetNumberOfExtractedRegions()
-    for n in range(num):
-        connect.AddSpecifiedRegion(n)
-        connect.Update()
-
-        geo_port, _geo_filter = get_vtk_geom_filter_port(connect.GetOutputPort(), True)
-
+    for region in ConnectedRegions(endo_to_interpolate):
         # Clean unused points
-        surface = clean_polydata(geo_port, input_is_connection=True)
+        surface = clean_polydata(apply_vtk_geom_filter(region))
 
         loc_el_to_clean = vtk_to_numpy(surface.GetCellData().GetArray('Global_ids')).astype(int)
 
@@ -291,10 +274,6 @@ def areas_to_clean(endo, args, min_LAT, stim_pt):
 
         el_border.append(np.unique(el_cleaned[ii]))  # Give id of the closest point to the endo_clean
 
-        # delete added region id
-        connect.DeleteSpecifiedRegion(n)
-        connect.Update()
-
     if args.debug:
 
         meshbasename = args.mesh.split("/")[-1]